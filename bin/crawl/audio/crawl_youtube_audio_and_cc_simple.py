@@ -26,45 +26,34 @@ from mia.struct import subtitle_chunk_new
 from mia.struct import subtitle_chunks_merge
 from mia.struct import audio_metadata_to_json_obj
 from mia.utils import chunk_audio_with_subtitle_chunks
+from mia.data.audio.fetcher import FetchScheduler
 
 
 YOUTUBE_DL_BIN: str = os.path.join(
     os.path.dirname(sys.executable), "youtube-dl"
 )
-YOUTUBE_DL_CMD_TEMP: Final[str] = "${YOUTUBE_DL} --extract-audio --audio-format mp3 --write-sub --all-subs --abort-on-error --output \"${ID}.%(ext)s\" ${URL}"
+YOUTUBE_DL_CMD_TEMP: Final[List[str]] = [
+    "${YOUTUBE_DL}", "--extract-audio", "--audio-format", "mp3", 
+    "--write-sub", "--all-subs", "--abort-on-error", 
+    "--output", "${ID}.%(ext)s", "${URL}"
+]
 
 
-def get_raw_data(
+def get_raw_data_items(
     raw_data_dir: str, youtube_urls: List[str], lang: str
-) -> List[Dict[str, str]]:
-    out: List[Dict[str, str]] = []
-    
-    for url in tqdm(youtube_urls):
+) -> List[Dict]:
+    out: List[Dict] = []
+    for url in youtube_urls:
         url = url.split("?")[0] + "?" + url.split("?")[1].split("&")[0] 
         resource_id: str = url.split("v=")[-1]
         subtitle_path: str = os.path.join(raw_data_dir, "%s.%s.vtt" % (resource_id, lang))
         audio_path: str = os.path.join(raw_data_dir, "%s.mp3" % resource_id)
-        
-        raw_sample: Dict[str, str] = {
-            "id": resource_id, 
-            "subtitle_path": subtitle_path, "audio_path": audio_path 
-        }
-        out.append(raw_sample)
-
-        if os.path.exists(subtitle_path) and os.path.exists(audio_path):
-            continue
-        
-        print("Fetching {}".format(raw_sample))
-        cmd: str = YOUTUBE_DL_CMD_TEMP\
-            .replace("${YOUTUBE_DL}", YOUTUBE_DL_BIN)\
-            .replace("${ID}", resource_id)\
-            .replace("${URL}", url)
-        os.system("cd %s && %s" % (raw_data_dir, cmd))
-    
-    out = [
-        x for x in out 
-        if os.path.exists(x["subtitle_path"]) and os.path.exists(x["audio_path"]) 
-    ]
+        out.append({
+            "id": resource_id, "URL": url, "ID": resource_id, 
+            "YOUTUBE_DL": YOUTUBE_DL_BIN,
+            "subtitle_path": subtitle_path, "audio_path": audio_path,
+            "outputs": [subtitle_path, audio_path]
+        })
     return out
 
 
@@ -104,6 +93,18 @@ if __name__ == "__main__":
     output_dir: str = os.path.abspath(conf["output_dir"])
     lang: str = conf["lang"]
     youtube_urls: List[str] = conf["youtube_urls"]
+    # Output chunk format, `null` keeps source audio's format/sample rate/channels
+    chunk_format: Optional[str] = conf.get("chunk_format", None)
+    chunk_sample_rate: Optional[int] = conf.get("chunk_sample_rate", None)
+    chunk_channels: Optional[int] = conf.get("chunk_channels", 1)
+    chunk_num_writers: int = conf.get("chunk_num_writers", 4)
+    # Argument list with `${YOUTUBE_DL}`, `${ID}` and `${URL}` placeholders, 
+    # runs in raw data directory
+    fetch_cmd: List[str] = conf.get("fetch_cmd", YOUTUBE_DL_CMD_TEMP)
+    fetch_concurrency: int = conf.get("fetch_concurrency", 4)
+    fetch_max_retries: int = conf.get("fetch_max_retries", 3)
+    fetch_backoff_sec: float = conf.get("fetch_backoff_sec", 5.0)
+    fetch_timeout_sec: Optional[float] = conf.get("fetch_timeout_sec", None)
     
     if not os.path.exists(YOUTUBE_DL_BIN):
         YOUTUBE_DL_BIN = os.path.join(
@@ -117,16 +118,33 @@ if __name__ == "__main__":
     os.system("mkdir -p %s" % raw_data_dir)
     os.system("mkdir -p %s" % dataset_dir)
     
-    raw_data: List[Dict] = get_raw_data(raw_data_dir, youtube_urls, lang) 
-
+    scheduler: FetchScheduler = FetchScheduler(
+        fetch_cmd, os.path.join(raw_data_dir, "fetch_state.jsonl"), 
+        work_dir=raw_data_dir, max_concurrency=fetch_concurrency, 
+        max_retries=fetch_max_retries, backoff_base_sec=fetch_backoff_sec, 
+        timeout_sec=fetch_timeout_sec
+    )
+
+    # Chunking each video as soon as it's fetched, while others are still 
+    # being downloaded
     audios: List[AudioMetadata] = []
-    for record in tqdm(raw_data):
+    failed: List[str] = []
+    for record, state in tqdm(scheduler.run(
+        get_raw_data_items(raw_data_dir, youtube_urls, lang)
+    )):
+        if state["status"] == "failed":
+            failed.append(record["id"])
+            continue
         curr_audios: List[AudioMetadata] = chunk_audio_with_subtitle_chunks(
             dataset_dir, 
             record["audio_path"],
-            chunking_subtitle(record["subtitle_path"])
+            chunking_subtitle(record["subtitle_path"]),
+            out_format=chunk_format, out_sample_rate=chunk_sample_rate,
+            out_channels=chunk_channels, num_writers=chunk_num_writers
         )
         audios += curr_audios
+    if len(failed) > 0:
+        print("Failed fetching %i videos: %s" % (len(failed), failed))
     
     out_metadata_path: str = os.path.join(output_dir, "dataset", "metadata.jsonl")
     out_metadata = open(out_metadata_path, "w")
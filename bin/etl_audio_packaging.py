@@ -9,10 +9,10 @@
 import sys
 import os
 import json
-from tqdm import tqdm
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-from mia.utils import json_objs2jsonl_file
+from mia.data.audio.shards import pack_shards
+from mia.utils import jsonl_iter
 
 
 if __name__ == "__main__":
@@ -20,33 +20,19 @@ if __name__ == "__main__":
     print(configs)
     
     out_dir: str = configs["output_dir"]
-    os.system("mkdir -p %s" % out_dir)
-
-    audio_records: List[Dict] = [
-        json.loads(x) for x in open(configs["metadata_path"], "r").read().split("\n")
-        if x not in {""}
-    ]
-
-    out_metadata_path: str = os.path.join(out_dir, "metadata.jsonl")
-    out_metadata: List[Dict]  = []
-    for audio_record in tqdm(audio_records):
-        path: str = audio_record[configs["audio_path_col"]]
-        os.system("cp %s %s" % (path, out_dir))
-
-        audio_file_name: str = path.split("/")[-1]
-        out_record: Dict = {configs["audio_path_col"]: audio_file_name}
-        for col in configs["other_cols"]:
-            out_record[col] = audio_record[col]
-        out_metadata.append(out_record)
-
-    json_objs2jsonl_file(out_metadata_path, out_metadata)
-    print("Meta-data of packed audios are at %s" % out_metadata_path)
-
-    if configs["compress"]:
-        print("Compressing audios")
-        os.system("tar -czvf ./%s.tar.gz %s" % (out_dir.split("/")[-1], out_dir))
-
-    print("Can delete packed audios If you don't need it any more")
-    print(out_dir)
-
-
+    index_path: str = pack_shards(
+        jsonl_iter(configs["metadata_path"]), 
+        out_dir, 
+        audio_path_col=configs["audio_path_col"], 
+        keep_cols=configs["other_cols"],
+        max_shard_bytes=configs.get("max_shard_bytes", 2 ** 30),
+        max_shard_samples=configs.get("max_shard_samples", None),
+        # `null` keeps source audio files' bytes as they are
+        audio_format=configs.get("audio_format", "flac"),
+        sample_rate=configs.get("sample_rate", None),
+        channels=configs.get("channels", None),
+        num_writers=configs.get("num_writers", 4),
+        failure_path=configs.get("failure_path", None)
+    )
+    print("Audios are packed into shards under %s" % out_dir)
+    print("Global index of packed audios is at %s" % index_path)
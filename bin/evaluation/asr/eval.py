@@ -11,11 +11,11 @@ import json
 import unicodedata
 import re
 import string
-import pandas as pd
-from pandas import DataFrame
-from typing import Dict, List
-from torchmetrics.text import CharErrorRate
-from opencc import OpenCC
+from typing import Dict, List, Optional, Callable
+
+from mia.evaluation import StreamingAsrEvaluator
+from mia.metrics import lang2unit
+from mia.text_norm import convert
 
 
 def run_text_norm(input_string):
@@ -32,38 +32,70 @@ def run_text_norm(input_string):
 
     # Remove specified characters using regex
     result = re.sub(combined_pattern, '', input_string)
-    
+
     return result
 
 
-def eval(
-    asr_results_path: str, target_col: str, output_col: str,  
-    lang: str="", text_norm: bool=False
-) -> None:
-    asr_results: List[str] = [
-        json.loads(x) for x in open(asr_results_path, "r").read().split("\n")
-        if x not in {""}
-    ]
-    targets: List[str] = [x[target_col] for x in asr_results]
-    outputs: List[str] = [x[output_col] for x in asr_results]
-
-    if lang in {"mandarin", "zh-TW", "zh-tw"}:
-        converter: OpenCC = OpenCC('tw2s.json')
-        targets = [converter.convert(x) for x in targets]
-        outputs = [converter.convert(x) for x in outputs]
+def tw2s_text_norm(text: str) -> str:
+    return run_text_norm(convert(text, "tw2s.json"))
 
-    if text_norm:
-        targets = [run_text_norm(x) for x in targets]
-        outputs = [run_text_norm(x) for x in outputs]
 
-    assert(len(targets) == len(outputs))
-
-    cer = CharErrorRate()
+def eval(
+    asr_results_path: str, target_col: str, output_col: str,
+    lang: str="", text_norm: bool=False,
+    group_by: Optional[List[str]]=None,
+    duration_col: str="duration",
+    duration_buckets: Optional[List[float]]=None,
+    manifest_path: Optional[str]=None,
+    manifest_key_col: str="path",
+    num_proc: int=1,
+    report_path: Optional[str]=None,
+    unit: str="char"
+) -> Dict:
+    """
+    Args:
+        unit: "char" for CER, "word" for WER, or "auto" to pick one by 
+            `lang`, i.e. CER for Chinese/Japanese and WER otherwise.
+
+    Returns:
+        Report with top level "sample_size", "cer" (or "wer"), 
+        "substitutions", "deletions" and "insertions" as before, plus 
+        `StreamingAsrEvaluator` report with group breakdowns.
+    """
+    if unit == "auto":
+        unit = lang2unit(lang) if lang != "" else "char"
+    if unit not in {"char", "word"}:
+        raise Exception("Unknown error rate unit '%s'" % unit)
+
+    text_normalizer: Optional[Callable[[str], str]] = None
+    if lang in {"mandarin", "zh-TW", "zh-tw"}:
+        text_normalizer = tw2s_text_norm if text_norm else \
+            lambda x: convert(x, "tw2s.json")
+    elif text_norm:
+        text_normalizer = run_text_norm
+
+    evaluator: StreamingAsrEvaluator = StreamingAsrEvaluator(
+        target_col, output_col, unit,
+        group_by=group_by, duration_col=duration_col,
+        duration_buckets=duration_buckets, manifest_path=manifest_path,
+        manifest_key_col=manifest_key_col, text_normalizer=text_normalizer
+    )
+    report: Dict = evaluator.run(asr_results_path, num_proc)
     results: Dict = {
-        "sample_size": len(outputs),
-        "cer": float(cer(outputs, targets))
+        "sample_size": report["overall"]["samples"],
+        "cer" if unit == "char" else "wer": report["overall"]["error_rate"],
+        "substitutions": report["overall"]["substitutions"],
+        "deletions": report["overall"]["deletions"],
+        "insertions": report["overall"]["insertions"],
+        **report
     }
-    print(results)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if report_path is not None:
+        open(report_path, "w").write(
+            json.dumps(results, indent=2, ensure_ascii=False)
+        )
+        print("Evaluation report is saved to %s" % report_path)
+    return results
 
 
 if __name__ == "__main__":
@@ -72,5 +104,13 @@ if __name__ == "__main__":
 
     eval(
         configs["asr_results_path"], configs["target_col"], configs["output_col"],
-        configs["lang"], configs["text_norm"]
+        configs["lang"], configs["text_norm"],
+        group_by=configs.get("group_by", []),
+        duration_col=configs.get("duration_col", "duration"),
+        duration_buckets=configs.get("duration_buckets", None),
+        manifest_path=configs.get("manifest_path", None),
+        manifest_key_col=configs.get("manifest_key_col", "path"),
+        num_proc=configs.get("num_proc", 1),
+        report_path=configs.get("report_path", None),
+        unit=configs.get("unit", "char")
     )
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# file: build_feature_store.py
+# date: 2026-10-18
+#
+# Usage:
+# python ./bin/model/whisper_and_distil_whisper/build_feature_store.py ./demo_configs/model/whisper_and_distil_whisper/build_feature_store.json
+#
+# Notes:
+# Pre-computes Whisper log-mel features of given JSONL datasets into a 
+# memory-mapped feature store, which can be used by `run_distillation.py` 
+# with `data.feature_store_dir` config, so the collator can directly read 
+# features instead of decoding, resampling and featurizing audio in every 
+# epoch.
+
+
+import sys
+import json
+from typing import Dict, List
+from transformers import WhisperProcessor
+
+from mia.utils import jsonl_file2json_objs
+from mia.data.audio.feature_store import LogMelFeatureStore
+from mia.data.audio.feature_store import feature_store_build
+
+
+if __name__ == "__main__":
+    configs: Dict = json.loads(open(sys.argv[1], "r").read())
+    print(configs)
+
+    processor: WhisperProcessor = WhisperProcessor.from_pretrained(
+        configs["processor_path_or_name"]
+    )
+    store: LogMelFeatureStore = LogMelFeatureStore(
+        configs["feature_store_dir"], 
+        dtype=configs["dtype"], 
+        max_shard_bytes=configs["max_shard_mb"] * 1024 * 1024
+    )
+    for data_path in configs["jsonl_paths"]:
+        print("Pre-computing features for '%s'" % data_path)
+        jsonl_samples: List[Dict] = jsonl_file2json_objs(data_path)
+        feature_store_build(
+            store, jsonl_samples, processor, 
+            path_col=configs["audio_path_col"], 
+            target_sample_rate=configs["sampling_rate"], 
+            num_workers=configs["num_workers"]
+        )
+    store.close()
+    print("Feature store is at '%s' with %i records" % (
+        configs["feature_store_dir"], len(store)
+    ))
@@ -10,37 +10,46 @@ import os
 import json
 import torch
 import torchaudio
+from functools import partial
 from transformers import pipeline
 from tqdm import tqdm
-from opencc import OpenCC
 from torch import Tensor
 from typing import Dict, List, Optional
 from datasets import Audio
 from transformers import AutoModelForSpeechSeq2Seq
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
-from torchmetrics.text import CharErrorRate
 
-from mia.data.functions import audio_file2model_inputs
+from mia import text_norm
+from mia import metrics
+from mia.model.whisper_inference import WhisperInferenceEngine
+from mia.model.cpu_parallel import CpuParallelWhisperRunner
+from mia.model.cpu_parallel import load_whisper_for_inference
+from mia.model.quantization import quantize_whisper_dynamic
+from mia.model.quantization import compare_quantization
+from mia.data.audio.functions.io import audio_probe
+from mia.data.audio.functions.io import AUDIO_META_CACHE_PATH
+from mia.utils import jsonl_file2json_objs
+from mia.utils import json_objs2jsonl_file
 
 
 def eval(
     dataset: List[Dict], outputs_col: str, targets_col: str, lang: str
 ) -> Dict:
-    if lang not in {"mandarin"}:
-        raise "So far not support evaluation for language '%s'" % lang
-    metric_name: str = ""
-    metric: Optional[CharErrorRate] = None
-    converter: Optional[OpenCC] = None
-
-    if lang == "mandarin":
-        metric_name = "cer"
-        metric = CharErrorRate()
+    """
+    Prints corpus CER (or WER) with error breakdown, and adds each 
+    sample's error rate into `dataset` records.
+    """
+    unit: str = metrics.lang2unit(lang)
+    metric_name: str = "cer" if unit == "char" else "wer"
 
     targets: List[str] = [x[targets_col] for x in dataset]
     outputs: List[str] = [x[outputs_col] for x in dataset]
     assert len(targets) == len(outputs)
     
-    retults: Dict = {metric_name: float(metric(outputs, targets))}
+    report: Dict = metrics.error_rate(targets, outputs, unit)
+    for sample, sample_metric in zip(dataset, report.pop("samples")):
+        sample[metric_name] = sample_metric["error_rate"]
+    retults: Dict = {metric_name: report.pop("error_rate"), **report}
     print(retults)
     return retults
 
@@ -61,24 +70,55 @@ if __name__ == "__main__":
     max_sample_size: int = configs["max_sample_size"]
     groundtruth_col: str = configs["groundtruth_col"]
     use_hf_pipeline: bool = configs["use_hf_pipeline"]
+    batch_size: int = configs.get("batch_size", 1)
+    num_workers: int = configs.get("num_workers", 2)
+    # Using multi-process CPU inference with model replicas when > 1
+    cpu_num_procs: int = configs.get("cpu_num_procs", 1)
+    cpu_threads_per_proc: Optional[int] = configs.get("cpu_threads_per_proc", None)
+    # "none" or "int8_dynamic", int8 only works with CPU inference
+    quantization: str = configs.get("quantization", "none")
+    # Path of fp32 vs int8 comparison report, no comparison when it's empty
+    quantization_report_path: str = configs.get("quantization_report_path", "")
+    # Transcribing audios longer than 30s with overlapping windows
+    long_form: bool = configs.get("long_form", False)
+    long_form_overlap_sec: float = configs.get("long_form_overlap_sec", 5.0)
+    # SQLite cache of audio durations, `null` disables it
+    audio_meta_cache_path: Optional[str] = configs.get(
+        "audio_meta_cache_path", AUDIO_META_CACHE_PATH
+    )
+
+    dataset: List[Dict] = jsonl_file2json_objs(data_path)
 
-    dataset: List[Dict] = [
-        json.loads(x) for x in open(data_path, "r").read().split("\n")
-        if x not in {"", " "}
-    ]
+    if quantization_report_path != "":
+        compare_samples: List[Dict] = dataset[:max_sample_size]
+        report: Dict = compare_quantization(
+            partial(load_whisper_for_inference, model_name, processor_name, lang),
+            [x[audio_path_col] for x in compare_samples],
+            [x[groundtruth_col] for x in compare_samples] \
+                if groundtruth_col != "" else None,
+            metrics.lang2unit(lang), batch_size=batch_size,
+            num_threads=cpu_threads_per_proc or torch.get_num_threads()
+        )
+        print(report)
+        open(quantization_report_path, "w").write(json.dumps(report, indent=2))
+        print("Quantization comparison report is saved at: %s" % quantization_report_path)
 
     processor: WhisperProcessor = WhisperProcessor.from_pretrained(
         processor_name, language=lang, task="transcribe"
     )
-    model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)
-    model.config.forced_decoder_ids = processor.get_decoder_prompt_ids(
-        language=lang, task="transcribe"
-    )
+    model: Optional[WhisperForConditionalGeneration] = None
+    if use_hf_pipeline or long_form or cpu_num_procs <= 1:
+        model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)
+        model.config.forced_decoder_ids = processor.get_decoder_prompt_ids(
+            language=lang, task="transcribe"
+        )
+        if quantization == "int8_dynamic":
+            model = quantize_whisper_dynamic(model)
     inf_pipeline = None 
     if use_hf_pipeline:
         inf_pipeline = pipeline(
             "automatic-speech-recognition",
-            model=model_name, 
+            model=model, 
             tokenizer=processor.tokenizer, 
             feature_extractor=processor.feature_extractor, 
             chunk_length_s=30, return_timestamps=False
@@ -86,21 +126,54 @@ if __name__ == "__main__":
  
     results: List[Dict] = []
     target_sampling_rate: int = 16000
-    for sample in tqdm(dataset):
-        output_text: str = ""
-        if inf_pipeline:
-            output_text = inf_pipeline(
-                sample[audio_path_col], generate_kwargs={"language": lang}
-            )["text"]
-        else:
-            inputs: Tensor = None
-            inputs, _ = audio_file2model_inputs(
-                sample[audio_path_col], processor, target_sampling_rate, configs["device"]
-            ) 
-            output_ids: List[int] = model.generate(inputs).to("cpu").tolist()[0]
-            output_text = processor.tokenizer.decode(output_ids, skip_special_tokens=True)
+    output_texts: List[str] = []
+    if inf_pipeline:
+        for sample in tqdm(dataset):
+            output_texts.append(
+                inf_pipeline(
+                    sample[audio_path_col], generate_kwargs={"language": lang}
+                )["text"]
+            )
+    elif long_form:
+        engine: WhisperInferenceEngine = WhisperInferenceEngine(
+            model, processor, device=configs["device"], 
+            batch_size=batch_size, num_workers=num_workers, 
+            target_sample_rate=target_sampling_rate,
+            meta_cache_path=audio_meta_cache_path
+        )
+        output_texts = engine.transcribe_long_form(
+            [sample[audio_path_col] for sample in dataset],
+            overlap_sec=long_form_overlap_sec
+        )
+    elif cpu_num_procs > 1:
+        runner: CpuParallelWhisperRunner = CpuParallelWhisperRunner(
+            partial(
+                load_whisper_for_inference, model_name, processor_name, lang,
+                quantization=quantization
+            ),
+            num_procs=cpu_num_procs, threads_per_proc=cpu_threads_per_proc,
+            target_sample_rate=target_sampling_rate
+        )
+        output_texts = runner.transcribe(
+            [sample[audio_path_col] for sample in dataset], batch_size,
+            durations=[
+                audio_probe(x[audio_path_col], cache_path=audio_meta_cache_path)["duration_sec"] 
+                for x in dataset
+            ]
+        )
+    else:
+        engine: WhisperInferenceEngine = WhisperInferenceEngine(
+            model, processor, device=configs["device"], 
+            batch_size=batch_size, num_workers=num_workers, 
+            target_sample_rate=target_sampling_rate,
+            meta_cache_path=audio_meta_cache_path
+        )
+        output_texts = engine.transcribe(
+            [sample[audio_path_col] for sample in dataset]
+        )
          
-        output_text = output_text if lang != "mandarin" else OpenCC('tw2s.json').convert(output_text)
+    for sample, output_text in zip(dataset, output_texts):
+        output_text = output_text if lang != "mandarin" else text_norm.convert(output_text, "tw2s.json")
         sample[output_text_col] = output_text
         results.append(sample)
     
@@ -108,13 +181,10 @@ if __name__ == "__main__":
         for x in results:
             x[groundtruth_col] = \
                 x[groundtruth_col] if lang != "mandarin" \
-                else OpenCC('tw2s.json').convert(x[groundtruth_col])
+                else text_norm.convert(x[groundtruth_col], "tw2s.json")
         eval(results, output_text_col, groundtruth_col, lang) 
 
-    out_file = open(output_path, "w")
-    for sample in results:
-        out_file.write(json.dumps(sample, ensure_ascii=False) + "\n")
-    out_file.close()
+    json_objs2jsonl_file(output_path, results)
     print("Inference results are dumped at: %s" % output_path)
 
 
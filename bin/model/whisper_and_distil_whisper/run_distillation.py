@@ -13,7 +13,7 @@ import json
 import torch
 from tqdm import tqdm
 from torch import nn
-from typing import List, Dict, Callable, Optional
+from typing import List, Dict, Callable, Optional, Tuple
 from datasets import DatasetDict
 from transformers import WhisperProcessor
 from transformers import WhisperTokenizer
@@ -25,22 +25,26 @@ from torch import Tensor
 from torch.optim import AdamW
 from torch.optim.lr_scheduler import ExponentialLR
 from torch.nn import Module
-from torchmetrics import Metric
-from torchmetrics.text import CharErrorRate, WordErrorRate
 
+from mia import metrics
 from mia.data.audio import functions as F
 from mia.data.audio.functions.dataset import fn_gen_hf_dataset_filter_by_asr_data
 from mia.data.audio.collator import DataCollatorSpeechSeq2SeqWithPaddingV1
+from mia.data.audio.feature_store import LogMelFeatureStore
+from mia.data.audio.sampler import BucketBatchSampler
+from mia.model.teacher_logit_store import TeacherLogitStore
+from mia.model.teacher_logit_store import teacher_fingerprint
+from mia.model.teacher_logit_store import teacher_logit_store_build
+from mia.model.teacher_logit_store import sparse_kl_divergence
+from mia.model.teacher_logit_store import topk_kl_divergence
+from mia.model.teacher_logit_store import TeacherEvalCache
+from mia.model.teacher_logit_store import KeepPathsCollator
 
 
 def cal_cer_or_wer(targets: List[str], outputs: List[str], lang: str) -> float:
-    metric: Optional[Metric] = None
-
-    if lang.lower() in {"zh", "chinese", "mandarin", "zh-tw", "zh-cn"}:
-        metric = CharErrorRate()
-    else:
-        metric = WordErrorRate()
-    return metric(outputs, targets)
+    return metrics.error_rate(
+        targets, outputs, metrics.lang2unit(lang)
+    )["error_rate"]
 
 
 def get_parameter_names(
@@ -90,12 +94,16 @@ def train_step(
     labels: Tensor = batch["labels"]
     inputs: Tensor = batch["input_features"]
     
-    labels = labels.to(teacher_model_device)
-    inputs = inputs.to(teacher_model_device)
-    with torch.no_grad():
-        teacher_model_outputs: Dict[str, Tensor] = teacher_model(
-            input_features=inputs, labels=labels
-        )
+    # Teacher forward is skipped when the collator got teacher's top-k 
+    # logits from `TeacherLogitStore`
+    teacher_model_outputs: Optional[Dict[str, Tensor]] = None
+    if "teacher_topk_values" not in batch:
+        labels = labels.to(teacher_model_device)
+        inputs = inputs.to(teacher_model_device)
+        with torch.no_grad():
+            teacher_model_outputs = teacher_model(
+                input_features=inputs, labels=labels
+            )
 
     labels = labels.to(student_model_device)
     inputs = inputs.to(student_model_device)
@@ -104,18 +112,25 @@ def train_step(
     )
 
     # Dimension: batch-size * padded-token-number * token-vocab-size
-    teacher_logits: Tensor = teacher_model_outputs["logits"]
     student_logits: Tensor = student_model_outputs["logits"]
-    teacher_outputs_dist: Tensor = nn.functional.softmax(
-        teacher_logits / temperature, dim=-1
-    ).to(student_model_device)
     student_outputs_log_dist: Tensor = nn.functional.log_softmax(
         student_logits / temperature, dim=-1
     )
     loss_pl: Tensor = student_model_outputs.loss
-    loss_kl: Tensor = kl_divergence(
-        teacher_outputs_dist, student_outputs_log_dist, labels
-    ) * pow(temperature, 2)
+    loss_kl: Tensor = None
+    if teacher_model_outputs is None:
+        loss_kl = sparse_kl_divergence(
+            batch["teacher_topk_values"], batch["teacher_topk_indices"], 
+            student_outputs_log_dist, labels, temperature
+        ) * pow(temperature, 2)
+    else:
+        teacher_logits: Tensor = teacher_model_outputs["logits"]
+        teacher_outputs_dist: Tensor = nn.functional.softmax(
+            teacher_logits / temperature, dim=-1
+        ).to(student_model_device)
+        loss_kl = kl_divergence(
+            teacher_outputs_dist, student_outputs_log_dist, labels
+        ) * pow(temperature, 2)
     loss: Tensor = 0.8 * loss_pl + 1.0 * loss_kl
     
     all_loss: Dict = {
@@ -132,19 +147,46 @@ def eval_step(
     teacher_model_device: torch.device,
     student_model_device: torch.device,
     temperature: int=2.0,
+    paths: Optional[List[str]]=None,
+    teacher_eval_cache: Optional[TeacherEvalCache]=None
 ) -> Dict[str, Tensor]:
+    """
+    Args:
+        paths: Audio paths of `batch`, needed by `teacher_eval_cache`.
+        teacher_eval_cache: When given, teacher's top-k logits and 
+            transcripts are computed once and then read from the cache, and 
+            KL divergence is computed against teacher's top-k distribution.
+            It's reported as "topk_kl" instead of "loss" and "loss_kl", 
+            since it's not comparable with full vocabulary KL divergence.
+    """
     teacher_model.eval()
     student_model.eval()
     
     labels: Tensor = batch["labels"]
     inputs: Tensor = batch["input_features"]
 
-    labels = labels.to(teacher_model_device)
-    inputs = inputs.to(teacher_model_device)
-    with torch.no_grad():
-        teacher_model_outputs: Dict[str, Tensor] = teacher_model(
-            input_features=inputs, labels=labels
+    teacher_model_outputs: Optional[Dict[str, Tensor]] = None
+    teacher_output_texts: Optional[List[str]] = None
+    cached: Optional[Tuple[Tensor, Tensor, List[str]]] = None
+    if teacher_eval_cache is not None:
+        cached = teacher_eval_cache.get(paths, labels)
+
+    if cached is None:
+        labels = labels.to(teacher_model_device)
+        inputs = inputs.to(teacher_model_device)
+        with torch.no_grad():
+            teacher_model_outputs = teacher_model(
+                input_features=inputs, labels=labels
+            )
+        teacher_output_texts = tokenizer.batch_decode(
+            teacher_model.generate(inputs=inputs), skip_special_tokens=True
         )
+        if teacher_eval_cache is not None:
+            teacher_eval_cache.put(
+                paths, labels.cpu(), teacher_model_outputs["logits"].cpu(), 
+                teacher_output_texts
+            )
+            cached = teacher_eval_cache.get(paths, labels.cpu())
         
     labels = labels.to(student_model_device)
     inputs = inputs.to(student_model_device)
@@ -154,34 +196,35 @@ def eval_step(
         )
     
     # Dimension: batch-size * padded-token-number * token-vocab-size
-    teacher_logits: Tensor = teacher_model_outputs["logits"]
     student_logits: Tensor = student_model_outputs["logits"]
-    teacher_outputs_dist: Tensor = nn.functional.softmax(
-        teacher_logits / temperature, dim=-1
-    ).to(student_model_device)
     student_outputs_log_dist: Tensor = nn.functional.log_softmax(
         student_logits / temperature, dim=-1
     )
     loss_pl: Tensor = student_model_outputs.loss
-    loss_kl: Tensor = kl_divergence(
-        teacher_outputs_dist, student_outputs_log_dist, labels
-    ) * pow(temperature, 2)
-    loss: Tensor = 0.8 * loss_pl + 1.0 * loss_kl
-
-    all_metrics: Dict = {
-        "loss": loss.cpu().tolist(), 
-        "loss_pl": loss_pl.cpu().tolist(), "loss_kl": loss_kl.cpu().tolist()
-    }
+    all_metrics: Dict = {"loss_pl": loss_pl.cpu().tolist()}
+    if cached is not None:
+        # Same top-k KL in first and later evaluations, so they are comparable
+        topk_kl: Tensor = topk_kl_divergence(
+            cached[0], cached[1], student_outputs_log_dist, labels, temperature
+        ) * pow(temperature, 2)
+        all_metrics["topk_kl"] = topk_kl.cpu().tolist()
+        teacher_output_texts = cached[2]
+    else:
+        teacher_logits: Tensor = teacher_model_outputs["logits"]
+        teacher_outputs_dist: Tensor = nn.functional.softmax(
+            teacher_logits / temperature, dim=-1
+        ).to(student_model_device)
+        loss_kl: Tensor = kl_divergence(
+            teacher_outputs_dist, student_outputs_log_dist, labels
+        ) * pow(temperature, 2)
+        loss: Tensor = 0.8 * loss_pl + 1.0 * loss_kl
+        all_metrics["loss"] = loss.cpu().tolist()
+        all_metrics["loss_kl"] = loss_kl.cpu().tolist()
 
     target_texts: List[str] = tokenizer.batch_decode(
         labels, skip_special_tokens=True
     )
 
-    inputs = inputs.to(teacher_model_device)
-    teacher_output_texts: List[str] = tokenizer.batch_decode(
-        teacher_model.generate(inputs=inputs), skip_special_tokens=True
-    )
-    inputs = inputs.to(student_model_device)
     student_output_texts: List[str] = tokenizer.batch_decode(
         student_model.generate(inputs=inputs), skip_special_tokens=True
     )
@@ -196,10 +239,10 @@ def eval_step(
     ]
     teacher_metric: float = cal_cer_or_wer(
         target_texts, teacher_output_texts, tokenizer.language
-    ).cpu().tolist()
+    )
     student_metric: float = cal_cer_or_wer(
         target_texts, student_output_texts, tokenizer.language
-    ).cpu().tolist()
+    )
     all_metrics["teacher_cer/wer"] = teacher_metric
     all_metrics["student_cer/wer"] = student_metric
     return all_metrics
@@ -236,20 +279,23 @@ def eval_loop(
     student_model: WhisperForConditionalGeneration,
     teacher_model_device: torch.device,
     student_model_device: torch.device,
-    temperature: int=2.0
+    temperature: int=2.0,
+    teacher_eval_cache: Optional[TeacherEvalCache]=None
 ) -> None:
-    metrics_recorder: Dict[str, List] = {
-        "loss": [], "loss_pl": [], "loss_kl": [], 
-        "teacher_cer/wer": [], "student_cer/wer": []
-    }
-    for batch in tqdm(dataloader):
+    """
+    Args:
+        dataloader: Yields `(paths, batch)` with `KeepPathsCollator`.
+    """
+    # Keys depend on `teacher_eval_cache`, see `eval_step`
+    metrics_recorder: Dict[str, List] = {}
+    for paths, batch in tqdm(dataloader):
         all_metrics: Dict[str, Tensor] = eval_step(
             batch, tokenizer, teacher_model, student_model,
             teacher_model_device, student_model_device,
-            temperature
+            temperature, paths, teacher_eval_cache
         )
-        for k in metrics_recorder:
-            metrics_recorder[k].append(all_metrics[k])
+        for k, v in all_metrics.items():
+            metrics_recorder.setdefault(k, []).append(v)
     
     all_metrics: Dict[str, float] = {}
     for k in metrics_recorder:
@@ -286,7 +332,8 @@ if __name__ == "__main__":
         data_configs["test_jsonl_path"],
         sample_id_col="", 
         audio_duration_col=data_configs["audio_duration_col"],
-        audio_path_col=data_configs["audio_path_col"]
+        audio_path_col=data_configs["audio_path_col"],
+        meta_cache_path=data_configs.get("audio_meta_cache_path", None)
     )
     dataset_filter: Callable = fn_gen_hf_dataset_filter_by_asr_data(
         processor.tokenizer,
@@ -295,7 +342,8 @@ if __name__ == "__main__":
         min_token_num=data_configs["min_token_num"], 
         max_token_num=data_configs["max_token_num"],
         audio_path_col=data_configs["audio_path_col"],
-        text_col=data_configs["text_col"]
+        text_col=data_configs["text_col"],
+        audio_duration_col=data_configs["audio_duration_col"]
     )
     datasets_dict = datasets_dict.filter(dataset_filter, num_proc=4)
 
@@ -305,8 +353,23 @@ if __name__ == "__main__":
         num_proc=4
     )
 
-    collator: DataCollatorSpeechSeq2SeqWithPaddingV1 = \
-        DataCollatorSpeechSeq2SeqWithPaddingV1(
+    # Label token number used to bucket samples with similar length
+    datasets_dict = datasets_dict.map(
+        lambda x: {
+            "token_num": [
+                len(y) for y in processor.tokenizer(x[data_configs["text_col"]]).input_ids
+            ]
+        }, 
+        batched=True, num_proc=4
+    )
+
+    feature_store: Optional[LogMelFeatureStore] = None
+    if data_configs.get("feature_store_dir", None) not in {None, ""}:
+        print("Using pre-computed features at '%s'" % data_configs["feature_store_dir"])
+        feature_store = LogMelFeatureStore(data_configs["feature_store_dir"])
+
+    collators: Dict[str, DataCollatorSpeechSeq2SeqWithPaddingV1] = {
+        split: DataCollatorSpeechSeq2SeqWithPaddingV1(
             processor, 
             lang=common_configs["lang"],
             path_col=data_configs["audio_path_col"],
@@ -315,8 +378,43 @@ if __name__ == "__main__":
             model_input_col="input_features",
             model_label_col="labels",
             sample_id_col="",
-            target_sample_rate=common_configs["sampling_rate"]
+            target_sample_rate=common_configs["sampling_rate"],
+            spec_argument=(split == "train" and train_configs.get("spec_argument", False)),
+            feature_store=feature_store,
+            seed=train_configs.get("seed", None)
+        ) for split in ["train", "validation"]
+    }
+
+    teacher_model_device: torch.device = torch.device(train_configs["teacher_model_device"])
+    student_model_device: torch.device = torch.device(train_configs["student_model_device"])
+
+    # Hashes weight files of a local teacher, so it's computed only once
+    teacher_version: Optional[str] = None
+    if data_configs.get("teacher_logit_store_dir", "") not in {None, ""} \
+            or data_configs.get("teacher_eval_cache_dir", "") not in {None, ""}:
+        teacher_version = teacher_fingerprint(teacher_model)
+
+    # Pre-pass which runs teacher once over training data and keeps its 
+    # top-k logits, so training batches do not need teacher forward pass. 
+    # Note stored logits are computed on inputs without SpecAugment.
+    if data_configs.get("teacher_logit_store_dir", "") not in {None, ""}:
+        teacher_logit_store: TeacherLogitStore = TeacherLogitStore(
+            data_configs["teacher_logit_store_dir"], 
+            top_k=data_configs.get("teacher_logit_top_k", 32),
+            teacher=teacher_version
+        )
+        teacher_model.config.forced_decoder_ids = processor.get_decoder_prompt_ids(
+            language=common_configs["lang"], task="transcribe"
         )
+        teacher_logit_store_build(
+            teacher_logit_store, datasets_dict["train"], 
+            collators["validation"], teacher_model.to(teacher_model_device), 
+            device=teacher_model_device, 
+            path_col=data_configs["audio_path_col"],
+            batch_size=train_configs["batch_size"]
+        )
+        collators["train"].teacher_logit_store = teacher_logit_store
+        print("Teacher logit store has %i samples" % len(teacher_logit_store))
 
     """TODO
     a = get_parameter_names(student_model, [nn.LayerNorm], 
@@ -336,9 +434,6 @@ if __name__ == "__main__":
         optimizer, gamma=train_configs["lr_decay_gamma"]
     )
 
-    teacher_model_device: torch.device = torch.device(train_configs["teacher_model_device"])
-    student_model_device: torch.device = torch.device(train_configs["student_model_device"])
-    
     teacher_model = teacher_model.to(teacher_model_device)
     student_model = student_model.to(student_model_device)
     
@@ -349,16 +444,32 @@ if __name__ == "__main__":
         language=common_configs["lang"], task="transcribe"
     )
 
+    train_batch_sampler: BucketBatchSampler = BucketBatchSampler(
+        datasets_dict["train"][data_configs["audio_duration_col"]],
+        datasets_dict["train"]["token_num"],
+        batch_size=train_configs["batch_size"],
+        max_tokens=train_configs.get("max_tokens_per_batch", None),
+        shuffle=True,
+        seed=train_configs.get("seed", 42)
+    )
     train_dataloader: DataLoader = DataLoader(
         datasets_dict["train"],
-        collate_fn=collator, 
-        batch_size=train_configs["batch_size"], 
-        num_workers=4,
-        shuffle=True
+        collate_fn=collators["train"], 
+        batch_sampler=train_batch_sampler,
+        num_workers=4
     )
+    teacher_eval_cache: Optional[TeacherEvalCache] = None
+    if data_configs.get("teacher_eval_cache_dir", "") not in {None, ""}:
+        teacher_eval_cache = TeacherEvalCache(
+            data_configs["teacher_eval_cache_dir"], 
+            teacher_version, data_configs["dev_jsonl_path"],
+            top_k=data_configs.get("teacher_logit_top_k", 32)
+        )
+        print("Caching teacher evaluation outputs at '%s'" % teacher_eval_cache.cache_dir)
+
     dev_dataloader: DataLoader = DataLoader(
         datasets_dict["validation"],
-        collate_fn=collator, 
+        collate_fn=KeepPathsCollator(collators["validation"], data_configs["audio_path_col"]), 
         batch_size=train_configs["batch_size"], 
         num_workers=4
     )
@@ -366,6 +477,7 @@ if __name__ == "__main__":
     for epoch in range(train_configs["epochs"]):
         print("training log: epoch=%i" % epoch)
         print("lr=%f" % lr_scheduler.get_lr()[0])
+        train_batch_sampler.set_epoch(epoch)
         train_loop(
             train_dataloader, teacher_model, student_model, optimizer, 
             teacher_model_device, student_model_device, 
@@ -374,7 +486,7 @@ if __name__ == "__main__":
         eval_loop(
             dev_dataloader, processor.tokenizer, teacher_model, student_model, 
             teacher_model_device, student_model_device,
-            2.0
+            2.0, teacher_eval_cache
         )
         ckpt_dir: str = os.path.join(model_configs["distil_model_path"], "ckpt_%i" % epoch)
         student_model.save_pretrained(ckpt_dir)
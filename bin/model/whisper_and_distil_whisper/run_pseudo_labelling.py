@@ -5,6 +5,17 @@
 # Usage:
 # python ./bin/model/distil_whisper/run_pseudo_labelling.py ./demo_configs/model/distil_whisper/run_pseudo_labelling.json
 #
+# Sharded run on N machines, each labels samples which line index `% N == i`
+# into `<output_path>.shard-<i>-of-<N>`, then merge all shards into 
+# `<output_path>`:
+# python ./bin/model/distil_whisper/run_pseudo_labelling.py ./demo_configs/model/distil_whisper/run_pseudo_labelling.json --shard 0/4
+# python ./bin/model/distil_whisper/run_pseudo_labelling.py ./demo_configs/model/distil_whisper/run_pseudo_labelling.json --merge 4
+#
+# Re-running an interrupted run with same arguments resumes it, samples 
+# whose `sample_id_col` already in output are skipped. `sample_id_col` is
+# filled with input line index, so it must not be an existing input column 
+# with other values.
+#
 # Notes:
 # The naming of pseudo labeled text field maybe be a little confusing here.
 # In most case, we only do pseudo labeling on training data, and using 
@@ -22,16 +33,62 @@ import os
 import json
 import torch
 import torchaudio
+from functools import partial
 from tqdm import tqdm
-from opencc import OpenCC
 from torch import Tensor
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Iterator, Tuple
 from datasets import Audio
 from transformers import AutoModelForSpeechSeq2Seq
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
-from torchmetrics.text import CharErrorRate
 
-from mia.data.audio.functions import audio_file2model_inputs
+from mia import text_norm
+from mia import metrics
+from mia.data.audio.functions import audio_batch2model_inputs
+from mia.utils import jsonl_iter
+from mia.utils import jsonl_repair_tail
+from mia.utils import jsonl_merge_sorted
+from mia.utils import JsonlWriter
+from mia.model.cpu_parallel import CpuParallelWhisperRunner
+from mia.model.cpu_parallel import load_whisper_for_inference
+
+
+def get_cli_option(argv: List[str], name: str) -> Optional[str]:
+    if name not in argv:
+        return None
+    return argv[argv.index(name) + 1]
+
+
+def shard_output_path(output_path: str, shard_id: int, shard_num: int) -> str:
+    if shard_num == 1:
+        return output_path
+    return "%s.shard-%i-of-%i" % (output_path, shard_id, shard_num)
+
+
+def iter_pending_batches(
+    data_path: str, batch_size: int, 
+    shard_id: int, shard_num: int, 
+    done_ids: Set[int], sample_id_col: str, max_sample_size: int
+) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    for idx, sample in enumerate(jsonl_iter(data_path)):
+        if idx >= max_sample_size:
+            break
+        # Resuming and merging rely on it being the line index
+        if sample.get(sample_id_col, idx) != idx:
+            raise Exception(
+                "Line %i of '%s' already has '%s' = %s, set `sample_id_col` "
+                "to a column not in input data" 
+                % (idx, data_path, sample_id_col, sample[sample_id_col])
+            )
+        if idx % shard_num != shard_id or idx in done_ids:
+            continue
+        sample[sample_id_col] = idx
+        batch.append(sample)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
 
 
 if __name__ == "__main__":
@@ -50,52 +107,110 @@ if __name__ == "__main__":
     origin_text_col: str = "origin_%s" % configs["target_text_col"]
     metric_col: str = configs["metric_col"]
     metric_to_use: str = configs["metric_to_use"]
+    batch_size: int = configs.get("batch_size", 1)
+    sample_id_col: str = configs.get("sample_id_col", "sample_id")
+    flush_every: int = configs.get("flush_every", 100)
+    # Using multi-process CPU inference with model replicas when > 1
+    cpu_num_procs: int = configs.get("cpu_num_procs", 1)
+    cpu_threads_per_proc: Optional[int] = configs.get("cpu_threads_per_proc", None)
 
-    dataset: List[Dict] = [
-        json.loads(x) for x in open(data_path, "r").read().split("\n")
-        if x not in {"", " "}
-    ]
+    shard_id: int = 0
+    shard_num: int = 1
+    if get_cli_option(sys.argv, "--shard") is not None:
+        shard_id, shard_num = [
+            int(x) for x in get_cli_option(sys.argv, "--shard").split("/")
+        ]
+        if shard_id < 0 or shard_id >= shard_num:
+            raise Exception("Invalid shard '%i/%i'" % (shard_id, shard_num))
 
-    processor: WhisperProcessor = WhisperProcessor.from_pretrained(
-        processor_name, language=lang, task="transcribe"
-    )
-    model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)
-    model.config.forced_decoder_ids = processor.get_decoder_prompt_ids(
-        language=lang, task="transcribe"
-    )
- 
-    results: List[Dict] = []
-    target_sampling_rate: int = 16000
-    for sample in tqdm(dataset):
-        # Backup original target text
-        sample[origin_text_col] = sample[target_text_col]
+    if get_cli_option(sys.argv, "--merge") is not None:
+        shard_paths: List[str] = [
+            shard_output_path(output_path, i, int(get_cli_option(sys.argv, "--merge")))
+            for i in range(int(get_cli_option(sys.argv, "--merge")))
+        ]
+        for path in shard_paths:
+            if not os.path.exists(path):
+                raise Exception("Shard '%s' does not exist" % path)
+        jsonl_merge_sorted(shard_paths, output_path, key=lambda x: x[sample_id_col])
+        print("Merged %i shards into: %s" % (len(shard_paths), output_path))
+        sys.exit(0)
+
+    out_path: str = shard_output_path(output_path, shard_id, shard_num)
+    done_ids: Set[int] = set()
+    if os.path.exists(out_path):
+        if jsonl_repair_tail(out_path) > 0:
+            print("Removed incomplete last record of '%s'" % out_path)
+        done_ids = set(x[sample_id_col] for x in jsonl_iter(out_path))
+        print("Resuming with %i finished samples" % len(done_ids))
 
-        inputs: Tensor = None
-        inputs, _ = audio_file2model_inputs(
-            sample["path"], processor, target_sampling_rate, configs["device"]
+    out_file: JsonlWriter = JsonlWriter(out_path, "a", flush_every=flush_every)
+    target_sampling_rate: int = 16000
+    pending_batches: Iterator[List[Dict]] = iter_pending_batches(
+        data_path, batch_size, shard_id, shard_num, 
+        done_ids, sample_id_col, max_sample_size
+    )
+    labelled_batches: Iterator[Tuple[List[Dict], List[str]]] = None
+    if cpu_num_procs > 1:
+        runner: CpuParallelWhisperRunner = CpuParallelWhisperRunner(
+            partial(load_whisper_for_inference, model_name, processor_name, lang),
+            num_procs=cpu_num_procs, threads_per_proc=cpu_threads_per_proc,
+            target_sample_rate=target_sampling_rate
         )
-        output_ids: List[int] = model.generate(inputs).to("cpu").tolist()[0]
-        output_text: str = processor.tokenizer.decode(output_ids, skip_special_tokens=True)
-        sample[target_text_col] = output_text
-
-        if lang in {"mandarin", "zh-TW", "zh-CN", "zh"}:
-            converter: OpenCC = OpenCC('tw2s.json')
-            sample[origin_text_col] = converter.convert(sample[origin_text_col])
-            sample[target_text_col] = converter.convert(sample[target_text_col])
-        
-        if metric_to_use == "cer":
-            sample[metric_col] = CharErrorRate()(
-                sample[target_text_col], sample[origin_text_col]
-            ).to("cpu").tolist()
-        else:
-            raise Exception("Currently not support metrics '%s'" % metric_to_use)
-        
-        results.append(sample)
-
-    out_file = open(output_path, "w")
-    for sample in results:
-        out_file.write(json.dumps(sample, ensure_ascii=False) + "\n")
-    out_file.close()
-    print("Inference results are dumped at: %s" % output_path)
+        # Keeping batches, since runner only sees their audio paths
+        submitted_batches: List[List[Dict]] = []
+        def _iter_paths() -> Iterator[List[str]]:
+            for batch in pending_batches:
+                submitted_batches.append(batch)
+                yield [sample["path"] for sample in batch]
+        labelled_batches = (
+            (submitted_batches.pop(0), output_texts) 
+            for output_texts in runner.imap(_iter_paths())
+        )
+    else:
+        model: WhisperForConditionalGeneration = None
+        processor: WhisperProcessor = None
+        model, processor = load_whisper_for_inference(
+            model_name, processor_name, lang, configs["device"]
+        )
+        def _run_batches() -> Iterator[Tuple[List[Dict], List[str]]]:
+            for batch in pending_batches:
+                inputs: Tensor = None
+                inputs, _ = audio_batch2model_inputs(
+                    [sample["path"] for sample in batch], 
+                    processor, target_sampling_rate, configs["device"]
+                )
+                output_ids: Tensor = model.generate(inputs).to("cpu")
+                yield (
+                    batch, 
+                    processor.tokenizer.batch_decode(
+                        output_ids, skip_special_tokens=True
+                    )
+                )
+        labelled_batches = _run_batches()
+
+    if metric_to_use not in {"cer", "wer"}:
+        raise Exception("Currently not support metrics '%s'" % metric_to_use)
+    metric_unit: str = "char" if metric_to_use == "cer" else "word"
 
+    for batch, output_texts in tqdm(labelled_batches):
+        for sample, output_text in zip(batch, output_texts):
+            # Backup original target text
+            sample[origin_text_col] = sample[target_text_col]
+            sample[target_text_col] = output_text
 
+            if lang in {"mandarin", "zh-TW", "zh-CN", "zh"}:
+                sample[origin_text_col] = text_norm.convert(sample[origin_text_col])
+                sample[target_text_col] = text_norm.convert(sample[target_text_col])
+            
+        # Per-sample error rates of whole batch in one alignment pass
+        sample_metrics: List[Dict] = metrics.error_rate(
+            [sample[origin_text_col] for sample in batch], 
+            [sample[target_text_col] for sample in batch], 
+            metric_unit
+        )["samples"]
+        for sample, sample_metric in zip(batch, sample_metrics):
+            sample[metric_col] = sample_metric["error_rate"]
+            out_file.write(sample)
+
+    out_file.close()
+    print("Inference results are dumped at: %s" % out_path)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# file: collator_pad_bench.py
+# date: 2026-10-18
+#
+# Usage:
+# python dev/mia/data/audio/collator_pad_bench.py 16 10
+#
+# Compares collator's previous feature padding path (nested Python lists
+# through `feature_extractor.pad`) with tensor-native `features_pad_stack`.
+
+
+import sys
+import time
+import torch
+from torch import Tensor
+from typing import Dict, List
+from transformers import WhisperFeatureExtractor
+
+from mia.data.audio.functions import features_pad_stack
+
+
+if __name__ == "__main__":
+    batch_size: int = int(sys.argv[1])
+    rounds: int = int(sys.argv[2])
+
+    fea_extractor: WhisperFeatureExtractor = WhisperFeatureExtractor()
+    features: List[Tensor] = [torch.randn(1, 80, 3000) for _ in range(batch_size)]
+
+    start: float = time.time()
+    for _ in range(rounds):
+        before: Tensor = fea_extractor.pad(
+            [{"input_features": x.tolist()[0]} for x in features], 
+            return_tensors="pt"
+        )["input_features"]
+    before_sec: float = (time.time() - start) / rounds
+
+    start = time.time()
+    for _ in range(rounds):
+        after: Tensor = features_pad_stack(features)
+    after_sec: float = (time.time() - start) / rounds
+
+    assert(torch.equal(before, after))
+    print({
+        "batch_size": batch_size,
+        "list_pad_ms_per_batch": round(before_sec * 1000, 2),
+        "tensor_pad_ms_per_batch": round(after_sec * 1000, 2),
+        "speedup": round(before_sec / after_sec, 1)
+    })
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# file: log_mel_batch_bench.py
+# date: 2026-10-18
+#
+# Usage:
+# python dev/mia/data/audio/log_mel_batch_bench.py ./demo_data/demo_jsonl_dataset.jsonl 16 10
+#
+# Compares per-sample HF feature extractor path (`audio_file2model_inputs`) 
+# with batched torch log-mel path (`waveforms2log_mel`) on same waveforms, 
+# audio decoding is excluded from timing.
+
+
+import sys
+import time
+import torch
+from torch import Tensor
+from typing import Dict, List
+from transformers import WhisperFeatureExtractor
+
+from mia.utils import jsonl_file2json_objs
+from mia.data.audio import functions as F
+
+
+TARGET_SAMPLE_RATE: int = 16000
+
+
+if __name__ == "__main__":
+    jsonl_path: str = sys.argv[1]
+    batch_size: int = int(sys.argv[2])
+    rounds: int = int(sys.argv[3])
+
+    fea_extractor: WhisperFeatureExtractor = WhisperFeatureExtractor()
+    samples: List[Dict] = jsonl_file2json_objs(jsonl_path)
+    waveforms: List[Tensor] = [
+        F.audio_file2waveform(samples[i % len(samples)]["path"], TARGET_SAMPLE_RATE)[0]
+        for i in range(batch_size)
+    ]
+
+    start: float = time.time()
+    for _ in range(rounds):
+        per_sample: List[Tensor] = [
+            fea_extractor(
+                x.numpy(), sampling_rate=TARGET_SAMPLE_RATE, return_tensors="pt"
+            ).input_features for x in waveforms
+        ]
+    per_sample_sec: float = (time.time() - start) / rounds
+
+    start = time.time()
+    for _ in range(rounds):
+        batched: Tensor = F.waveforms2log_mel(waveforms, fea_extractor)
+    batched_sec: float = (time.time() - start) / rounds
+
+    max_diff: float = (torch.cat(per_sample) - batched).abs().max().item()
+    print({
+        "batch_size": batch_size, 
+        "per_sample_ms_per_batch": round(per_sample_sec * 1000, 2),
+        "batched_ms_per_batch": round(batched_sec * 1000, 2),
+        "speedup": round(per_sample_sec / batched_sec, 2),
+        "max_abs_diff": max_diff
+    })
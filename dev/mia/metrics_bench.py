@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# file: metrics_bench.py
+# date: 2026-10-18
+#
+# Usage:
+# python dev/mia/metrics_bench.py 20000 1
+#
+# Compares corpus CER of torchmetrics (per-sample Python edit distance)
+# with batched `mia.metrics.cer` on random Chinese-like utterances.
+
+
+import sys
+import time
+import random
+from typing import List
+from torchmetrics.text import CharErrorRate
+
+from mia.metrics import cer
+
+
+if __name__ == "__main__":
+    sample_num: int = int(sys.argv[1])
+    num_proc: int = int(sys.argv[2])
+
+    rd: random.Random = random.Random(0)
+    vocab: List[str] = [chr(0x4e00 + i) for i in range(500)]
+    targets: List[str] = [
+        "".join(rd.choice(vocab) for _ in range(rd.randint(5, 40)))
+        for _ in range(sample_num)
+    ]
+    outputs: List[str] = [
+        "".join(c if rd.random() > 0.1 else rd.choice(vocab) for c in x)
+        for x in targets
+    ]
+
+    start: float = time.time()
+    torchmetrics_cer: float = float(CharErrorRate()(outputs, targets))
+    print("torchmetrics: %.4f in %.2fs" % (torchmetrics_cer, time.time() - start))
+
+    start = time.time()
+    batched_cer: float = cer(targets, outputs, num_proc=num_proc)
+    print("mia.metrics: %.4f in %.2fs" % (batched_cer, time.time() - start))
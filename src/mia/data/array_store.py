@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# file: array_store.py
+# date: 2026-10-18
+
+
+import os
+import json
+import torch
+import numpy as np
+from torch import Tensor
+from numpy import ndarray
+from typing import Dict, List, Optional, Any
+
+from ..utils import jsonl_repair_tail
+
+
+class ArrayStore:
+    """
+    Sharded and memory-mapped store of arrays of one dtype, keyed by
+    string.
+
+    Layout of `store_dir`:
+        * `shard-00000.bin`: Raw C-ordered arrays.
+        * `index.jsonl`: One record per array with `key`, `path`, `shard`,
+          `offset` (in bytes), `shape` and extra metadata given to `put`.
+        * `meta.json`: Store level settings like `dtype`.
+
+    Shards are mapped in copy-on-write mode, so `get_array` returns tensors
+    which share memory with page cache instead of reading/copying them.
+
+    A record is appended to the index only after its array is flushed to
+    shard, so an interrupted building leaves at most a partial last index
+    line and unindexed shard bytes, both are dropped when re-opening and
+    missing arrays can be put again. A store has only one writer.
+    """
+    def __init__(self,
+        store_dir: str, dtype: str="float32", max_shard_bytes: int=2 ** 30
+    ):
+        self.store_dir: str = store_dir
+        self.max_shard_bytes: int = max_shard_bytes
+        self.meta_path: str = os.path.join(store_dir, "meta.json")
+        self.index_path: str = os.path.join(store_dir, "index.jsonl")
+
+        os.makedirs(store_dir, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            self.dtype: np.dtype = np.dtype(
+                json.loads(open(self.meta_path, "r").read())["dtype"]
+            )
+        else:
+            self.dtype: np.dtype = np.dtype(dtype)
+            open(self.meta_path, "w").write(json.dumps({"dtype": self.dtype.name}))
+
+        self.index: Dict[str, Dict] = {}
+        if os.path.exists(self.index_path):
+            jsonl_repair_tail(self.index_path)
+            records: List[Dict] = [
+                json.loads(x) for x in open(self.index_path, "r") if x.strip() != ""
+            ]
+            shard_sizes: Dict[int, int] = {}
+            for record in records:
+                if record["shard"] not in shard_sizes:
+                    path: str = self.shard_path(record["shard"])
+                    shard_sizes[record["shard"]] = \
+                        os.path.getsize(path) if os.path.exists(path) else 0
+                if record["offset"] + self.record_nbytes(record) \
+                        <= shard_sizes[record["shard"]]:
+                    self.index[record["key"]] = record
+            if len(self.index) < len(records):
+                print("Dropping %i records of '%s' without shard data" % (
+                    len(records) - len(self.index), self.index_path
+                ))
+                with open(self.index_path + ".tmp", "w") as index_file:
+                    for record in self.index.values():
+                        index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                os.replace(self.index_path + ".tmp", self.index_path)
+
+        self._mmaps: Dict[int, ndarray] = {}
+        self._pid: int = os.getpid()
+        self._shard_file = None
+        self._index_file = None
+        self._shard_id: int = -1
+
+    def __getstate__(self) -> Dict:
+        state: Dict = self.__dict__.copy()
+        state["_mmaps"] = {}
+        state["_shard_file"] = None
+        state["_index_file"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def shard_path(self, shard_id: int) -> str:
+        return os.path.join(self.store_dir, "shard-%05i.bin" % shard_id)
+
+    def _get_mmap(self, shard_id: int) -> ndarray:
+        if self._pid != os.getpid():
+            self._mmaps = {}
+            self._pid = os.getpid()
+        if shard_id not in self._mmaps:
+            self._mmaps[shard_id] = np.memmap(
+                self.shard_path(shard_id), dtype=self.dtype, mode="c"
+            )
+        return self._mmaps[shard_id]
+
+    def record_nbytes(self, record: Dict) -> int:
+        return int(np.prod(record["shape"])) * self.dtype.itemsize
+
+    def _open_shard(self, shard_id: int) -> None:
+        path: str = self.shard_path(shard_id)
+        # Bytes after last indexed array are left by an interrupted building
+        end: int = max([
+            x["offset"] + self.record_nbytes(x) 
+            for x in self.index.values() if x["shard"] == shard_id
+        ] + [0])
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            os.truncate(path, end)
+            self._mmaps = {}
+        self._shard_id = shard_id
+        self._shard_file = open(path, "ab")
+
+    def get_record(self, key: str) -> Optional[Dict]:
+        return self.index.get(key, None)
+
+    def get_array(self, key: str) -> Optional[Tensor]:
+        record: Optional[Dict] = self.index.get(key, None)
+        if record is None:
+            return None
+        start: int = record["offset"] // self.dtype.itemsize
+        size: int = int(np.prod(record["shape"]))
+        array: ndarray = self._get_mmap(record["shard"])[start:start + size]
+        return torch.from_numpy(array.reshape(record["shape"]))
+
+    def put_array(self, key: str, path: str, array: Tensor, **meta: Any) -> None:
+        """
+        Args:
+            meta: Extra JSON serializable fields kept in the index record.
+        """
+        if key in self.index:
+            return
+        if self._shard_file is None:
+            shard_id: int = max([x["shard"] for x in self.index.values()] + [-1])
+            self._open_shard(max(shard_id, 0))
+            if self._shard_file.tell() >= self.max_shard_bytes:
+                self._shard_file.close()
+                self._open_shard(shard_id + 1)
+            self._index_file = open(self.index_path, "a")
+        elif self._shard_file.tell() >= self.max_shard_bytes:
+            self._shard_file.close()
+            self._open_shard(self._shard_id + 1)
+
+        data: ndarray = np.ascontiguousarray(
+            array.detach().cpu().numpy(), dtype=self.dtype
+        )
+        record: Dict = {
+            "key": key, "path": path,
+            "shard": self._shard_id, "offset": self._shard_file.tell(),
+            "shape": list(data.shape), **meta
+        }
+        self._shard_file.write(data.tobytes())
+        self._shard_file.flush()
+        self._index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.index[key] = record
+
+    def flush(self) -> None:
+        if self._shard_file is not None:
+            self._shard_file.flush()
+            self._index_file.flush()
+        # Shards which are still being written need to be re-mapped
+        self._mmaps = {}
+
+    def close(self) -> None:
+        self.flush()
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._index_file.close()
+        self._shard_file = None
+        self._index_file = None
@@ -3,9 +3,12 @@
 # date: 2024-02-28
 
 
+import copy
 import random as rd
+import torch
+import numpy as np
 import augly.audio as audaugs
-from typing import List, Union
+from typing import List, Tuple, Union, Optional, Callable
 from torch import Tensor
 from augly.audio import Compose, OneOf
 from torchaudio.transforms import FrequencyMasking, TimeMasking
@@ -64,4 +67,93 @@ def spec_argument(
     return spec.tolist()
 
 
+def batch_axis_masks(
+    batch_size: int, axis_len: int, max_masking_len: int, masking_prob: float,
+    generator: Optional[torch.Generator]=None, device: str="cpu"
+) -> Tensor:
+    """
+    Draws one random continuous mask for each sample in batch, the same way 
+    as torchaudio's `FrequencyMasking`/`TimeMasking`, i.e. mask length is 
+    uniformly sampled from `[0, max_masking_len)` and start uniformly from 
+    `[0, axis_len - mask length)`.
+
+    Returns:
+        Bool tensor with shape `(batch_size, axis_len)`.
+    """
+    rand: Tensor = torch.rand(batch_size, 3, generator=generator).to(device)
+    mask_len: Tensor = rand[:, 0] * max_masking_len
+    mask_len = mask_len * (rand[:, 1] < masking_prob)
+    mask_start: Tensor = rand[:, 2] * (axis_len - mask_len)
+    mask_end: Tensor = (mask_start + mask_len).long()
+    mask_start = mask_start.long()
+    idx: Tensor = torch.arange(axis_len, device=device).unsqueeze(0)
+    return (idx >= mask_start.unsqueeze(1)) & (idx < mask_end.unsqueeze(1))
+
 
+def batch_spec_argument(
+    specs: Tensor,
+    freq_masking_prob: float=0.9, 
+    freq_max_masking_ratio: float=0.15, 
+    time_masking_prob: float=0.9, 
+    time_max_masking_ratio: float=0.05,
+    generator: Optional[torch.Generator]=None,
+    mask_value: float=0.0
+) -> Tensor:
+    """
+    Vectorized version of `spec_argument`, each sample in `specs` with 
+    shape `(batch_size, freq_dim, time_dim)` gets its own frequency and 
+    time masks, and all masks are applied in one `masked_fill`.
+    """
+    batch_size: int = specs.shape[0]
+    freq_dim: int = specs.shape[1] 
+    time_dim: int = specs.shape[2]
+    freq_masks: Tensor = batch_axis_masks(
+        batch_size, freq_dim, int(freq_dim * freq_max_masking_ratio), 
+        freq_masking_prob, generator, specs.device
+    )
+    time_masks: Tensor = batch_axis_masks(
+        batch_size, time_dim, int(time_dim * time_max_masking_ratio), 
+        time_masking_prob, generator, specs.device
+    )
+    return specs.masked_fill(
+        freq_masks.unsqueeze(2) | time_masks.unsqueeze(1), mask_value
+    )
+
+
+def augly_transforms_apply(
+    audio: np.ndarray, sample_rate: int, 
+    rng: rd.Random, np_rng: np.random.RandomState, 
+    transforms: Optional[Callable]=None, force: bool=False
+) -> Tuple[np.ndarray, int]:
+    """
+    Runs AugLy `transforms` (default `AUGLY_TRANSFORMS`) with given RNGs 
+    instead of global `random`/`np.random`, which AugLy's `Compose`, 
+    `OneOf` and transforms' `p` draw from, so seeding one sample's 
+    augmentation doesn't reseed the whole process. Other callables are 
+    called as they are.
+    """
+    transforms = AUGLY_TRANSFORMS if transforms is None else transforms
+    if isinstance(transforms, Compose):
+        for transform in transforms.transforms:
+            audio, sample_rate = augly_transforms_apply(
+                audio, sample_rate, rng, np_rng, transform
+            )
+        return (audio, sample_rate)
+    if isinstance(transforms, OneOf):
+        if rng.random() > transforms.p:
+            return (audio, sample_rate)
+        transform: Callable = rng.choices(
+            transforms.transforms, transforms.transform_probs
+        )[0]
+        return augly_transforms_apply(
+            audio, sample_rate, rng, np_rng, transform, force=True
+        )
+    if isinstance(transforms, audaugs.transforms.BaseTransform):
+        if not force and rng.random() > transforms.p:
+            return (audio, sample_rate)
+        if getattr(transforms, "seed", 0) is None:
+            # e.g. `AddBackgroundNoise` draws noise from its `seed` RNG
+            transforms = copy.copy(transforms)
+            transforms.seed = np_rng
+        return transforms.apply_transform(audio, sample_rate)
+    return transforms(audio, sample_rate)
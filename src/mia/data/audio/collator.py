@@ -3,12 +3,20 @@
 # date: 2024-03-01
 
 
+import os
 import torch
 from torch import Tensor
-from typing import Any, Optional, Dict, List, Union
+from transformers.feature_extraction_utils import BatchFeature
+from typing import Any, Optional, Dict, List, Union, Tuple
 
 from .argumentation import spec_argument
-from .functions import josnl_record2train_sample
+from .argumentation import batch_spec_argument
+from .functions import audio_batch2model_inputs
+from .functions import features_pad_stack
+from .functions import text2token_ids
+from .functions import waveform_resample
+from .functions.processor import text_force_simplified_chinese
+from ...model.teacher_logit_store import batch_teacher_topk
 
 
 class DataCollatorSpeechSeq2SeqWithPaddingV1:
@@ -18,22 +26,46 @@ class DataCollatorSpeechSeq2SeqWithPaddingV1:
         lang: str="mandarin",
         path_col: str="path", 
         text_col: str="text",
+        audio_col: str="audio",
         audio_duration_col: str="input_length",
         model_input_col: str="input_features", 
         model_label_col: str="labels", 
         sample_id_col: str="",
         target_sample_rate: int=16000, 
-        spec_argument: bool=True,
+        spec_argument: bool=False,
         freq_masking_prob: float=0.7, 
         freq_max_masking_ratio: float=0.1,
         time_masking_prob: float=0.7, 
-        time_max_masking_ratio: float=0.1
+        time_max_masking_ratio: float=0.1,
+        feature_store: Any=None,
+        pin_memory: bool=False,
+        seed: Optional[int]=None,
+        teacher_logit_store: Any=None
     ):
+        """
+        Args:
+            teacher_logit_store: Optional 
+                `mia.model.teacher_logit_store.TeacherLogitStore`, when all 
+                samples of a batch are in it, their teacher top-k logits are 
+                added as `teacher_topk_values` and `teacher_topk_indices`.
+            spec_argument: Running batched SpecAugment on `model_input_col`, 
+                should be disabled for dev/test data.
+            audio_col: Samples with this column, e.g. from 
+                `mia.data.audio.shards.ShardedAudioDataset`, are featurized 
+                from its in-memory `{"array", "sampling_rate"}` instead of 
+                loading `path_col`.
+            seed: Seed of SpecAugment masks. Each DataLoader worker mixes it 
+                with the worker's `torch.initial_seed()`, which DataLoader 
+                draws per epoch and worker, so masks differ across workers 
+                and epochs but are reproducible under a fixed global seed. 
+                Using torch's global RNG if it's `None`.
+        """
         self.processor: Any = processor
         self.tokenizer: Any = self.processor.tokenizer if tokenizer is None else tokenizer
         self.lang: str = lang
         self.path_col: str = path_col
         self.text_col: str = text_col
+        self.audio_col: str = audio_col
         self.audio_duration_col: str = audio_duration_col
         self.model_input_col: str = model_input_col
         self.model_label_col: str = model_label_col
@@ -44,27 +76,99 @@ class DataCollatorSpeechSeq2SeqWithPaddingV1:
         self.freq_max_masking_ratio: float = freq_max_masking_ratio
         self.time_masking_prob: float = time_masking_prob
         self.time_max_masking_ratio: float = time_max_masking_ratio
+        self.feature_store: Any = feature_store
+        self.pin_memory: bool = pin_memory and torch.cuda.is_available()
+        self.seed: Optional[int] = seed
+        self.teacher_logit_store: Any = teacher_logit_store
+        self._generator: Optional[torch.Generator] = None
+        self._generator_pid: int = -1
+
+    def get_generator(self) -> Optional[torch.Generator]:
+        if self.seed is None:
+            return None
+        if self._generator is None or self._generator_pid != os.getpid():
+            worker_info = torch.utils.data.get_worker_info()
+            worker_seed: int = 0 if worker_info is None else torch.initial_seed()
+            self._generator = torch.Generator().manual_seed(
+                (self.seed + worker_seed) % 2 ** 63
+            )
+            self._generator_pid = os.getpid()
+        return self._generator
+
+    def sample_audio(self, jsonl_sample: Dict) -> Union[str, Tensor]:
+        """
+        Returns:
+            In-memory waveform in `target_sample_rate` if the sample has 
+            `audio_col`, otherwise its audio path.
+        """
+        audio: Optional[Dict] = jsonl_sample.get(self.audio_col, None)
+        if not isinstance(audio, dict) or audio.get("array", None) is None:
+            return jsonl_sample[self.path_col]
+        waveform: Tensor = torch.as_tensor(audio["array"], dtype=torch.float32)
+        return waveform_resample(
+            waveform.reshape(-1, waveform.shape[-1]), 
+            audio["sampling_rate"], self.target_sample_rate
+        )
 
     def __call__(self, jsonl_samples: List[Dict]) -> Dict[str, Tensor]:
+        # Samples from `OnTheFlyAudioDataset` are already featurized and 
+        # tokenized, those are used as they are
         train_samples: List[Dict] = [
-            josnl_record2train_sample(
-                x, self.processor,
-                lang=self.lang,
-                path_col=self.path_col, text_col=self.text_col, 
-                model_input_col=self.model_input_col, 
-                model_target_col=self.model_label_col, 
-                audio_duration_col=self.audio_duration_col, 
-                target_sample_rate=self.target_sample_rate
-            ) for x in jsonl_samples
+            {
+                self.text_col: x[self.text_col], 
+                self.model_input_col: x.get(self.model_input_col, None), 
+                self.audio_duration_col: x.get(self.audio_duration_col, None),
+                self.model_label_col: x[self.model_label_col] 
+                    if self.model_label_col in x 
+                    else text2token_ids(
+                        text_force_simplified_chinese(x[self.text_col], self.lang), 
+                        self.processor
+                    )
+            } for x in jsonl_samples
         ]
 
-        input_features: List[Dict[str, Union[List[float], Tensor]]] = [
-            {self.model_input_col: sample[self.model_input_col].tolist()[0]} 
-            for sample in train_samples
+        if self.feature_store is not None:
+            for i, x in enumerate(jsonl_samples):
+                if train_samples[i][self.model_input_col] is not None:
+                    continue
+                cached: Optional[Tuple[Tensor, float]] = \
+                    self.feature_store.get(x[self.path_col], self.processor)
+                if cached is not None:
+                    train_samples[i][self.model_input_col] = cached[0]
+                    train_samples[i][self.audio_duration_col] = cached[1]
+        
+        # Featurizing all samples not hit the feature store in one batch
+        missing_ids: List[int] = [
+            i for i, x in enumerate(train_samples) 
+            if x[self.model_input_col] is None
         ]
-        batch = self.processor.feature_extractor.pad(
-            input_features, return_tensors="pt"
-        )
+        if len(missing_ids) > 0:
+            inputs: Tensor = None
+            durations: List[float] = []
+            inputs, durations = audio_batch2model_inputs(
+                [self.sample_audio(jsonl_samples[i]) for i in missing_ids], 
+                self.processor, self.target_sample_rate
+            )
+            for j, i in enumerate(missing_ids):
+                train_samples[i][self.model_input_col] = inputs[j:j + 1]
+                train_samples[i][self.audio_duration_col] = durations[j]
+
+        batch: BatchFeature = BatchFeature({
+            self.model_input_col: features_pad_stack(
+                [sample[self.model_input_col] for sample in train_samples], 
+                self.processor.feature_extractor.padding_value
+            )
+        })
+        if self.spec_argument:
+            batch[self.model_input_col] = batch_spec_argument(
+                batch[self.model_input_col], 
+                freq_masking_prob=self.freq_masking_prob, 
+                freq_max_masking_ratio=self.freq_max_masking_ratio, 
+                time_masking_prob=self.time_masking_prob, 
+                time_max_masking_ratio=self.time_max_masking_ratio,
+                generator=self.get_generator()
+            )
+
         label_features = [
             {"input_ids": sample[self.model_label_col]} for sample in train_samples
         ]
@@ -82,10 +186,22 @@ class DataCollatorSpeechSeq2SeqWithPaddingV1:
 
         batch["labels"] = labels
 
+        if self.teacher_logit_store is not None:
+            topk: Optional[Tuple[Tensor, Tensor]] = batch_teacher_topk(
+                self.teacher_logit_store, 
+                [x[self.path_col] for x in jsonl_samples], labels
+            )
+            if topk is not None:
+                batch["teacher_topk_values"] = topk[0]
+                batch["teacher_topk_indices"] = topk[1]
+
         if self.sample_id_col not in {""}:
             batch[self.sample_id_col] = torch.tensor(
                 [x[self.sample_id_col] for x in jsonl_samples], dtype=torch.int32
             ).reshape(len(jsonl_samples), 1)
 
+        if self.pin_memory:
+            for k in batch:
+                batch[k] = batch[k].pin_memory()
         return batch
 
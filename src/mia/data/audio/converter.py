@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# file: converter.py
+# date: 2026-10-18
+
+
+import os
+import time
+import subprocess
+import librosa
+import numpy as np
+import soundfile as sf
+import multiprocessing as mp
+from tqdm import tqdm
+from numpy import ndarray
+from typing import Dict, List, Tuple, Optional, Iterable, Iterator, Any
+
+from ...utils import audio_segment_write
+from ...utils import JsonlWriter
+
+
+CONVERTER_BACKENDS: Tuple[str, ...] = ("ffmpeg", "in_process")
+PCM_SUBTYPES: Dict[int, str] = {8: "PCM_U8", 16: "PCM_16", 24: "PCM_24", 32: "PCM_32"}
+
+
+def ffmpeg_convert_args(
+    ffmpeg: str, in_path: str, out_path: str,
+    sample_rate: int=16000, channels: int=1, bit_depth: int=16
+) -> List[str]:
+    """
+    Argument list of `ffmpeg` converting `in_path` into `out_path`, no
+    shell is involved so paths need no escaping.
+    """
+    return [
+        ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", in_path,
+        "-ar", str(sample_rate), "-ac", str(channels),
+        "-sample_fmt", "s%i" % (32 if bit_depth == 24 else bit_depth),
+        out_path
+    ]
+
+
+def audio_file_read(path: str) -> Tuple[ndarray, int]:
+    """
+    Returns:
+        Audio with shape `(frames, channels)` and its sample rate, formats
+        which libsndfile can't read are decoded by librosa.
+    """
+    try:
+        audio, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+        return (audio, sample_rate)
+    except RuntimeError:
+        audio, sample_rate = librosa.load(path, sr=None, mono=False)
+        return (audio.reshape(-1, audio.shape[-1]).T, sample_rate)
+
+
+class AudioFormatConverter:
+    """
+    Converts audio files into one format, sample rate, channel number and
+    bit depth with a pool of `num_proc` processes. Each file is either
+    converted by an `ffmpeg` subprocess (backend "ffmpeg"), or decoded,
+    resampled and encoded in the worker itself with libsndfile (backend
+    "in_process", no `ffmpeg` process per file, but output formats are
+    limited to the ones libsndfile can write).
+
+    Output files are written under a temporary name then renamed, and
+    existing outputs are skipped, so an interrupted run can be re-run.
+    """
+    def __init__(self,
+        output_dir: str,
+        target_fmt: str="wav",
+        sample_rate: int=16000,
+        channels: int=1,
+        bit_depth: int=16,
+        backend: str="ffmpeg",
+        ffmpeg: str="ffmpeg",
+        num_proc: Optional[int]=None,
+        max_pending: int=4096
+    ):
+        """
+        Args:
+            num_proc: Defaults to `os.cpu_count()`.
+            max_pending: Records read ahead from input metadata, bounds
+                memory of huge metadata files.
+        """
+        if backend not in CONVERTER_BACKENDS:
+            raise Exception("Unknown backend '%s'" % backend)
+        self.output_dir: str = output_dir
+        self.target_fmt: str = target_fmt
+        self.sample_rate: int = sample_rate
+        self.channels: int = channels
+        self.bit_depth: int = bit_depth
+        self.backend: str = backend
+        self.ffmpeg: str = ffmpeg
+        self.num_proc: int = num_proc if num_proc is not None else (os.cpu_count() or 1)
+        self.max_pending: int = max_pending
+        os.makedirs(output_dir, exist_ok=True)
+
+    def output_path(self, in_path: str) -> str:
+        audio_file_name: str = in_path.split("/")[-1].split(".")[0]
+        return os.path.join(self.output_dir, audio_file_name + "." + self.target_fmt)
+
+    def convert(self, in_path: str, out_path: str) -> None:
+        if self.backend == "in_process":
+            audio: ndarray = None
+            sample_rate: int = -1
+            audio, sample_rate = audio_file_read(in_path)
+            audio_segment_write(
+                out_path, audio, sample_rate, self.sample_rate, self.channels,
+                PCM_SUBTYPES.get(self.bit_depth, None) \
+                    if self.target_fmt in {"wav", "flac"} else None
+            )
+            return
+
+        tmp_path: str = os.path.join(
+            os.path.dirname(out_path), ".tmp." + os.path.basename(out_path)
+        )
+        proc: subprocess.CompletedProcess = subprocess.run(
+            ffmpeg_convert_args(
+                self.ffmpeg, in_path, tmp_path,
+                self.sample_rate, self.channels, self.bit_depth
+            ),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        if proc.returncode != 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise Exception(
+                "ffmpeg exited with %i: %s" % (
+                    proc.returncode,
+                    proc.stderr.decode("utf-8", "replace").strip()[-1000:]
+                )
+            )
+        os.replace(tmp_path, out_path)
+
+    def _convert_one(self, task: Tuple[Dict, str]) -> Dict:
+        record, in_path = task
+        out_path: str = self.output_path(in_path)
+        result: Dict = {"record": record, "path": out_path, "status": "converted"}
+        try:
+            if os.path.exists(out_path):
+                result["status"] = "skipped"
+            else:
+                self.convert(in_path, out_path)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = "%s: %s" % (type(e).__name__, str(e))
+        return result
+
+    def run(
+        self,
+        records: Iterable[Dict],
+        path_col: str,
+        out_metadata_path: str,
+        failure_path: str,
+        keep_cols: Optional[List[str]]=None
+    ) -> Dict[str, Any]:
+        """
+        Converts `path_col` audio of each record. Records of converted (or
+        already existing) audios are streamed into `out_metadata_path` as
+        they finish, with `path_col` pointing to the new file, and records
+        of failed ones into `failure_path` with an "error" column.
+
+        Args:
+            keep_cols: Columns kept in output metadata besides `path_col`,
+                all columns are kept when it's `None`.
+
+        Returns:
+            Numbers of converted, skipped and failed audios and wall time.
+        """
+        stats: Dict[str, Any] = {"converted": 0, "skipped": 0, "failed": 0}
+        start: float = time.perf_counter()
+        tasks: Iterator[Tuple[Dict, str]] = ((x, x[path_col]) for x in records)
+        ctx = mp.get_context("fork")
+        with JsonlWriter(out_metadata_path, "w", flush_every=1000) as writer, \
+                JsonlWriter(failure_path, "w", flush_every=1) as failure_writer, \
+                ctx.Pool(self.num_proc) as pool, \
+                tqdm() as progress:
+            while True:
+                chunk: List[Tuple[Dict, str]] = [
+                    x for _, x in zip(range(self.max_pending), tasks)
+                ]
+                if len(chunk) == 0:
+                    break
+                for result in pool.imap_unordered(
+                    self._convert_one, chunk,
+                    chunksize=max(1, len(chunk) // (self.num_proc * 16))
+                ):
+                    stats[result["status"]] += 1
+                    progress.update(1)
+                    record: Dict = result["record"]
+                    if result["status"] == "failed":
+                        failure_writer.write({**record, "error": result["error"]})
+                        continue
+                    new_record: Dict = {path_col: result["path"]}
+                    for col in (record.keys() if keep_cols is None else keep_cols):
+                        if col != path_col:
+                            new_record[col] = record[col]
+                    writer.write(new_record)
+        stats["wall_sec"] = time.perf_counter() - start
+        print("Audio format conversion finished: %s" % stats)
+        return stats
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# file: feature_store.py
+# date: 2026-10-18
+
+
+import os
+import json
+import hashlib
+from tqdm import tqdm
+from torch import Tensor
+from torch.utils.data import Dataset, DataLoader
+from typing import Dict, List, Optional, Tuple, Any
+
+from .functions import audio_file2model_inputs
+from ..array_store import ArrayStore
+
+
+def feature_extractor_fingerprint(fea_extractor: Any) -> str:
+    """
+    Hash of feature extractor's config, `fea_extractor` can be either a
+    `WhisperProcessor` or a `WhisperFeatureExtractor`.
+    """
+    fea_extractor = getattr(fea_extractor, "feature_extractor", fea_extractor)
+    conf: Dict = fea_extractor.to_dict()
+    return hashlib.sha1(
+        json.dumps(conf, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def feature_store_key(path: str, fingerprint: str) -> str:
+    return hashlib.sha1(
+        ("%s\t%s" % (os.path.abspath(path), fingerprint)).encode("utf-8")
+    ).hexdigest()
+
+
+class LogMelFeatureStore(ArrayStore):
+    """
+    `ArrayStore` of pre-computed log-mel features, keyed by audio path and
+    feature extractor's fingerprint, index records also have each audio's
+    `duration_sec`.
+    """
+    def __init__(self,
+        store_dir: str, dtype: str="float32", max_shard_bytes: int=2 ** 30
+    ):
+        super().__init__(store_dir, dtype, max_shard_bytes)
+        self._fingerprints: Dict[int, str] = {}
+
+    def __getstate__(self) -> Dict:
+        state: Dict = super().__getstate__()
+        state["_fingerprints"] = {}
+        return state
+
+    def get_by_key(self, key: str) -> Optional[Tuple[Tensor, float]]:
+        features: Optional[Tensor] = self.get_array(key)
+        if features is None:
+            return None
+        return (features, self.index[key]["duration_sec"])
+
+    def get(self, path: str, fea_extractor: Any) -> Optional[Tuple[Tensor, float]]:
+        if id(fea_extractor) not in self._fingerprints:
+            self._fingerprints[id(fea_extractor)] = \
+                feature_extractor_fingerprint(fea_extractor)
+        return self.get_by_key(
+            feature_store_key(path, self._fingerprints[id(fea_extractor)])
+        )
+
+    def put(
+        self, key: str, path: str, features: Tensor, duration_sec: float
+    ) -> None:
+        self.put_array(key, path, features, duration_sec=duration_sec)
+
+
+class _FeatureStoreBuildDataset(Dataset):
+    def __init__(self,
+        paths: List[str], fea_extractor: Any, target_sample_rate: int
+    ):
+        self.paths: List[str] = paths
+        self.fea_extractor: Any = fea_extractor
+        self.target_sample_rate: int = target_sample_rate
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, idx: int) -> Tuple[str, Tensor, float]:
+        inputs: Tensor = None
+        duration_sec: float = -1
+        inputs, duration_sec = audio_file2model_inputs(
+            self.paths[idx], self.fea_extractor, self.target_sample_rate
+        )
+        return (self.paths[idx], inputs, duration_sec)
+
+
+def feature_store_build(
+    store: LogMelFeatureStore,
+    jsonl_samples: List[Dict],
+    fea_extractor: Any,
+    path_col: str="path",
+    target_sample_rate: int=16000,
+    num_workers: int=4
+) -> LogMelFeatureStore:
+    """
+    Pre-computes log-mel features of all `jsonl_samples` into `store`, the
+    samples which already exist in `store` will be skipped, so an
+    interrupted building can be resumed.
+    """
+    fingerprint: str = feature_extractor_fingerprint(fea_extractor)
+    paths: List[str] = sorted(set(
+        x[path_col] for x in jsonl_samples
+        if feature_store_key(x[path_col], fingerprint) not in store
+    ))
+    print("Building feature store with %i new audios" % len(paths))
+
+    dataloader: DataLoader = DataLoader(
+        _FeatureStoreBuildDataset(paths, fea_extractor, target_sample_rate),
+        batch_size=None, num_workers=num_workers
+    )
+    for path, inputs, duration_sec in tqdm(dataloader):
+        store.put(
+            feature_store_key(path, fingerprint), path, inputs, duration_sec
+        )
+    store.flush()
+    return store
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# file: fetcher.py
+# date: 2026-10-18
+
+
+import os
+import time
+import random as rd
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Dict, List, Set, Tuple, Optional, Iterable, Iterator, Any
+
+from ...utils import jsonl_iter
+from ...utils import JsonlWriter
+
+
+def fetch_cmd_args(cmd_temp: List[str], values: Dict[str, str]) -> List[str]:
+    """
+    Fills `${KEY}` placeholders of each argument of `cmd_temp` with
+    `values`, arguments are passed to the process as they are, so no
+    shell quoting is needed.
+    """
+    args: List[str] = []
+    for arg in cmd_temp:
+        for k, v in values.items():
+            arg = arg.replace("${%s}" % k, str(v))
+        args.append(arg)
+    return args
+
+
+def backoff_sec(
+    attempt: int, base_sec: float=1.0, max_sec: float=60.0,
+    rng: Optional[rd.Random]=None
+) -> float:
+    """
+    Exponential backoff before retrying `attempt`-th (1-based) failure,
+    jittered into `[0.5, 1.0]` of the delay so concurrent retries spread.
+    """
+    delay: float = min(max_sec, base_sec * 2 ** (attempt - 1))
+    return delay * (0.5 + 0.5 * (rng or rd).random())
+
+
+class FetchState:
+    """
+    Append-only JSONL of fetch results, the last line of an ID is its
+    state, so it survives interruptions and reruns skip finished IDs.
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        self.states: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            for record in jsonl_iter(path):
+                self.states[record["id"]] = record
+        self.writer: JsonlWriter = JsonlWriter(path, "a", flush_every=1)
+
+    def is_done(self, item_id: str) -> bool:
+        return self.states.get(item_id, {}).get("status", None) == "done"
+
+    def update(self, record: Dict) -> None:
+        self.states[record["id"]] = record
+        self.writer.write(record)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class FetchScheduler:
+    """
+    Runs a fetching command (e.g. `youtube-dl`) for each item with at most
+    `max_concurrency` concurrent subprocesses. A failed item, i.e. non-zero
+    exit, timeout, or missing any of its output files, is retried up to
+    `max_retries` times with exponential backoff. Results are recorded in
+    `state_path`, items already done, or whose outputs all exist, are not
+    fetched again.
+    """
+    def __init__(self,
+        cmd_temp: List[str],
+        state_path: str,
+        work_dir: Optional[str]=None,
+        max_concurrency: int=4,
+        max_retries: int=3,
+        backoff_base_sec: float=1.0,
+        backoff_max_sec: float=60.0,
+        timeout_sec: Optional[float]=None,
+        seed: Optional[int]=None
+    ):
+        """
+        Args:
+            cmd_temp: Argument list with `${KEY}` placeholders, which are
+                filled by each item's string values.
+            work_dir: Working directory of fetching processes.
+            timeout_sec: Killing a fetching process running longer than it.
+        """
+        self.cmd_temp: List[str] = cmd_temp
+        self.state_path: str = state_path
+        self.work_dir: Optional[str] = work_dir
+        self.max_concurrency: int = max_concurrency
+        self.max_retries: int = max_retries
+        self.backoff_base_sec: float = backoff_base_sec
+        self.backoff_max_sec: float = backoff_max_sec
+        self.timeout_sec: Optional[float] = timeout_sec
+        self.rng: rd.Random = rd.Random(seed)
+
+    def fetch_once(self, item: Dict) -> Optional[str]:
+        """
+        Returns:
+            Error message, or `None` when fetching succeeded.
+        """
+        args: List[str] = fetch_cmd_args(
+            self.cmd_temp, {k: v for k, v in item.items() if isinstance(v, str)}
+        )
+        try:
+            proc: subprocess.CompletedProcess = subprocess.run(
+                args, cwd=self.work_dir, stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                timeout=self.timeout_sec
+            )
+        except subprocess.TimeoutExpired:
+            return "Timeout after %.1f sec" % self.timeout_sec
+        except OSError as e:
+            return "%s: %s" % (type(e).__name__, str(e))
+        if proc.returncode != 0:
+            return "Exited with %i: %s" % (
+                proc.returncode,
+                proc.stderr.decode("utf-8", "replace").strip()[-1000:]
+            )
+        missing: List[str] = [
+            x for x in item.get("outputs", []) if not os.path.exists(x)
+        ]
+        if len(missing) > 0:
+            return "Missing outputs %s" % missing
+        return None
+
+    def fetch(self, item: Dict) -> Dict:
+        error: Optional[str] = None
+        attempt: int = 0
+        while attempt <= self.max_retries:
+            if attempt > 0:
+                time.sleep(backoff_sec(
+                    attempt, self.backoff_base_sec, self.backoff_max_sec, self.rng
+                ))
+            attempt += 1
+            error = self.fetch_once(item)
+            if error is None:
+                break
+            print("Fetching '%s' failed (attempt %i): %s" % (item["id"], attempt, error))
+        return {
+            "id": item["id"],
+            "status": "done" if error is None else "failed",
+            "attempts": attempt,
+            "error": error
+        }
+
+    def run(self, items: Iterable[Dict]) -> Iterator[Tuple[Dict, Dict]]:
+        """
+        Fetches `items`, each one has an "id", optional "outputs" paths to
+        check and other placeholder values of `cmd_temp`.
+
+        Returns:
+            Iterator of each item and its state as soon as it's finished
+            (or skipped), so the caller can post-process finished items
+            while others are still being fetched. At most
+            `2 * max_concurrency` items are pending.
+        """
+        state: FetchState = FetchState(self.state_path)
+        items_iter: Iterator[Dict] = iter(items)
+        pending: Dict[Future, Dict] = {}
+        try:
+            with ThreadPoolExecutor(self.max_concurrency) as pool:
+                while True:
+                    for item in items_iter:
+                        outputs: List[str] = item.get("outputs", [])
+                        outputs_exist: bool = all(os.path.exists(x) for x in outputs)
+                        if not state.is_done(item["id"]) and \
+                                len(outputs) > 0 and outputs_exist:
+                            # Fetched before the state file was kept, e.g. 
+                            # by another tool or a lost state file
+                            state.update({
+                                "id": item["id"], "status": "done", 
+                                "attempts": 0, "error": None
+                            })
+                        if state.is_done(item["id"]) and outputs_exist:
+                            yield (item, {**state.states[item["id"]], "status": "skipped"})
+                            continue
+                        pending[pool.submit(self.fetch, item)] = item
+                        if len(pending) >= 2 * self.max_concurrency:
+                            break
+                    if len(pending) == 0:
+                        break
+                    done: Set[Future] = wait(pending, return_when=FIRST_COMPLETED)[0]
+                    for future in done:
+                        item: Dict = pending.pop(future)
+                        result: Dict = future.result()
+                        state.update(result)
+                        yield (item, result)
+        finally:
+            state.close()
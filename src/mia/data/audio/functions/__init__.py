@@ -7,7 +7,7 @@ import pdb
 import torch
 import torchaudio
 from datasets import load_dataset
-from typing import Dict, Callable, Union, List, Tuple
+from typing import Dict, Callable, Union, List, Tuple, Optional, Any
 from torch import Tensor
 from datasets import DatasetDict, Dataset
 from transformers import WhisperProcessor
@@ -15,8 +15,13 @@ from transformers import WhisperProcessor
 from . import io
 from . import dataset
 from . import processor
+from . import feature
+from . import resampler
 
 from .dataset import datasetdict_load_jsonl
+from .feature import waveforms2log_mel
+from .feature import features_pad_stack
+from .resampler import waveform_resample
 
 
 def audio_file2model_inputs(
@@ -26,9 +31,7 @@ def audio_file2model_inputs(
     waveform: Tensor = None
     sample_rate: int = -1
     waveform, sample_rate = torchaudio.load(path)
-    waveform = torchaudio.functional.resample(
-        waveform, orig_freq=sample_rate, new_freq=target_sample_rate
-    )
+    waveform = waveform_resample(waveform, sample_rate, target_sample_rate)
     duration_sec: int = waveform.shape[-1] / target_sample_rate
     inputs: Tensor = fea_extractor(
         waveform.squeeze(), sampling_rate=target_sample_rate, 
@@ -37,6 +40,40 @@ def audio_file2model_inputs(
     return (inputs, duration_sec)
 
 
+def audio_file2waveform(path: str, target_sample_rate: int=16000) -> Tensor:
+    waveform: Tensor = None
+    sample_rate: int = -1
+    waveform, sample_rate = torchaudio.load(path)
+    return waveform_resample(waveform, sample_rate, target_sample_rate)
+
+
+def audio_batch2model_inputs(
+    audios: List[Union[str, Tensor]], fea_extractor: WhisperProcessor, 
+    target_sample_rate: int=16000, device: str="cpu"
+) -> Tuple[Tensor, List[float]]:
+    """
+    Batched version of `audio_file2model_inputs`.
+
+    Args:
+        audios: Audio paths or waveforms which already are in 
+            `target_sample_rate`.
+
+    Returns:
+        Model inputs with shape `(batch_size, n_mels, n_frames)` and each 
+        audio's duration in seconds.
+    """
+    waveforms: List[Tensor] = [
+        audio_file2waveform(x, target_sample_rate) if isinstance(x, str) else x
+        for x in audios
+    ]
+    durations: List[float] = [x.shape[-1] / target_sample_rate for x in waveforms]
+    inputs: Tensor = waveforms2log_mel(
+        [x.reshape(-1, x.shape[-1]).mean(dim=0) for x in waveforms], 
+        fea_extractor, device=device
+    )
+    return (inputs, durations)
+
+
 def text2token_ids(text: str, fea_extractor: WhisperProcessor) -> List[List[int]]:
     out: Tensor = fea_extractor(audio=None, text=text)["input_ids"]
     return out
@@ -52,21 +89,35 @@ def josnl_record2train_sample(
     model_target_col: str="labels", 
     audio_duration_col: str="input_length",
     target_sample_rate: int=16000, 
-    device: str="cpu"
+    device: str="cpu",
+    feature_store: Any=None
 ) -> Dict[str, Union[Tensor, int, str]]:
+    """
+    Args:
+        feature_store: Optional pre-computed features store, see
+            `mia.data.audio.feature_store.LogMelFeatureStore`, audio will 
+            only be loaded and featurized when it's not in the store.
+    """
     output: Dict[str, Union[Tensor, int, str]] = {}
 
     output[text_col] = jsonl_sample[text_col] 
     
     output[model_input_col] = None
     output[audio_duration_col] = None
-    output[model_input_col], output[audio_duration_col] = \
-        audio_file2model_inputs(
-            path=jsonl_sample[path_col], 
-            fea_extractor=fea_extractor, 
-            target_sample_rate=target_sample_rate,
-            device=device
-        ) 
+    cached: Optional[Tuple[Tensor, float]] = None
+    if feature_store is not None:
+        cached = feature_store.get(jsonl_sample[path_col], fea_extractor)
+    if cached is not None:
+        output[model_input_col] = cached[0].to(torch.device(device))
+        output[audio_duration_col] = cached[1]
+    else:
+        output[model_input_col], output[audio_duration_col] = \
+            audio_file2model_inputs(
+                path=jsonl_sample[path_col], 
+                fea_extractor=fea_extractor, 
+                target_sample_rate=target_sample_rate,
+                device=device
+            ) 
 
     output[model_target_col] = text2token_ids(
         text=processor.text_force_simplified_chinese(jsonl_sample[text_col], lang),
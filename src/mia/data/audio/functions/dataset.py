@@ -9,6 +9,7 @@ from typing import Dict, Callable, Union, List, Tuple, Optional, Any
 from datasets import DatasetDict, Dataset
 
 from .io import audio_get_meta
+from .io import AUDIO_META_CACHE_PATH
 
 
 def datasetdict_load_jsonl(
@@ -42,7 +43,8 @@ def hf_datasetdict_load_audio_jsonl(
     test_data_path: Optional[str]=None,
     sample_id_col: str="",
     audio_duration_col: str="audio_duration", 
-    audio_path_col: str="path"
+    audio_path_col: str="path",
+    meta_cache_path: Optional[str]=AUDIO_META_CACHE_PATH
 ) -> DatasetDict:
     out: DatasetDict = datasetdict_load_jsonl(
         train_data_path, dev_data_path, test_data_path, 
@@ -51,7 +53,8 @@ def hf_datasetdict_load_audio_jsonl(
 
     def _append_audio_meta(sample: Dict) -> Dict:
         audio_meta: Dict = audio_get_meta(
-            sample[audio_path_col], audio_path_col, audio_duration_col
+            sample[audio_path_col], audio_path_col, audio_duration_col,
+            cache_path=meta_cache_path
         )
         sample[audio_duration_col] = audio_meta[audio_duration_col]
         return sample
@@ -67,14 +70,26 @@ def fn_gen_hf_dataset_filter_by_asr_data(
     max_audio_duration: float=30.0,
     min_token_num: int=0,
     max_token_num: int=512,
-    audio_path_col: Optional[str]=None, text_col: Optional[str]=None
+    audio_path_col: Optional[str]=None, text_col: Optional[str]=None,
+    audio_duration_col: Optional[str]=None,
+    meta_cache_path: Optional[str]=AUDIO_META_CACHE_PATH
 ) -> Callable:
+    """
+    When `audio_duration_col` is given and already exists in sample (for 
+    example added by `hf_datasetdict_load_audio_jsonl`), the duration will 
+    be re-used instead of probing audio file again.
+    """
     def _filter(sample: Dict) -> bool:
         
-        if audio_path_col is not None:
-            audio_duration: float = audio_get_meta(
-                sample[audio_path_col], "path", "duration"
+        audio_duration: Optional[float] = None
+        if audio_duration_col is not None and audio_duration_col in sample:
+            audio_duration = sample[audio_duration_col]
+        elif audio_path_col is not None:
+            audio_duration = audio_get_meta(
+                sample[audio_path_col], "path", "duration", 
+                cache_path=meta_cache_path
             )["duration"]
+        if audio_duration is not None:
             if audio_duration <= min_audio_duration \
                 or audio_duration >= max_audio_duration:
                 return False
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# file: feature.py
+# date: 2026-10-18
+
+
+import torch
+from torch import Tensor
+from typing import Dict, List, Tuple, Optional, Any
+
+
+CPU_MICRO_BATCH_SIZE: int = 2
+_HANN_WINDOWS: Dict[Tuple[int, str], Tensor] = {}
+_MEL_FILTERS: Dict[Tuple[int, int, int, str], Tensor] = {}
+
+
+def get_hann_window(n_fft: int, device: str="cpu") -> Tensor:
+    key: Tuple[int, str] = (n_fft, str(device))
+    if key not in _HANN_WINDOWS:
+        _HANN_WINDOWS[key] = torch.hann_window(n_fft, device=torch.device(device))
+    return _HANN_WINDOWS[key]
+
+
+def get_mel_filters(fea_extractor: Any, device: str="cpu") -> Tensor:
+    """
+    Returns transposed mel filter-bank with shape `(n_mels, n_fft // 2 + 1)`.
+    """
+    fea_extractor = getattr(fea_extractor, "feature_extractor", fea_extractor)
+    key: Tuple[int, int, int, str] = (
+        fea_extractor.feature_size, fea_extractor.sampling_rate,
+        fea_extractor.n_fft, str(device)
+    )
+    if key not in _MEL_FILTERS:
+        _MEL_FILTERS[key] = torch.from_numpy(fea_extractor.mel_filters)\
+            .to(torch.device(device), torch.float32).T.contiguous()
+    return _MEL_FILTERS[key]
+
+
+def waveforms_pad_or_crop(waveforms: List[Tensor], n_samples: int) -> Tensor:
+    """
+    Right pads with zero or crops each 1-D waveform into `n_samples`, and
+    stack them into a `(batch_size, n_samples)` tensor.
+    """
+    out: Tensor = torch.zeros(len(waveforms), n_samples, dtype=torch.float32)
+    for i, waveform in enumerate(waveforms):
+        length: int = min(waveform.shape[-1], n_samples)
+        out[i, :length] = waveform.reshape(-1)[:length]
+    return out
+
+
+def features_pad_stack(
+    features: List[Tensor], padding_value: float=0.0
+) -> Tensor:
+    """
+    Stacks `(n_mels, n_frames)` or `(1, n_mels, n_frames)` features into a 
+    `(batch_size, n_mels, max_n_frames)` tensor, right padding frames with 
+    `padding_value` when lengths are different.
+    """
+    features = [x.reshape(x.shape[-2], x.shape[-1]) for x in features]
+    max_frames: int = max(x.shape[-1] for x in features)
+    if all(x.shape[-1] == max_frames for x in features):
+        return torch.stack(features, dim=0)
+    out: Tensor = torch.full(
+        (len(features), features[0].shape[0], max_frames), padding_value, 
+        dtype=features[0].dtype
+    )
+    for i, x in enumerate(features):
+        out[i, :, :x.shape[-1]] = x
+    return out
+
+
+def batch2log_mel(batch: Tensor, fea_extractor: Any) -> Tensor:
+    """
+    Args:
+        batch: Padded/cropped waveforms with shape `(batch_size, n_samples)`.
+    """
+    device: str = str(batch.device)
+    stft: Tensor = torch.stft(
+        batch, fea_extractor.n_fft, fea_extractor.hop_length,
+        window=get_hann_window(fea_extractor.n_fft, device),
+        return_complex=True
+    )[..., :-1]
+    # Faster than `stft.abs() ** 2` since it avoids sqrt
+    magnitudes: Tensor = stft.real.pow(2) + stft.imag.pow(2)
+    mel_spec: Tensor = torch.matmul(get_mel_filters(fea_extractor, device), magnitudes)
+
+    log_spec: Tensor = torch.clamp(mel_spec, min=1e-10).log10()
+    max_val: Tensor = log_spec.amax(dim=(1, 2), keepdim=True)
+    log_spec = torch.maximum(log_spec, max_val - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def waveforms2log_mel(
+    waveforms: List[Tensor], fea_extractor: Any, device: str="cpu",
+    micro_batch_size: Optional[int]=None
+) -> Tensor:
+    """
+    Batched version of Whisper's log-mel spectrogram extraction, output is
+    same with running `fea_extractor` on each waveform separately.
+
+    Args:
+        waveforms: 1-D waveforms already at `fea_extractor`'s sampling rate.
+        fea_extractor: `WhisperProcessor` or `WhisperFeatureExtractor`.
+        device: Where to run STFT and mel projection.
+        micro_batch_size: Number of waveforms in each vectorized STFT call. 
+            The default is the whole batch on GPU and `CPU_MICRO_BATCH_SIZE` 
+            on CPU, since on CPU the STFT of a big batch does not fit in 
+            cache any more and becomes slower than small batches.
+
+    Returns:
+        Tensor with shape `(batch_size, n_mels, n_frames)`.
+    """
+    fea_extractor = getattr(fea_extractor, "feature_extractor", fea_extractor)
+    batch: Tensor = waveforms_pad_or_crop(waveforms, fea_extractor.n_samples)\
+        .to(torch.device(device))
+    if getattr(fea_extractor, "dither", 0.0) != 0.0:
+        batch += fea_extractor.dither * torch.randn_like(batch)
+
+    if micro_batch_size is None:
+        micro_batch_size = \
+            CPU_MICRO_BATCH_SIZE if batch.device.type == "cpu" else len(waveforms)
+    micro_batch_size = max(micro_batch_size, 1)
+    return torch.cat([
+        batch2log_mel(batch[i:i + micro_batch_size], fea_extractor)
+        for i in range(0, batch.shape[0], micro_batch_size)
+    ], dim=0)
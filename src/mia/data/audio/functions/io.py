@@ -3,23 +3,172 @@
 # date: 2024-03-08
 
 
+import os
+import json
+import sqlite3
 import torchaudio
-from typing import Union, Dict
+import soundfile as sf
+from torch import Tensor
+from typing import Union, Dict, Optional
 
 
-def audio_get_meta(
-    path: str, 
-    audio_path_col: str="path",
-    audio_duration_col: str="duration_sec"
-) -> Dict[str, Union[str, int, float]]:
-    metadata: Dict[str, Union[str, int, float]] = {}
-    metadata[audio_path_col] = path
+AUDIO_META_CACHE_PATH: Optional[str] = os.environ.get(
+    "MIA_AUDIO_META_CACHE", None
+)
+
+
+class AudioMetaCache:
+    """
+    Persistent audio metadata cache backed by SQLite. Records are keyed by
+    absolute path and are only valid while file size and mtime not changed.
+    The connection is lazily re-opened after fork, so one cache object can
+    be shared with `datasets.map(..., num_proc=N)` workers.
+    """
+    def __init__(self, path: str):
+        self.path: str = os.path.abspath(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: int = -1
+
+    def __getstate__(self) -> Dict:
+        return {"path": self.path, "_conn": None, "_pid": -1}
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        cache_dir: str = os.path.dirname(self.path)
+        if cache_dir != "":
+            os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS audio_meta ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, meta TEXT)"
+        )
+        self._conn.commit()
+        self._pid = os.getpid()
+        return self._conn
+
+    def get(self, path: str, size: int, mtime_ns: int) -> Optional[Dict]:
+        row = self._get_conn().execute(
+            "SELECT size, mtime_ns, meta FROM audio_meta WHERE path = ?",
+            (os.path.abspath(path), )
+        ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return json.loads(row[2])
+
+    def put(self, path: str, size: int, mtime_ns: int, meta: Dict) -> None:
+        conn: sqlite3.Connection = self._get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO audio_meta VALUES (?, ?, ?, ?)",
+            (os.path.abspath(path), size, mtime_ns, json.dumps(meta))
+        )
+        conn.commit()
+
+
+_AUDIO_META_CACHES: Dict[str, AudioMetaCache] = {}
+
+
+def audio_meta_cache_get(path: str) -> AudioMetaCache:
+    path = os.path.abspath(path)
+    if path not in _AUDIO_META_CACHES:
+        _AUDIO_META_CACHES[path] = AudioMetaCache(path)
+    return _AUDIO_META_CACHES[path]
+
 
+def audio_probe_header(path: str) -> Optional[Dict[str, Union[str, int]]]:
+    """
+    Reads frames, sample rate, channels and codec from container header
+    without decoding audio payload, returns `None` when the format has no
+    usable header.
+
+    Note for MP3 without Xing/LAME tag, frame number is estimated by the
+    decoder from bitrate, so the duration can be a few milliseconds off.
+    """
+    try:
+        info = sf.info(path)
+        if info.frames > 0 and info.samplerate > 0:
+            return {
+                "num_frames": int(info.frames),
+                "sample_rate": int(info.samplerate),
+                "num_channels": int(info.channels),
+                "codec": "%s/%s" % (info.format, info.subtype)
+            }
+    except RuntimeError:
+        pass
+
+    if hasattr(torchaudio, "info"):
+        try:
+            info = torchaudio.info(path)
+            if info.num_frames > 0 and info.sample_rate > 0:
+                return {
+                    "num_frames": int(info.num_frames),
+                    "sample_rate": int(info.sample_rate),
+                    "num_channels": int(info.num_channels),
+                    "codec": str(info.encoding)
+                }
+        except RuntimeError:
+            pass
+    return None
+
+
+def audio_probe_decode(path: str) -> Dict[str, Union[str, int]]:
     waveform: Tensor = None
     sample_rate: int = -1
     waveform, sample_rate = torchaudio.load(path)
-    
-    duration_sec: int = waveform.shape[-1] / sample_rate
-    metadata[audio_duration_col] = duration_sec
+    return {
+        "num_frames": int(waveform.shape[-1]),
+        "sample_rate": int(sample_rate),
+        "num_channels": int(waveform.shape[0]),
+        "codec": "decoded"
+    }
+
+
+def audio_probe(
+    path: str,
+    cache_path: Optional[str]=AUDIO_META_CACHE_PATH,
+    decode: bool=False
+) -> Dict[str, Union[str, int, float]]:
+    """
+    Args:
+        path: Audio file path.
+        cache_path: SQLite file of persistent metadata cache, no caching
+            if it's `None`.
+        decode: Always fully decode audio to get exact frame number,
+            otherwise only decode when there is no usable header.
+    """
+    cache: Optional[AudioMetaCache] = None
+    stat: Optional[os.stat_result] = None
+    if cache_path is not None:
+        cache = audio_meta_cache_get(cache_path)
+        stat = os.stat(path)
+        cached: Optional[Dict] = cache.get(path, stat.st_size, stat.st_mtime_ns)
+        if cached is not None and (not decode or cached["probe"] == "decode"):
+            return cached
+
+    meta: Optional[Dict] = None if decode else audio_probe_header(path)
+    if meta is not None:
+        meta["probe"] = "header"
+    else:
+        meta = audio_probe_decode(path)
+        meta["probe"] = "decode"
+    meta["duration_sec"] = meta["num_frames"] / meta["sample_rate"]
 
+    if cache is not None:
+        cache.put(path, stat.st_size, stat.st_mtime_ns, meta)
+    return meta
+
+
+def audio_get_meta(
+    path: str,
+    audio_path_col: str="path",
+    audio_duration_col: str="duration_sec",
+    cache_path: Optional[str]=AUDIO_META_CACHE_PATH,
+    decode: bool=False
+) -> Dict[str, Union[str, int, float]]:
+    metadata: Dict[str, Union[str, int, float]] = {}
+    metadata[audio_path_col] = path
+    metadata[audio_duration_col] = audio_probe(
+        path, cache_path=cache_path, decode=decode
+    )["duration_sec"]
     return metadata
@@ -3,10 +3,10 @@
 # date: 2024-03-08
 
 
-from opencc import OpenCC
+from .... import text_norm
 
 
 def text_force_simplified_chinese(text: str, lang: str="") -> str:
     if lang.lower() not in {"mandarin", "zh-cn", "zh-tw", "zh"}:
         return text
-    return OpenCC("tw2s.json").convert(text)
+    return text_norm.convert(text, "tw2s.json")
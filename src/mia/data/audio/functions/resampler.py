@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# file: resampler.py
+# date: 2026-10-18
+
+
+import torch
+from functools import lru_cache
+from torch import Tensor
+from torchaudio.transforms import Resample
+
+
+@lru_cache(maxsize=64)
+def get_resampler(
+    orig_freq: int, new_freq: int, dtype: torch.dtype=torch.float32
+) -> Resample:
+    """
+    Resampler with pre-computed sinc kernel, shared in process for each 
+    `(orig_freq, new_freq, dtype)`.
+    """
+    return Resample(orig_freq=orig_freq, new_freq=new_freq, dtype=dtype)
+
+
+def waveform_resample(
+    waveform: Tensor, orig_freq: int, new_freq: int, mono: bool=True
+) -> Tensor:
+    """
+    Args:
+        waveform: Tensor with shape `(channels, frames)`.
+        mono: Down-mixing channels by averaging before resampling, so the 
+            kernel only runs on one channel.
+    """
+    if mono and waveform.dim() == 2 and waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0, keepdim=True)
+    if orig_freq == new_freq:
+        return waveform
+    return get_resampler(int(orig_freq), int(new_freq), waveform.dtype)(waveform)
@@ -4,10 +4,15 @@
 
 
 import pdb
+import os
 import copy
-import opencc
+import random as rd
+import multiprocessing as mp
+import torch
 import numpy as np
-from typing import Dict, List
+from torch import Tensor
+from torch.utils.data import Dataset as TorchDataset
+from typing import Dict, List, Optional
 from datasets import load_dataset
 from datasets import DatasetDict, Dataset
 from datasets import Audio
@@ -16,8 +21,11 @@ from transformers import Trainer, TrainerCallback
 from transformers import TrainingArguments, TrainerState, TrainerControl
 
 from . import argumentation
+from ... import text_norm
 from .argumentation import spec_argument
 from .functions import datasetdict_load_jsonl
+from .functions import waveforms2log_mel
+from .shards import ShardAudioTransform
 
 
 class HfAudioDataset:
@@ -34,7 +42,16 @@ class HfAudioDataset:
         num_proc: int=4, 
         keep_static_data: bool=False,
         waveform_argument_splits: List[str]=["train"],
+        incremental: bool=False
     ):
+        """
+        Args:
+            incremental: Only re-building `waveform_argument_splits` in 
+                each `get_final_datasets` call. Transcript normalization, 
+                tokenization and filtering (with original audio duration) 
+                of all splits, and featurization of non-augmented splits 
+                are computed once and cached.
+        """
         self.processor: WhisperProcessor = processor
         self.train_data_path: str = train_data_path
         self.dev_data_path: str = dev_data_path
@@ -51,8 +68,11 @@ class HfAudioDataset:
         self.num_proc: int = num_proc
         self.keep_static_data: bool = keep_static_data
         self.waveform_argument_splits: List[str] = waveform_argument_splits
+        self.incremental: bool = incremental
 
         self.static_datasets: DatasetDict = None
+        self.cached_datasets: DatasetDict = None
+        self.epoch_cache_files: List[str] = []
         
         if self.keep_static_data:
             print("Pre-compute and keep static dataset")
@@ -66,19 +86,128 @@ class HfAudioDataset:
             self.dev_data_path, self.test_data_path
         )
         
+        split_paths: Dict[str, str] = {
+            "train": self.train_data_path, 
+            "validation": self.dev_data_path, "test": self.test_data_path
+        }
         for split in datasets:
             dataset: Dataset = datasets[split]
+            # Global index of packed shards, see `mia.data.audio.shards`
+            shard_dir: Optional[str] = None
+            if {"shard", "offset_data", "size"} <= set(dataset.column_names):
+                shard_dir = os.path.dirname(os.path.abspath(split_paths[split]))
             dataset = dataset_load_audio(
                 dataset, 
                 sampling_rate=self.sampling_rate, 
-                audio_path_col=self.audio_path_col, audio_col=self.audio_col
+                audio_path_col=self.audio_path_col, audio_col=self.audio_col,
+                shard_dir=shard_dir
             )
             dataset.cleanup_cache_files()
             datasets[split] = dataset
 
         return datasets
 
+    def get_augmentation_independent_datasets(
+        self, featurize: bool=True
+    ) -> DatasetDict:
+        """
+        Args:
+            featurize: Running feature extractor on splits not in 
+                `waveform_argument_splits`, otherwise all splits still 
+                keep raw audio and leave featurization to the caller.
+        """
+        datasets: DatasetDict = None
+        if self.keep_static_data and self.static_datasets is not None:
+            datasets = DatasetDict(self.static_datasets)
+        else:
+            datasets = self.get_static_datasets() 
+
+        for split in datasets:
+            print("Building augmentation independent %s dataset" % split)
+            dataset: Dataset = dataset_raw_transcript_processor(
+                datasets[split], text_col=self.text_col, lang=self.lang, 
+                num_proc=self.num_proc
+            )
+            dataset = dataset_run_hf_tokenizer(
+                dataset, 
+                self.processor, self.audio_col, self.text_col, self.duration_col, 
+                num_proc=self.num_proc
+            )
+            dataset = dataset_filter(
+                dataset, 
+                self.min_duration, self.max_duration, self.max_label_len,
+                duration_col=self.duration_col
+            )
+            if featurize and split not in self.waveform_argument_splits:
+                dataset = dataset_run_hf_feature_extractor(
+                    dataset, self.processor, self.audio_col, self.duration_col, 
+                    num_proc=self.num_proc
+                )
+            datasets[split] = dataset
+        return datasets
+
+    def get_incremental_final_datasets(self) -> DatasetDict:
+        if self.cached_datasets is None:
+            self.cached_datasets = self.get_augmentation_independent_datasets()
+        else:
+            print("Re-use cached augmentation independent datasets")
+
+        # Cache files of augmented splits of previous epoch are not needed
+        for path in self.epoch_cache_files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.epoch_cache_files = []
+
+        datasets: DatasetDict = DatasetDict()
+        for split in self.cached_datasets:
+            dataset: Dataset = self.cached_datasets[split]
+            if split in self.waveform_argument_splits:
+                print("Building final %s dataset" % split)
+                static_cache_files: List[str] = [
+                    x["filename"] for x in dataset.cache_files
+                ]
+                shuffled: Dataset = dataset.shuffle()
+                argumented: Dataset = dataset_audio_time_domain_argumentation(
+                    shuffled, self.audio_col, self.sampling_rate, 
+                    num_proc=self.num_proc
+                )
+                dataset = dataset_run_hf_feature_extractor(
+                    argumented, self.processor, self.audio_col, self.duration_col, 
+                    num_proc=self.num_proc
+                )
+                self.epoch_cache_files += [
+                    x["filename"] for x in 
+                    shuffled.cache_files + argumented.cache_files + dataset.cache_files
+                    if x["filename"] not in static_cache_files
+                ]
+            datasets[split] = dataset
+        return datasets
+
+    def get_on_the_fly_datasets(
+        self, seed: int=42
+    ) -> Dict[str, "OnTheFlyAudioDataset"]:
+        """
+        Same data as `get_final_datasets`, but time domain augmentation and 
+        feature extraction of each sample run lazily in `__getitem__`, i.e. 
+        inside DataLoader workers, so they overlap with model compute and 
+        nothing has to be rebuilt between epochs. Call `set_epoch` (or use 
+        `AudioDatasetEpochCallback`) to re-draw augmentations each epoch.
+        """
+        static_datasets: DatasetDict = \
+            self.get_augmentation_independent_datasets(featurize=False)
+        return {
+            split: OnTheFlyAudioDataset(
+                static_datasets[split], self.processor, 
+                audio_col=self.audio_col, duration_col=self.duration_col,
+                waveform_argument=(split in self.waveform_argument_splits),
+                seed=seed
+            ) for split in static_datasets
+        }
+
     def get_final_datasets(self) -> DatasetDict:
+        if self.incremental:
+            return self.get_incremental_final_datasets()
+
         datasets: DatasetDict = None
         if self.keep_static_data and self.static_datasets is not None:
             print("Re-use pre-computed static dataset")
@@ -123,6 +252,86 @@ class HfAudioDataset:
         return datasets
 
 
+class OnTheFlyAudioDataset(TorchDataset):
+    """
+    Map-style dataset decoding, augmenting and featurizing samples on 
+    access. Augmentation of sample `idx` is seeded by `(seed, epoch, idx)`, 
+    so it's reproducible no matter which worker loads it. The epoch is kept 
+    in shared memory, so `set_epoch` also reaches persistent workers.
+    """
+    def __init__(self, 
+        dataset: Dataset, 
+        processor: WhisperProcessor,
+        audio_col: str="audio",
+        duration_col: str="input_length",
+        model_input_col: str="input_features",
+        model_label_col: str="labels",
+        waveform_argument: bool=True,
+        seed: int=42
+    ):
+        self.dataset: Dataset = dataset
+        self.processor: WhisperProcessor = processor
+        self.audio_col: str = audio_col
+        self.duration_col: str = duration_col
+        self.model_input_col: str = model_input_col
+        self.model_label_col: str = model_label_col
+        self.waveform_argument: bool = waveform_argument
+        self.seed: int = seed
+        self.epoch = mp.Value("i", 0)
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch.value = epoch
+
+    def sample_seed(self, idx: int) -> int:
+        return int(
+            np.random.SeedSequence(
+                [self.seed, self.epoch.value, idx]
+            ).generate_state(1)[0]
+        )
+
+    def __getitem__(self, idx: int) -> Dict:
+        sample: Dict = self.dataset[idx]
+        audio: Dict = sample.pop(self.audio_col)
+        waveform: np.ndarray = audio["array"]
+        if self.waveform_argument:
+            # Local RNGs, so global ones of main process (`num_workers=0`) 
+            # are not reseeded
+            seed: int = self.sample_seed(idx)
+            waveform = argumentation.augly_transforms_apply(
+                waveform, audio["sampling_rate"], 
+                rd.Random(seed), np.random.RandomState(seed),
+                argumentation.AUGLY_TRANSFORMS
+            )[0]
+        
+        sample[self.model_input_col] = waveforms2log_mel(
+            [torch.from_numpy(np.asarray(waveform, dtype=np.float32))], 
+            self.processor
+        )[0]
+        sample[self.duration_col] = len(waveform) / audio["sampling_rate"]
+        return sample
+
+
+class AudioDatasetEpochCallback(TrainerCallback):
+    """
+    Used instead of `DataArgumentationCallback` when training on 
+    `HfAudioDataset.get_on_the_fly_datasets`, only updates the epoch which 
+    seeds augmentations instead of rebuilding the training dataset.
+    """
+    def __init__(self, datasets: List[OnTheFlyAudioDataset]):
+        self.datasets: List[OnTheFlyAudioDataset] = datasets
+
+    def on_epoch_begin(
+        self, 
+        args: TrainingArguments, state: TrainerState, control: TrainerControl, 
+        **kwargs
+    ):
+        for dataset in self.datasets:
+            dataset.set_epoch(int(state.epoch))
+
+
 class DataArgumentationCallback(TrainerCallback):
     def __init__(self, dataset: HfAudioDataset, trainer: Trainer):
         self.dataset: HfAudioDataset = dataset
@@ -144,9 +353,22 @@ class DataArgumentationCallback(TrainerCallback):
 
 def dataset_load_audio(
     jsonl_dataset: Dataset, 
-    sampling_rate: int=16000, audio_path_col: str="path", audio_col: str="audio"
+    sampling_rate: int=16000, audio_path_col: str="path", audio_col: str="audio",
+    shard_dir: Optional[str]=None
 ) -> Dataset:
+    """
+    Args:
+        shard_dir: Directory of packed shards when `jsonl_dataset` is their 
+            global index, audios are then lazily decoded from shards by 
+            offsets (see `ShardAudioTransform`) instead of from 
+            `audio_path_col`.
+    """
     print("Running dataset audio loader")
+    if shard_dir is not None:
+        return jsonl_dataset.with_transform(ShardAudioTransform(
+            shard_dir, sampling_rate, 
+            audio_path_col=audio_path_col, audio_col=audio_col
+        ))
     dataset: Dataset = jsonl_dataset.add_column(
         audio_col, jsonl_dataset[audio_path_col]
     )
@@ -187,13 +409,14 @@ def dataset_raw_transcript_processor(
     dataset: Dataset = audio_dataset
     if lang in {"zh-TW", "mandarin"}:
         print("Converting %s to simplified Chinese" % lang)
-        def convert_text(example: Dict, text_col: str) -> Dict:
-            converter: opencc.OpenCC = opencc.OpenCC('tw2s.json')
-            example[text_col] = converter.convert(example[text_col])
-            return example
+        def convert_text(examples: Dict, text_col: str) -> Dict:
+            examples[text_col] = text_norm.convert_many(
+                examples[text_col], "tw2s.json"
+            )
+            return examples
         dataset = dataset.map(
             convert_text, fn_kwargs={"text_col": text_col}, 
-            num_proc=num_proc
+            batched=True, num_proc=num_proc
         )
     return dataset
 
@@ -230,6 +453,65 @@ def dataset_run_hf_processor(
     return dataset
 
 
+def sample_hf_tokenizer(
+    sample: Dict, processor: WhisperProcessor, audio_col: str, text_col: str, 
+    duration_col: str="input_length"
+) -> Dict:
+    audio: Dict = sample[audio_col]
+    return {
+        "labels": processor.tokenizer(sample[text_col]).input_ids, 
+        duration_col: len(audio["array"]) / audio["sampling_rate"]
+    }
+
+
+def dataset_run_hf_tokenizer(
+    audio_dataset: Dataset, processor: WhisperProcessor, 
+    audio_col: str, text_col: str, 
+    duration_col: str="input_length", 
+    num_proc: int=4
+) -> Dataset:
+    print("Running dataset HuggingFace tokenizer")
+    dataset: Dataset = audio_dataset.map(
+        sample_hf_tokenizer, 
+        fn_kwargs={
+            "processor": processor, 
+            "audio_col": audio_col, "text_col": text_col, 
+            "duration_col": duration_col
+        },
+        num_proc=num_proc
+    )
+    return dataset
+
+
+def sample_hf_feature_extractor(
+    sample: Dict, processor: WhisperProcessor, audio_col: str, 
+    duration_col: str="input_length"
+) -> Dict:
+    audio: Dict = sample[audio_col]
+    output = processor.feature_extractor(
+        audio["array"], sampling_rate=audio["sampling_rate"]
+    )
+    output[duration_col] = len(audio["array"]) / audio["sampling_rate"]
+    return output
+
+
+def dataset_run_hf_feature_extractor(
+    audio_dataset: Dataset, processor: WhisperProcessor, audio_col: str, 
+    duration_col: str="input_length", 
+    num_proc: int=4
+) -> Dataset:
+    print("Running dataset HuggingFace feature extractor")
+    dataset: Dataset = audio_dataset.map(
+        sample_hf_feature_extractor, 
+        fn_kwargs={
+            "processor": processor, "audio_col": audio_col, 
+            "duration_col": duration_col
+        },
+        num_proc=num_proc
+    )
+    return dataset
+
+
 def sample_filter_flag(
     audio_duration: int, label_tokens: int, 
     min_duration: int, max_duration: int, max_label_len: int,
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# file: sampler.py
+# date: 2026-10-18
+
+
+import numpy as np
+from numpy import ndarray
+from torch.utils.data import Sampler
+from typing import Iterator, List, Optional
+
+
+def lengths2batches(
+    sorted_ids: ndarray, token_nums: Optional[ndarray],
+    batch_size: int, max_tokens: Optional[int]=None
+) -> List[List[int]]:
+    """
+    Greedily cuts already sorted sample ids into batches, a batch is closed
+    when it has `batch_size` samples or adding one more sample makes its
+    padded label size, i.e. `batch size * max token number`, exceed
+    `max_tokens`. A single sample longer than `max_tokens` still gets its
+    own batch.
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_max_tokens: int = 0
+    for idx in sorted_ids.tolist():
+        tokens: int = 0 if token_nums is None else int(token_nums[idx])
+        new_max_tokens: int = max(batch_max_tokens, tokens)
+        if len(batch) > 0 and (
+            len(batch) >= batch_size
+            or (max_tokens is not None and new_max_tokens * (len(batch) + 1) > max_tokens)
+        ):
+            batches.append(batch)
+            batch = []
+            new_max_tokens = tokens
+        batch.append(idx)
+        batch_max_tokens = new_max_tokens
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+class BucketBatchSampler(Sampler[List[int]]):
+    """
+    Batch sampler for training which keeps samples with similar token
+    number and duration in the same batch, so decoder does not pay for the
+    longest label of a random batch.
+
+    Each epoch, sample ids are shuffled and cut into buckets of
+    `batch_size * bucket_size_multiplier` samples, each bucket is sorted by
+    `(token_nums, durations)` and cut into batches, finally all batches are
+    shuffled so the batch lengths are random across training steps. Like
+    `DistributedSampler`, call `set_epoch` before each epoch to re-draw.
+    """
+    def __init__(self,
+        durations: List[float],
+        token_nums: Optional[List[int]]=None,
+        batch_size: int=16,
+        max_tokens: Optional[int]=None,
+        bucket_size_multiplier: int=100,
+        shuffle: bool=True,
+        seed: int=42,
+        drop_last: bool=False
+    ):
+        """
+        Args:
+            durations: Audio duration of each sample.
+            token_nums: Label token number of each sample, only sorting by
+                `durations` when it's `None`.
+            max_tokens: Upper bound of `batch size * max token number` of
+                each batch, no limit if it's `None`.
+            drop_last: Dropping the last batch of each bucket when it's
+                smaller than `batch_size`.
+        """
+        if token_nums is not None and len(token_nums) != len(durations):
+            raise Exception("durations and token_nums have different length")
+        if max_tokens is not None and token_nums is None:
+            raise Exception("max_tokens needs token_nums")
+        self.durations: ndarray = np.asarray(durations, dtype=np.float64)
+        self.token_nums: Optional[ndarray] = \
+            None if token_nums is None else np.asarray(token_nums, dtype=np.int64)
+        self.batch_size: int = batch_size
+        self.max_tokens: Optional[int] = max_tokens
+        self.bucket_size: int = max(batch_size * bucket_size_multiplier, 1)
+        self.shuffle: bool = shuffle
+        self.seed: int = seed
+        self.drop_last: bool = drop_last
+        self.epoch: int = 0
+        self._batches: Optional[List[List[int]]] = None
+
+    def set_epoch(self, epoch: int) -> None:
+        if epoch != self.epoch:
+            self._batches = None
+        self.epoch = epoch
+
+    def sort_ids(self, ids: ndarray) -> ndarray:
+        if self.token_nums is None:
+            return ids[np.argsort(self.durations[ids], kind="stable")]
+        return ids[np.lexsort((self.durations[ids], self.token_nums[ids]))]
+
+    def get_batches(self) -> List[List[int]]:
+        if self._batches is not None:
+            return self._batches
+
+        rng: np.random.Generator = np.random.default_rng([self.seed, self.epoch])
+        ids: ndarray = np.arange(len(self.durations))
+        if self.shuffle:
+            ids = rng.permutation(ids)
+
+        batches: List[List[int]] = []
+        for start in range(0, len(ids), self.bucket_size):
+            bucket_batches: List[List[int]] = lengths2batches(
+                self.sort_ids(ids[start:start + self.bucket_size]),
+                self.token_nums, self.batch_size, self.max_tokens
+            )
+            if self.drop_last and len(bucket_batches) > 0 \
+                    and len(bucket_batches[-1]) < self.batch_size:
+                bucket_batches = bucket_batches[:-1]
+            batches += bucket_batches
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        self._batches = batches
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self.get_batches())
+
+    def __len__(self) -> int:
+        return len(self.get_batches())
+
+
+class SortedBatchSampler(Sampler[List[int]]):
+    """
+    Batch sampler for inference, sorting all samples by duration (longest
+    first by default) so samples in one batch finish decoding at about the
+    same time. Callers need to restore the original order with batch ids.
+    """
+    def __init__(self,
+        durations: List[float],
+        batch_size: int=16,
+        token_nums: Optional[List[int]]=None,
+        max_tokens: Optional[int]=None,
+        descending: bool=True
+    ):
+        durations: ndarray = np.asarray(durations, dtype=np.float64)
+        sorted_ids: ndarray = np.argsort(
+            -durations if descending else durations, kind="stable"
+        )
+        self.batches: List[List[int]] = lengths2batches(
+            sorted_ids,
+            None if token_nums is None else np.asarray(token_nums, dtype=np.int64),
+            batch_size, max_tokens
+        )
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self.batches)
+
+    def __len__(self) -> int:
+        return len(self.batches)
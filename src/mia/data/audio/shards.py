@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+# file: shards.py
+# date: 2026-10-18
+
+
+import io
+import os
+import time
+import shutil
+import hashlib
+import tarfile
+import random as rd
+import torch
+import soundfile as sf
+import multiprocessing as mp
+from tqdm import tqdm
+from numpy import ndarray
+from torch.utils.data import Dataset as TorchDataset
+from torch.utils.data import IterableDataset as TorchIterableDataset
+from typing import Dict, List, Tuple, Optional, Iterable, Iterator, IO, Any
+
+from .converter import audio_file_read
+from .functions.resampler import waveform_resample
+from ...utils import audio_segment_encode
+from ...utils import json_dumps
+from ...utils import json_loads
+from ...utils import jsonl_iter
+from ...utils import JsonlWriter
+from ...utils import JsonlIndexedReader
+
+
+SHARD_INDEX_NAME: str = "index.jsonl"
+# Columns of global index which are not sample metadata
+INDEX_ONLY_COLS: Tuple[str, ...] = (
+    "key", "shard", "audio_member", "offset_data", "size",
+    "json_offset_data", "json_size"
+)
+
+
+def shard_name(shard_id: int) -> str:
+    return "shard-%06i.tar" % shard_id
+
+
+def sample_key(sample_id: int) -> str:
+    """
+    WebDataset splits member names at the first dot, so keys have none.
+    """
+    return "%012i" % sample_id
+
+
+class ShardWriter:
+    """
+    Writes samples into one uncompressed tar shard, each sample is an audio
+    member `<key>.<ext>` followed by a metadata member `<key>.json`, which
+    is WebDataset layout. Data offsets of members are recorded, so a sample
+    can be read with one seek without scanning the tar.
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        self.tmp_path: str = os.path.join(
+            os.path.dirname(path), ".tmp." + os.path.basename(path)
+        )
+        self.tar: tarfile.TarFile = tarfile.open(self.tmp_path, "w", format=tarfile.GNU_FORMAT)
+        self.index: List[Dict] = []
+
+    def _add(self, name: str, data: bytes, mtime: float) -> int:
+        info: tarfile.TarInfo = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(mtime)
+        self.tar.addfile(info, io.BytesIO(data))
+        blocks: int = (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE
+        return self.tar.offset - blocks * tarfile.BLOCKSIZE
+
+    def write(self, key: str, audio: bytes, audio_ext: str, metadata: Dict) -> Dict:
+        """
+        Returns:
+            Index entry, which is `metadata` with `offset_data` and `size` 
+            of both members, so index file is also a manifest of samples.
+        """
+        mtime: float = time.time()
+        metadata_bytes: bytes = json_dumps(metadata).encode("utf-8")
+        entry: Dict = {
+            **metadata,
+            "key": key,
+            "shard": os.path.basename(self.path),
+            "audio_member": "%s.%s" % (key, audio_ext),
+            "offset_data": self._add("%s.%s" % (key, audio_ext), audio, mtime),
+            "size": len(audio),
+            "json_offset_data": self._add("%s.json" % key, metadata_bytes, mtime),
+            "json_size": len(metadata_bytes)
+        }
+        self.index.append(entry)
+        return entry
+
+    def close(self) -> List[Dict]:
+        self.tar.close()
+        os.replace(self.tmp_path, self.path)
+        return self.index
+
+
+def audio_file2bytes(
+    path: str, audio_format: Optional[str]=None,
+    sample_rate: Optional[int]=None, channels: Optional[int]=None
+) -> Tuple[bytes, str]:
+    """
+    Returns:
+        Encoded audio and its extension. Raw file bytes are returned as is
+        when `audio_format` is `None` or same as the file's one and no
+        resampling or channel mixing is asked.
+    """
+    ext: str = path.split(".")[-1].lower()
+    if (audio_format is None or audio_format == ext) \
+            and sample_rate is None and channels is None:
+        return (open(path, "rb").read(), ext)
+
+    audio_format = ext if audio_format is None else audio_format
+    audio: ndarray = None
+    orig_sample_rate: int = -1
+    audio, orig_sample_rate = audio_file_read(path)
+    buf: io.BytesIO = io.BytesIO()
+    audio_segment_encode(buf, audio_format, audio, orig_sample_rate, sample_rate, channels)
+    return (buf.getvalue(), audio_format)
+
+
+def _write_shard(
+    args: Tuple[str, List[Tuple[int, Dict]], str, Dict]
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Returns:
+        Index entries of the shard, and records of samples which failed to
+        be read or encoded with an "error" column, those are skipped.
+    """
+    shard_path, samples, audio_path_col, audio_kwargs = args
+    index_path: str = shard_path[:-len(".tar")] + ".index.jsonl"
+    failure_path: str = shard_path[:-len(".tar")] + ".failures.jsonl"
+    if os.path.exists(shard_path) and os.path.exists(index_path):
+        return (
+            list(jsonl_iter(index_path)),
+            list(jsonl_iter(failure_path)) if os.path.exists(failure_path) else []
+        )
+
+    writer: ShardWriter = ShardWriter(shard_path)
+    failures: List[Dict] = []
+    for sample_id, record in samples:
+        try:
+            audio, ext = audio_file2bytes(record[audio_path_col], **audio_kwargs)
+        except Exception as e:
+            failures.append({**record, "error": "%s: %s" % (type(e).__name__, str(e))})
+            continue
+        writer.write(
+            sample_key(sample_id), audio, ext,
+            {**record, audio_path_col: "%s.%s" % (sample_key(sample_id), ext)}
+        )
+    index: List[Dict] = writer.close()
+    # Failures are written before index, which marks the shard as finished
+    with JsonlWriter(failure_path + ".tmp") as failure_writer:
+        failure_writer.write_many(failures)
+    os.replace(failure_path + ".tmp", failure_path)
+    with JsonlWriter(index_path + ".tmp") as index_writer:
+        index_writer.write_many(index)
+    os.replace(index_path + ".tmp", index_path)
+    return (index, failures)
+
+
+def plan_shards(
+    records: Iterable[Dict], audio_path_col: str,
+    max_shard_bytes: int=2 ** 30, max_shard_samples: Optional[int]=None
+) -> Iterator[List[Tuple[int, Dict]]]:
+    """
+    Groups records into shards of consecutive samples by source file size,
+    so shard size is only approximated when audios are re-encoded.
+    """
+    shard: List[Tuple[int, Dict]] = []
+    shard_bytes: int = 0
+    for sample_id, record in enumerate(records):
+        size: int = 0
+        try:
+            size = os.path.getsize(record[audio_path_col])
+        except OSError:
+            # Left to `_write_shard` which records it as a failure
+            pass
+        if len(shard) > 0 and (
+            shard_bytes + size > max_shard_bytes
+            or (max_shard_samples is not None and len(shard) >= max_shard_samples)
+        ):
+            yield shard
+            shard = []
+            shard_bytes = 0
+        shard.append((sample_id, record))
+        shard_bytes += size
+    if len(shard) > 0:
+        yield shard
+
+
+def pack_shards(
+    records: Iterable[Dict],
+    output_dir: str,
+    audio_path_col: str="path",
+    keep_cols: Optional[List[str]]=None,
+    max_shard_bytes: int=2 ** 30,
+    max_shard_samples: Optional[int]=None,
+    audio_format: Optional[str]="flac",
+    sample_rate: Optional[int]=None,
+    channels: Optional[int]=None,
+    num_writers: int=4,
+    max_pending_shards: Optional[int]=None,
+    failure_path: Optional[str]=None
+) -> str:
+    """
+    Streams audios and their metadata into `shard-000000.tar`,
+    `shard-000001.tar`, ... under `output_dir`, shards are written by
+    `num_writers` processes in parallel. Each shard has its own
+    `.index.jsonl`, an existing shard with index is not re-written, so
+    an interrupted packing can be resumed with same inputs. An audio
+    which fails to be read or encoded is skipped and recorded in
+    `failure_path`.
+
+    Args:
+        keep_cols: Metadata columns kept in `.json` members besides
+            `audio_path_col`, which becomes the audio member name. All
+            columns are kept when it's `None`.
+        audio_format: Audios are re-encoded into this format, e.g. "flac",
+            `None` keeps source files' bytes.
+        max_pending_shards: Shards planned ahead of writing, bounds memory
+            of huge metadata files, defaults to `2 * num_writers`.
+        failure_path: Records of audios which can't be read or encoded are
+            written here with an "error" column instead of aborting the
+            packing, defaults to `failures.jsonl` under `output_dir`.
+
+    Returns:
+        Path of global index, which has one line per sample with its 
+        metadata, `key`, `shard`, and `offset_data`/`size` of audio and 
+        json members.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    audio_kwargs: Dict[str, Any] = {
+        "audio_format": audio_format, "sample_rate": sample_rate, "channels": channels
+    }
+    tasks: Iterator[Tuple[str, List[Tuple[int, Dict]], str, Dict]] = (
+        (
+            os.path.join(output_dir, shard_name(i)),
+            [
+                (sample_id, record if keep_cols is None else {
+                    k: record[k] for k in [audio_path_col] + keep_cols
+                }) for sample_id, record in shard
+            ],
+            audio_path_col, audio_kwargs
+        )
+        for i, shard in enumerate(
+            plan_shards(records, audio_path_col, max_shard_bytes, max_shard_samples)
+        )
+    )
+
+    index_path: str = os.path.join(output_dir, SHARD_INDEX_NAME)
+    max_pending_shards = max_pending_shards \
+        if max_pending_shards is not None else 2 * num_writers
+    failure_path = failure_path \
+        if failure_path is not None else os.path.join(output_dir, "failures.jsonl")
+    num_failures: int = 0
+    with JsonlWriter(index_path + ".tmp") as index_writer, \
+            JsonlWriter(failure_path, "w", flush_every=1) as failure_writer, \
+            mp.get_context("fork").Pool(num_writers) as pool, \
+            tqdm() as progress:
+        while True:
+            chunk: List[Tuple[str, List[Tuple[int, Dict]], str, Dict]] = [
+                x for _, x in zip(range(max_pending_shards), tasks)
+            ]
+            if len(chunk) == 0:
+                break
+            for shard_index, shard_failures in pool.imap(_write_shard, chunk):
+                index_writer.write_many(shard_index)
+                failure_writer.write_many(shard_failures)
+                num_failures += len(shard_failures)
+                progress.update(1)
+    os.replace(index_path + ".tmp", index_path)
+    if num_failures > 0:
+        print("%i audios failed to be packed, see '%s'" % (num_failures, failure_path))
+    return index_path
+
+
+def audio_bytes2waveform(
+    data: bytes, target_sample_rate: Optional[int]=16000
+) -> Tuple[ndarray, int]:
+    """
+    Decodes an audio member into mono float32 waveform, resampled into
+    `target_sample_rate` unless it's `None`.
+    """
+    audio: ndarray = None
+    sample_rate: int = -1
+    audio, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    waveform: ndarray = audio.mean(axis=1)
+    if target_sample_rate is not None and sample_rate != target_sample_rate:
+        waveform = waveform_resample(
+            torch.from_numpy(waveform).reshape(1, -1), sample_rate, target_sample_rate
+        ).reshape(-1).numpy()
+        sample_rate = target_sample_rate
+    return (waveform, sample_rate)
+
+
+def shard_sample_bytes(
+    shard_dir: str, entry: Dict, file: Optional[IO]=None
+) -> bytes:
+    """
+    Reads audio member of a global index entry with one seek, `file` is
+    the entry's already opened shard if given.
+    """
+    if file is not None:
+        file.seek(entry["offset_data"])
+        return file.read(entry["size"])
+    with open(os.path.join(shard_dir, entry["shard"]), "rb") as file:
+        file.seek(entry["offset_data"])
+        return file.read(entry["size"])
+
+
+class ShardCache:
+    """
+    Copies shards into a local directory (e.g. under `/tmp`) on first
+    access, so later epochs read local disk instead of network storage.
+    Least recently used shards are evicted when cached bytes exceed
+    `max_bytes`. Copies are renamed into place, so concurrent DataLoader
+    workers never see a partial shard.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int=64 * 2 ** 30):
+        self.cache_dir: str = cache_dir
+        self.max_bytes: int = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def local_path(self, shard_path: str) -> str:
+        return os.path.join(
+            self.cache_dir,
+            "%s-%s" % (
+                hashlib.sha1(os.path.abspath(shard_path).encode("utf-8")).hexdigest()[:16],
+                os.path.basename(shard_path)
+            )
+        )
+
+    def get(self, shard_path: str) -> str:
+        path: str = self.local_path(shard_path)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        self.evict(os.path.getsize(shard_path))
+        tmp_path: str = "%s.%i.tmp" % (path, os.getpid())
+        shutil.copyfile(shard_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def evict(self, incoming_bytes: int=0) -> None:
+        files: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".tmp"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+        total: int = sum(x[1] for x in files) + incoming_bytes
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class ShardedAudioDataset(TorchDataset):
+    """
+    Map-style dataset of packed shards with random access. Index entry of
+    sample `idx` is located by `JsonlIndexedReader` on global index, then
+    its audio is read with one seek into its shard, so neither the index
+    nor the shards are loaded into memory.
+
+    Samples have metadata columns (`audio_path_col` is the member name) and
+    `audio_col` in same layout as HuggingFace `Audio` feature, i.e.
+    `{"array", "sampling_rate", "path"}`, so they can be fed to
+    `OnTheFlyAudioDataset` and the collator.
+    """
+    def __init__(self,
+        index_path: str,
+        target_sample_rate: Optional[int]=16000,
+        audio_col: str="audio",
+        cache: Optional[ShardCache]=None
+    ):
+        self.index_path: str = index_path
+        self.shard_dir: str = os.path.dirname(os.path.abspath(index_path))
+        self.target_sample_rate: Optional[int] = target_sample_rate
+        self.audio_col: str = audio_col
+        self.cache: Optional[ShardCache] = cache
+        self.index: JsonlIndexedReader = JsonlIndexedReader(index_path)
+        self._files: Dict[str, IO] = {}
+        self._pid: int = -1
+
+    def __getstate__(self) -> Dict:
+        state: Dict = self.__dict__.copy()
+        state["_files"] = {}
+        state["_pid"] = -1
+        return state
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _shard_file(self, shard: str) -> IO:
+        if self._pid != os.getpid():
+            self._files = {}
+            self._pid = os.getpid()
+        if shard not in self._files:
+            path: str = os.path.join(self.shard_dir, shard)
+            if self.cache is not None:
+                path = self.cache.get(path)
+            self._files[shard] = open(path, "rb")
+        return self._files[shard]
+
+    def read_bytes(self, entry: Dict) -> bytes:
+        return shard_sample_bytes(
+            self.shard_dir, entry, self._shard_file(entry["shard"])
+        )
+
+    def __getitem__(self, idx: int) -> Dict:
+        entry: Dict = self.index[idx]
+        waveform, sample_rate = audio_bytes2waveform(
+            self.read_bytes(entry), self.target_sample_rate
+        )
+        sample: Dict = {
+            k: v for k, v in entry.items() if k not in INDEX_ONLY_COLS
+        }
+        sample[self.audio_col] = {
+            "array": waveform, "sampling_rate": sample_rate,
+            "path": entry["audio_member"]
+        }
+        return sample
+
+    def close(self) -> None:
+        for file in self._files.values():
+            file.close()
+        self._files = {}
+        self.index.close()
+
+
+class ShardAudioTransform:
+    """
+    Batch transform of a HuggingFace dataset of global index (see
+    `Dataset.with_transform`), decoding audios from packed shards on
+    access into `audio_col` in `Audio` feature layout, so audio bytes are
+    never copied into Arrow cache. A batch is read in order of shard
+    offsets with one opened file per shard and process.
+    """
+    def __init__(self,
+        shard_dir: str,
+        target_sample_rate: Optional[int]=16000,
+        audio_path_col: str="path",
+        audio_col: str="audio"
+    ):
+        self.shard_dir: str = shard_dir
+        self.target_sample_rate: Optional[int] = target_sample_rate
+        self.audio_path_col: str = audio_path_col
+        self.audio_col: str = audio_col
+        self._files: Dict[str, IO] = {}
+        self._pid: int = -1
+
+    def __getstate__(self) -> Dict:
+        state: Dict = self.__dict__.copy()
+        state["_files"] = {}
+        state["_pid"] = -1
+        return state
+
+    def _shard_file(self, shard: str) -> IO:
+        if self._pid != os.getpid():
+            self._files = {}
+            self._pid = os.getpid()
+        if shard not in self._files:
+            self._files[shard] = open(os.path.join(self.shard_dir, shard), "rb")
+        return self._files[shard]
+
+    def __call__(self, batch: Dict[str, List]) -> Dict[str, List]:
+        # Already decoded (and e.g. augmented) by an upstream `map`, or
+        # only some columns are requested
+        if self.audio_col in batch or \
+                not {"shard", "offset_data", "size"} <= set(batch.keys()):
+            return batch
+        audios: List[Optional[Dict]] = [None] * len(batch["shard"])
+        for i in sorted(
+            range(len(audios)), 
+            key=lambda x: (batch["shard"][x], batch["offset_data"][x])
+        ):
+            entry: Dict = {k: batch[k][i] for k in ("offset_data", "size")}
+            waveform, sample_rate = audio_bytes2waveform(
+                shard_sample_bytes(
+                    self.shard_dir, entry, self._shard_file(batch["shard"][i])
+                ),
+                self.target_sample_rate
+            )
+            audios[i] = {
+                "array": waveform, "sampling_rate": sample_rate,
+                "path": batch[self.audio_path_col][i]
+            }
+        return {**batch, self.audio_col: audios}
+
+
+def shard_iter(path: str) -> Iterator[Tuple[str, bytes, str, Dict]]:
+    """
+    Streams samples of a shard in one sequential read.
+
+    Returns:
+        Iterator of key, audio bytes, audio extension and metadata.
+    """
+    with tarfile.open(path, "r|") as tar:
+        key: str = ""
+        audio: bytes = b""
+        ext: str = ""
+        for member in tar:
+            member_key, member_ext = member.name.split(".", 1)
+            data: bytes = tar.extractfile(member).read()
+            if member_ext == "json":
+                if member_key == key:
+                    yield (key, audio, ext, json_loads(data))
+            else:
+                key, audio, ext = member_key, data, member_ext
+
+
+class ShardedAudioIterableDataset(TorchIterableDataset):
+    """
+    Streams shards sequentially, shard order is shuffled by `(seed,
+    epoch)` and shards are split among DataLoader workers, optionally
+    samples are shuffled again within a buffer of `shuffle_buffer_size`.
+    Samples are in same layout as `ShardedAudioDataset`'s.
+    """
+    def __init__(self,
+        shard_dir: str,
+        target_sample_rate: Optional[int]=16000,
+        audio_col: str="audio",
+        shuffle: bool=True,
+        shuffle_buffer_size: int=0,
+        seed: int=42,
+        cache: Optional[ShardCache]=None
+    ):
+        self.shard_dir: str = shard_dir
+        self.shards: List[str] = sorted(
+            x for x in os.listdir(shard_dir)
+            if x.startswith("shard-") and x.endswith(".tar")
+        )
+        self.target_sample_rate: Optional[int] = target_sample_rate
+        self.audio_col: str = audio_col
+        self.shuffle: bool = shuffle
+        self.shuffle_buffer_size: int = shuffle_buffer_size
+        self.seed: int = seed
+        self.cache: Optional[ShardCache] = cache
+        self.epoch = mp.Value("i", 0)
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch.value = epoch
+
+    def epoch_shards(self) -> List[str]:
+        shards: List[str] = list(self.shards)
+        if self.shuffle:
+            rd.Random(self.seed * 1000003 + self.epoch.value).shuffle(shards)
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None:
+            shards = shards[worker_info.id::worker_info.num_workers]
+        return shards
+
+    def _samples(self) -> Iterator[Dict]:
+        for shard in self.epoch_shards():
+            path: str = os.path.join(self.shard_dir, shard)
+            if self.cache is not None:
+                path = self.cache.get(path)
+            for key, audio, ext, metadata in shard_iter(path):
+                waveform, sample_rate = audio_bytes2waveform(
+                    audio, self.target_sample_rate
+                )
+                metadata[self.audio_col] = {
+                    "array": waveform, "sampling_rate": sample_rate,
+                    "path": "%s.%s" % (key, ext)
+                }
+                yield metadata
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self.shuffle_buffer_size <= 0:
+            yield from self._samples()
+            return
+        worker_info = torch.utils.data.get_worker_info()
+        rng: rd.Random = rd.Random(
+            (self.seed * 1000003 + self.epoch.value) * 1009
+            + (0 if worker_info is None else worker_info.id)
+        )
+        buffer: List[Dict] = []
+        for sample in self._samples():
+            if len(buffer) < self.shuffle_buffer_size:
+                buffer.append(sample)
+                continue
+            i: int = rng.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = sample
+        rng.shuffle(buffer)
+        yield from buffer
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# file: evaluation.py
+# date: 2026-10-18
+
+
+import multiprocessing as mp
+from typing import Dict, List, Tuple, Optional, Callable, Iterator, Any
+
+from .metrics import edit_ops
+from .metrics import ErrorCounter
+from .utils import jsonl_iter
+from .utils import jsonl_iter_range
+from .utils import jsonl_byte_ranges
+
+
+DURATION_BUCKET_GROUP: str = "duration_bucket"
+# Evaluator inherited by forked workers, so the manifest is not pickled
+_FORK_EVALUATOR: Optional["StreamingAsrEvaluator"] = None
+
+
+def duration_bucket(duration: Optional[float], edges: List[float]) -> str:
+    """
+    Label of the bucket `duration` falls into, e.g. with edges `[5, 10]`
+    buckets are "[0, 5)", "[5, 10)" and "[10, inf)".
+    """
+    if duration is None:
+        return "unknown"
+    lower: float = 0
+    for edge in edges:
+        if duration < edge:
+            return "[%g, %g)" % (lower, edge)
+        lower = edge
+    return "[%g, inf)" % lower
+
+
+class StreamingAsrEvaluator:
+    """
+    Evaluates an ASR results JSONL file without holding it in memory.
+    Records are aligned batch by batch and only edit counts are kept,
+    overall and for each value of each `group_by` column.
+
+    A group column is read from result record first, then from the record
+    with same `manifest_key_col` value in `manifest_path`, only group
+    columns of manifest are loaded. The special group "duration_bucket"
+    buckets `duration_col` by `duration_buckets` edges.
+    """
+    def __init__(self,
+        target_col: str,
+        output_col: str,
+        unit: str="char",
+        group_by: Optional[List[str]]=None,
+        duration_col: str="duration",
+        duration_buckets: Optional[List[float]]=None,
+        manifest_path: Optional[str]=None,
+        manifest_key_col: str="path",
+        text_normalizer: Optional[Callable[[str], str]]=None,
+        batch_size: int=1024
+    ):
+        self.target_col: str = target_col
+        self.output_col: str = output_col
+        self.unit: str = unit
+        self.group_by: List[str] = group_by if group_by is not None else []
+        self.duration_col: str = duration_col
+        self.duration_buckets: List[float] = duration_buckets \
+            if duration_buckets is not None else [5, 10, 20, 30]
+        self.manifest_path: Optional[str] = manifest_path
+        self.manifest_key_col: str = manifest_key_col
+        self.text_normalizer: Optional[Callable[[str], str]] = text_normalizer
+        self.batch_size: int = batch_size
+
+        self.manifest: Dict[Any, Dict] = {}
+        if manifest_path is not None:
+            cols: List[str] = self.group_by + [duration_col]
+            for x in jsonl_iter(manifest_path):
+                self.manifest[x[manifest_key_col]] = {
+                    k: x[k] for k in cols if k in x
+                }
+
+    def group_value(self, record: Dict, col: str) -> str:
+        if col == DURATION_BUCKET_GROUP:
+            return duration_bucket(
+                self.group_value_raw(record, self.duration_col),
+                self.duration_buckets
+            )
+        value: Any = self.group_value_raw(record, col)
+        return "unknown" if value is None else str(value)
+
+    def group_value_raw(self, record: Dict, col: str) -> Any:
+        if col in record:
+            return record[col]
+        return self.manifest.get(record.get(self.manifest_key_col), {}).get(col)
+
+    def eval_records(
+        self, records: Iterator[Dict]
+    ) -> Tuple[ErrorCounter, Dict[str, Dict[str, ErrorCounter]]]:
+        overall: ErrorCounter = ErrorCounter()
+        groups: Dict[str, Dict[str, ErrorCounter]] = {x: {} for x in self.group_by}
+        batch: List[Dict] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._eval_batch(batch, overall, groups)
+                batch = []
+        if len(batch) > 0:
+            self._eval_batch(batch, overall, groups)
+        return (overall, groups)
+
+    def _eval_batch(
+        self,
+        batch: List[Dict],
+        overall: ErrorCounter,
+        groups: Dict[str, Dict[str, ErrorCounter]]
+    ) -> None:
+        targets: List[str] = [x[self.target_col] for x in batch]
+        outputs: List[str] = [x[self.output_col] for x in batch]
+        if self.text_normalizer is not None:
+            targets = [self.text_normalizer(x) for x in targets]
+            outputs = [self.text_normalizer(x) for x in outputs]
+        target_lens, ops = edit_ops(targets, outputs, self.unit)
+        overall.update(target_lens, ops)
+
+        for col in self.group_by:
+            values: List[str] = [self.group_value(x, col) for x in batch]
+            for value in set(values):
+                ids: List[int] = [i for i, x in enumerate(values) if x == value]
+                groups[col].setdefault(value, ErrorCounter()).update(
+                    target_lens[ids], ops[ids]
+                )
+
+    def run(self, asr_results_path: str, num_proc: int=1) -> Dict:
+        """
+        Args:
+            num_proc: Processes evaluating byte ranges of `asr_results_path`
+                in parallel, compressed files are always evaluated by one.
+
+        Returns:
+            JSON serializable report.
+        """
+        global _FORK_EVALUATOR
+        compressed: bool = asr_results_path.endswith((".gz", ".zst"))
+        partials: List[Tuple[ErrorCounter, Dict[str, Dict[str, ErrorCounter]]]] = []
+        if num_proc > 1 and not compressed:
+            _FORK_EVALUATOR = self
+            ranges: List[Tuple[str, int, int]] = [
+                (asr_results_path, start, end)
+                for start, end in jsonl_byte_ranges(asr_results_path, num_proc)
+            ]
+            with mp.get_context("fork").Pool(min(num_proc, len(ranges))) as pool:
+                partials = pool.map(_eval_range, ranges)
+            _FORK_EVALUATOR = None
+        else:
+            partials = [self.eval_records(jsonl_iter(asr_results_path))]
+
+        overall: ErrorCounter = ErrorCounter()
+        groups: Dict[str, Dict[str, ErrorCounter]] = {x: {} for x in self.group_by}
+        for partial_overall, partial_groups in partials:
+            overall.merge(partial_overall)
+            for col, counters in partial_groups.items():
+                for value, counter in counters.items():
+                    groups[col].setdefault(value, ErrorCounter()).merge(counter)
+
+        return {
+            "asr_results_path": asr_results_path,
+            "unit": self.unit,
+            "overall": overall.to_dict(),
+            "groups": {
+                col: {k: counters[k].to_dict() for k in sorted(counters)}
+                for col, counters in groups.items()
+            }
+        }
+
+
+def _eval_range(
+    args: Tuple[str, int, int]
+) -> Tuple[ErrorCounter, Dict[str, Dict[str, ErrorCounter]]]:
+    return _FORK_EVALUATOR.eval_records(jsonl_iter_range(*args))
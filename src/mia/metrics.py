@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# file: metrics.py
+# date: 2026-10-18
+
+
+import numpy as np
+import multiprocessing as mp
+from numpy import ndarray
+from typing import Dict, List, Tuple, Optional, Union
+
+
+CHAR_UNIT_LANGS: set = {"zh", "chinese", "mandarin", "zh-tw", "zh-cn", "ja", "japanese"}
+
+
+def lang2unit(lang: str) -> str:
+    return "char" if lang.lower() in CHAR_UNIT_LANGS else "word"
+
+
+def texts2id_arrays(
+    texts: List[str], unit: str="char", vocab: Optional[Dict[str, int]]=None
+) -> Tuple[ndarray, ndarray]:
+    """
+    Converts texts into a right padded int array, characters are mapped to
+    their codepoints, words are mapped with `vocab` which will be extended
+    with new words.
+
+    Returns:
+        Padded ids with shape `(len(texts), max_len)` and lengths.
+    """
+    units: List[List[int]] = []
+    if unit == "char":
+        units = [[ord(c) for c in x] for x in texts]
+    elif unit == "word":
+        vocab = {} if vocab is None else vocab
+        units = [[vocab.setdefault(w, len(vocab)) for w in x.split()] for x in texts]
+    else:
+        raise Exception("Unknown unit '%s'" % unit)
+
+    lens: ndarray = np.array([len(x) for x in units], dtype=np.int64)
+    ids: ndarray = np.full((len(units), max(lens.max(initial=0), 1)), -1, dtype=np.int64)
+    for i, x in enumerate(units):
+        ids[i, :len(x)] = x
+    return (ids, lens)
+
+
+def batch_edit_ops(
+    targets: ndarray, target_lens: ndarray, outputs: ndarray, output_lens: ndarray
+) -> ndarray:
+    """
+    Levenshtein alignment of a batch, vectorized over samples and output
+    positions. The DP runs over target positions, in each row insertions
+    are resolved with a running minimum of `cost[j] - j`. Among equally
+    cheap alignments, substitution is preferred over deletion over
+    insertion.
+
+    Args:
+        targets: Padded reference ids with shape `(B, R)`.
+        outputs: Padded hypothesis ids with shape `(B, H)`.
+
+    Returns:
+        Int array with shape `(B, 3)` of substitution, deletion and
+        insertion counts.
+    """
+    batch_size: int = targets.shape[0]
+    width: int = outputs.shape[1] + 1
+    cols: ndarray = np.arange(width, dtype=np.int64)
+    rows: ndarray = np.arange(batch_size)
+
+    # Cost and S/D/I counts of aligning first `i` targets with first `j` outputs
+    cost: ndarray = np.tile(cols, (batch_size, 1))
+    subs: ndarray = np.zeros((batch_size, width), dtype=np.int64)
+    dels: ndarray = np.zeros((batch_size, width), dtype=np.int64)
+    ins: ndarray = np.tile(cols, (batch_size, 1))
+
+    results: ndarray = np.zeros((batch_size, 3), dtype=np.int64)
+    done: ndarray = target_lens == 0
+    results[done, 2] = output_lens[done]
+
+    for i in range(int(target_lens.max(initial=0))):
+        mismatch: ndarray = (outputs != targets[:, i:i + 1]).astype(np.int64)
+        sub_cost: ndarray = cost[:, :-1] + mismatch
+        del_cost: ndarray = cost[:, 1:] + 1
+        use_sub: ndarray = sub_cost <= del_cost
+
+        new_cost: ndarray = np.empty_like(cost)
+        new_subs: ndarray = np.empty_like(subs)
+        new_dels: ndarray = np.empty_like(dels)
+        new_ins: ndarray = np.empty_like(ins)
+        new_cost[:, 0] = cost[:, 0] + 1
+        new_subs[:, 0] = subs[:, 0]
+        new_dels[:, 0] = dels[:, 0] + 1
+        new_ins[:, 0] = ins[:, 0]
+        new_cost[:, 1:] = np.where(use_sub, sub_cost, del_cost)
+        new_subs[:, 1:] = np.where(use_sub, subs[:, :-1] + mismatch, subs[:, 1:])
+        new_dels[:, 1:] = np.where(use_sub, dels[:, :-1], dels[:, 1:] + 1)
+        new_ins[:, 1:] = np.where(use_sub, ins[:, :-1], ins[:, 1:])
+
+        # cost[j] = min_{k <= j} new_cost[k] + (j - k), k is tracked as the
+        # latest position reaching the running minimum
+        shifted: ndarray = new_cost - cols
+        running_min: ndarray = np.minimum.accumulate(shifted, axis=1)
+        src: ndarray = np.maximum.accumulate(
+            np.where(shifted == running_min, cols, 0), axis=1
+        )
+        cost = running_min + cols
+        subs = np.take_along_axis(new_subs, src, axis=1)
+        dels = np.take_along_axis(new_dels, src, axis=1)
+        ins = np.take_along_axis(new_ins, src, axis=1) + (cols - src)
+
+        finished: ndarray = target_lens == i + 1
+        if finished.any():
+            j: ndarray = output_lens[finished]
+            results[finished, 0] = subs[rows[finished], j]
+            results[finished, 1] = dels[rows[finished], j]
+            results[finished, 2] = ins[rows[finished], j]
+    return results
+
+
+def _batch_edit_ops_star(args: Tuple[ndarray, ndarray, ndarray, ndarray]) -> ndarray:
+    return batch_edit_ops(*args)
+
+
+def edit_ops(
+    targets: List[str], outputs: List[str], unit: str="char",
+    batch_size: int=256, num_proc: int=1
+) -> Tuple[ndarray, ndarray]:
+    """
+    Args:
+        targets: Reference texts.
+        outputs: Hypothesis texts.
+        unit: "char" or "word".
+        batch_size: Samples in each vectorized DP, samples are sorted by
+            length first so each batch has little padding.
+        num_proc: Processes running batches in parallel.
+
+    Returns:
+        Target lengths with shape `(N, )` and S/D/I counts with shape
+        `(N, 3)`, in same order as inputs.
+    """
+    if len(targets) != len(outputs):
+        raise Exception("targets and outputs have different sizes")
+    vocab: Dict[str, int] = {}
+    target_ids, target_lens = texts2id_arrays(targets, unit, vocab)
+    output_ids, output_lens = texts2id_arrays(outputs, unit, vocab)
+
+    order: ndarray = np.lexsort((output_lens, target_lens))
+    tasks: List[Tuple[ndarray, ndarray, ndarray, ndarray]] = []
+    for start in range(0, len(order), batch_size):
+        ids: ndarray = order[start:start + batch_size]
+        tasks.append((
+            target_ids[ids, :max(target_lens[ids].max(), 1)], target_lens[ids],
+            output_ids[ids, :max(output_lens[ids].max(), 1)], output_lens[ids]
+        ))
+
+    batch_results: List[ndarray] = []
+    if num_proc > 1 and len(tasks) > 1:
+        with mp.get_context("fork").Pool(num_proc) as pool:
+            batch_results = pool.map(_batch_edit_ops_star, tasks)
+    else:
+        batch_results = [batch_edit_ops(*x) for x in tasks]
+
+    ops: ndarray = np.zeros((len(targets), 3), dtype=np.int64)
+    if len(batch_results) > 0:
+        ops[order] = np.concatenate(batch_results, axis=0)
+    return (target_lens, ops)
+
+
+def error_rate(
+    targets: List[str], outputs: List[str], unit: str="char",
+    batch_size: int=256, num_proc: int=1
+) -> Dict[str, Union[float, int, List[Dict]]]:
+    """
+    Corpus level CER (unit="char") or WER (unit="word") together with
+    per-sample rows from the same alignment pass. Error rate of a sample
+    with empty target is 0 if output is also empty, otherwise inf.
+
+    Returns:
+        Dict with "error_rate", "target_units", "substitutions",
+        "deletions", "insertions" and "samples", each sample row has same
+        keys except "samples".
+    """
+    target_lens, ops = edit_ops(targets, outputs, unit, batch_size, num_proc)
+    errors: ndarray = ops.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sample_rates: ndarray = np.where(
+            target_lens > 0, errors / np.maximum(target_lens, 1),
+            np.where(errors > 0, np.inf, 0.0)
+        )
+    total_units: int = int(target_lens.sum())
+    return {
+        "error_rate": float(errors.sum() / total_units) if total_units > 0 \
+            else float(np.inf if errors.sum() > 0 else 0.0),
+        "target_units": total_units,
+        "substitutions": int(ops[:, 0].sum()),
+        "deletions": int(ops[:, 1].sum()),
+        "insertions": int(ops[:, 2].sum()),
+        "samples": [
+            {
+                "error_rate": float(sample_rates[i]),
+                "target_units": int(target_lens[i]),
+                "substitutions": int(ops[i, 0]),
+                "deletions": int(ops[i, 1]),
+                "insertions": int(ops[i, 2])
+            } for i in range(len(targets))
+        ]
+    }
+
+
+class ErrorCounter:
+    """
+    Running totals of sample number, target units and S/D/I counts, so
+    corpus error rate can be accumulated batch by batch and merged across
+    processes.
+    """
+    KEYS: Tuple[str, ...] = (
+        "samples", "target_units", "substitutions", "deletions", "insertions"
+    )
+
+    def __init__(self, counts: Optional[Dict[str, int]]=None):
+        self.counts: Dict[str, int] = dict.fromkeys(self.KEYS, 0)
+        if counts is not None:
+            self.counts.update({k: int(counts[k]) for k in self.KEYS})
+
+    def update(self, target_lens: ndarray, ops: ndarray) -> "ErrorCounter":
+        """
+        Args:
+            target_lens: Target lengths with shape `(N, )`.
+            ops: S/D/I counts with shape `(N, 3)`, like `edit_ops` outputs.
+        """
+        self.counts["samples"] += len(target_lens)
+        self.counts["target_units"] += int(target_lens.sum())
+        self.counts["substitutions"] += int(ops[:, 0].sum())
+        self.counts["deletions"] += int(ops[:, 1].sum())
+        self.counts["insertions"] += int(ops[:, 2].sum())
+        return self
+
+    def merge(self, other: "ErrorCounter") -> "ErrorCounter":
+        for k in self.KEYS:
+            self.counts[k] += other.counts[k]
+        return self
+
+    def to_dict(self) -> Dict[str, Union[float, int]]:
+        errors: int = self.counts["substitutions"] + self.counts["deletions"] \
+            + self.counts["insertions"]
+        rate: float = errors / self.counts["target_units"] \
+            if self.counts["target_units"] > 0 \
+            else (float("inf") if errors > 0 else 0.0)
+        return {"error_rate": rate, **self.counts}
+
+
+def cer(targets: List[str], outputs: List[str], num_proc: int=1) -> float:
+    return error_rate(targets, outputs, "char", num_proc=num_proc)["error_rate"]
+
+
+def wer(targets: List[str], outputs: List[str], num_proc: int=1) -> float:
+    return error_rate(targets, outputs, "word", num_proc=num_proc)["error_rate"]
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# file: __init__.py
+# date: 2026-10-18
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# file: cpu_parallel.py
+# date: 2026-10-18
+
+
+import os
+import time
+import traceback
+import torch
+import queue
+import multiprocessing as mp
+from typing import Dict, List, Tuple, Optional, Iterable, Iterator, Callable, Any
+
+from .whisper_inference import WhisperInferenceEngine
+from .quantization import quantize_whisper_dynamic
+from ..data.audio.sampler import SortedBatchSampler
+
+
+def load_whisper_for_inference(
+    model_name: str, processor_name: str, lang: str, device: str="cpu",
+    quantization: str="none"
+) -> Tuple[Any, Any]:
+    """
+    Default model factory, returns `(model, processor)` with decoder prompt
+    fixed to `lang` transcription.
+
+    Args:
+        quantization: "none" or "int8_dynamic", see `quantize_whisper_dynamic`.
+    """
+    from transformers import WhisperProcessor, WhisperForConditionalGeneration
+
+    processor: WhisperProcessor = WhisperProcessor.from_pretrained(
+        processor_name, language=lang, task="transcribe"
+    )
+    model: WhisperForConditionalGeneration = \
+        WhisperForConditionalGeneration.from_pretrained(model_name).to(device)
+    model.config.forced_decoder_ids = processor.get_decoder_prompt_ids(
+        language=lang, task="transcribe"
+    )
+    model.eval()
+    if quantization == "int8_dynamic":
+        model = quantize_whisper_dynamic(model)
+    elif quantization != "none":
+        raise Exception("Unknown quantization '%s'" % quantization)
+    return (model, processor)
+
+
+def _worker(
+    worker_id: int,
+    model_factory: Callable[[], Tuple[Any, Any]],
+    num_threads: int,
+    target_sample_rate: int,
+    generate_kwargs: Optional[Dict],
+    in_queue: mp.Queue,
+    out_queue: mp.Queue
+) -> None:
+    try:
+        torch.set_num_threads(num_threads)
+        model: Any = None
+        processor: Any = None
+        model, processor = model_factory()
+        engine: WhisperInferenceEngine = WhisperInferenceEngine(
+            model, processor, device="cpu", num_workers=0,
+            target_sample_rate=target_sample_rate,
+            generate_kwargs=generate_kwargs
+        )
+        while True:
+            task: Optional[Tuple[int, List[str]]] = in_queue.get()
+            if task is None:
+                break
+            start: float = time.perf_counter()
+            texts: List[str] = []
+            durations: List[float] = []
+            texts, durations = engine.transcribe_batch(task[1])
+            out_queue.put((
+                task[0], texts, sum(durations), time.perf_counter() - start
+            ))
+    except Exception:
+        out_queue.put((-1, worker_id, traceback.format_exc(), 0.0))
+
+
+class CpuParallelWhisperRunner:
+    """
+    Data parallel Whisper inference on CPU. Starts `num_procs` processes,
+    each loads its own model replica with `model_factory` and uses
+    `threads_per_proc` intra-op threads, batches are fed through a shared
+    queue so a fast worker takes more of them, and results are yielded in
+    submission order.
+
+    Workers are started with "spawn", so `model_factory` has to be
+    picklable, e.g. a `functools.partial` of `load_whisper_for_inference`.
+    """
+    def __init__(self,
+        model_factory: Callable[[], Tuple[Any, Any]],
+        num_procs: int=2,
+        threads_per_proc: Optional[int]=None,
+        target_sample_rate: int=16000,
+        generate_kwargs: Optional[Dict]=None,
+        max_pending_batches: Optional[int]=None
+    ):
+        """
+        Args:
+            threads_per_proc: Defaults to `os.cpu_count() // num_procs`.
+            max_pending_batches: Max batches submitted but not yielded yet,
+                bounds memory of re-ordering buffer, defaults to
+                `4 * num_procs`.
+        """
+        self.model_factory: Callable[[], Tuple[Any, Any]] = model_factory
+        self.num_procs: int = num_procs
+        self.threads_per_proc: int = threads_per_proc \
+            if threads_per_proc is not None \
+            else max((os.cpu_count() or 1) // num_procs, 1)
+        self.target_sample_rate: int = target_sample_rate
+        self.generate_kwargs: Optional[Dict] = generate_kwargs
+        self.max_pending_batches: int = max_pending_batches \
+            if max_pending_batches is not None else 4 * num_procs
+        self.report: Dict[str, float] = {}
+
+    def imap(self, batches: Iterable[List[str]]) -> Iterator[List[str]]:
+        """
+        Args:
+            batches: Batches of audio paths.
+
+        Returns:
+            Iterator of transcript batches, in the same order as `batches`.
+        """
+        ctx = mp.get_context("spawn")
+        in_queue: mp.Queue = ctx.Queue()
+        out_queue: mp.Queue = ctx.Queue()
+        procs: List[mp.Process] = [
+            ctx.Process(
+                target=_worker,
+                args=(
+                    i, self.model_factory, self.threads_per_proc,
+                    self.target_sample_rate, self.generate_kwargs,
+                    in_queue, out_queue
+                ),
+                daemon=True
+            ) for i in range(self.num_procs)
+        ]
+        for proc in procs:
+            proc.start()
+
+        start: float = time.perf_counter()
+        audio_sec: float = 0.0
+        compute_sec: float = 0.0
+        sample_num: int = 0
+        batch_iter: Iterator[List[str]] = iter(batches)
+        submitted: int = 0
+        next_seq: int = 0
+        finished: Dict[int, List[str]] = {}
+        exhausted: bool = False
+        try:
+            while True:
+                while not exhausted and submitted - next_seq < self.max_pending_batches:
+                    batch: Optional[List[str]] = next(batch_iter, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    in_queue.put((submitted, list(batch)))
+                    submitted += 1
+                if next_seq == submitted:
+                    break
+
+                try:
+                    seq, texts, batch_audio_sec, batch_compute_sec = \
+                        out_queue.get(timeout=5)
+                except queue.Empty:
+                    if any(not x.is_alive() for x in procs):
+                        raise Exception("Inference worker exited unexpectedly")
+                    continue
+                if seq < 0:
+                    raise Exception(
+                        "Inference worker %i failed:\n%s" % (texts, batch_audio_sec)
+                    )
+                finished[seq] = texts
+                audio_sec += batch_audio_sec
+                compute_sec += batch_compute_sec
+                sample_num += len(texts)
+                while next_seq in finished:
+                    yield finished.pop(next_seq)
+                    next_seq += 1
+        finally:
+            for _ in procs:
+                in_queue.put(None)
+            for proc in procs:
+                proc.join(timeout=10)
+                if proc.is_alive():
+                    proc.terminate()
+
+        wall_sec: float = time.perf_counter() - start
+        self.report = {
+            "num_procs": self.num_procs,
+            "threads_per_proc": self.threads_per_proc,
+            "samples": sample_num,
+            "audio_sec": audio_sec,
+            "wall_sec": wall_sec,
+            "compute_sec": compute_sec,
+            "rtf": wall_sec / audio_sec if audio_sec > 0 else float("nan")
+        }
+        print("CPU parallel inference report: %s" % self.report)
+
+    def transcribe(
+        self, 
+        paths: List[str], 
+        batch_size: int=8, 
+        durations: Optional[List[float]]=None
+    ) -> List[str]:
+        """
+        Args:
+            durations: When given, batches are built in duration order with 
+                `SortedBatchSampler`.
+
+        Returns:
+            Transcripts with same order as `paths`.
+        """
+        batches: List[List[int]] = [
+            list(range(i, min(i + batch_size, len(paths)))) 
+            for i in range(0, len(paths), batch_size)
+        ]
+        if durations is not None:
+            batches = list(SortedBatchSampler(durations, batch_size))
+
+        outputs: List[Optional[str]] = [None] * len(paths)
+        for i, texts in enumerate(
+            self.imap([paths[j] for j in x] for x in batches)
+        ):
+            for idx, text in zip(batches[i], texts):
+                outputs[idx] = text
+        return outputs
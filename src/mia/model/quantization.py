@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# file: quantization.py
+# date: 2026-10-18
+
+
+import gc
+import time
+import queue
+import resource
+import traceback
+import torch
+import multiprocessing as mp
+from torch import nn
+from typing import Dict, List, Tuple, Optional, Callable, Any
+
+from .whisper_inference import WhisperInferenceEngine
+from ..metrics import error_rate
+
+
+QUANTIZATION_MODES: Tuple[str, ...] = ("none", "int8_dynamic")
+
+
+def quantize_whisper_dynamic(model: Any, dtype: torch.dtype=torch.qint8) -> Any:
+    """
+    Dynamic int8 quantization of encoder and decoder `nn.Linear` layers
+    (and output projection), weights are quantized once and activations
+    on the fly, so no calibration data is needed. Only runs on CPU.
+    """
+    if next(model.parameters()).device.type != "cpu":
+        raise Exception("Dynamic quantization only supports CPU models")
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(
+        model, {nn.Linear}, dtype=dtype, inplace=True
+    )
+
+
+def rss_mb(field: str="VmRSS") -> float:
+    """
+    `VmRSS` (current) or `VmHWM` (peak) of current process in MB, falls
+    back to `ru_maxrss` when `/proc` is not available.
+    """
+    try:
+        for line in open("/proc/self/status", "r"):
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    Resets `VmHWM` to current RSS (Linux only), so the peak measured later
+    excludes e.g. fp32 weights which were freed by quantization.
+    """
+    try:
+        open("/proc/self/clear_refs", "w").write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _benchmark_worker(
+    model_factory: Callable[[], Tuple[Any, Any]],
+    quantization: str,
+    batches: List[List[str]],
+    num_threads: int,
+    target_sample_rate: int,
+    generate_kwargs: Optional[Dict],
+    out_queue: mp.Queue
+) -> None:
+    try:
+        torch.set_num_threads(num_threads)
+        model: Any = None
+        processor: Any = None
+        model, processor = model_factory()
+        if quantization == "int8_dynamic":
+            model = quantize_whisper_dynamic(model)
+        gc.collect()
+        load_peak_rss: float = rss_mb("VmHWM")
+        reset_peak_rss()
+
+        engine: WhisperInferenceEngine = WhisperInferenceEngine(
+            model, processor, device="cpu", num_workers=0,
+            target_sample_rate=target_sample_rate,
+            generate_kwargs=generate_kwargs
+        )
+        texts: List[str] = []
+        audio_sec: float = 0.0
+        start: float = time.perf_counter()
+        for batch in batches:
+            batch_texts, durations = engine.transcribe_batch(batch)
+            texts.extend(batch_texts)
+            audio_sec += sum(durations)
+        wall_sec: float = time.perf_counter() - start
+        out_queue.put({
+            "texts": texts,
+            "samples": len(texts),
+            "audio_sec": audio_sec,
+            "wall_sec": wall_sec,
+            "samples_per_sec": len(texts) / wall_sec if wall_sec > 0 else float("nan"),
+            "rtf": wall_sec / audio_sec if audio_sec > 0 else float("nan"),
+            "load_peak_rss_mb": load_peak_rss,
+            "peak_rss_mb": rss_mb("VmHWM")
+        })
+    except Exception:
+        out_queue.put({"error": traceback.format_exc()})
+
+
+def benchmark_inference(
+    model_factory: Callable[[], Tuple[Any, Any]],
+    paths: List[str],
+    quantization: str="none",
+    batch_size: int=8,
+    num_threads: int=1,
+    target_sample_rate: int=16000,
+    generate_kwargs: Optional[Dict]=None
+) -> Dict:
+    """
+    Transcribes `paths` in a fresh spawned process, so peak RSS of one
+    quantization mode is not polluted by others.
+
+    Returns:
+        Transcripts and throughput, RTF and memory stats.
+    """
+    if quantization not in QUANTIZATION_MODES:
+        raise Exception("Unknown quantization '%s'" % quantization)
+    batches: List[List[str]] = [
+        paths[i:i + batch_size] for i in range(0, len(paths), batch_size)
+    ]
+    ctx = mp.get_context("spawn")
+    out_queue: mp.Queue = ctx.Queue()
+    proc: mp.Process = ctx.Process(
+        target=_benchmark_worker,
+        args=(
+            model_factory, quantization, batches, num_threads,
+            target_sample_rate, generate_kwargs, out_queue
+        ),
+        daemon=True
+    )
+    proc.start()
+    results: Dict = {}
+    while True:
+        try:
+            results = out_queue.get(timeout=5)
+            break
+        except queue.Empty:
+            if not proc.is_alive():
+                raise Exception("Benchmarking '%s' process exited unexpectedly" % quantization)
+    proc.join()
+    if "error" in results:
+        raise Exception(
+            "Benchmarking '%s' failed:\n%s" % (quantization, results["error"])
+        )
+    results["quantization"] = quantization
+    return results
+
+
+def compare_quantization(
+    model_factory: Callable[[], Tuple[Any, Any]],
+    paths: List[str],
+    targets: Optional[List[str]]=None,
+    unit: str="char",
+    batch_size: int=8,
+    num_threads: int=1,
+    target_sample_rate: int=16000,
+    generate_kwargs: Optional[Dict]=None
+) -> Dict:
+    """
+    Runs fp32 and int8 dynamic quantized inference on same `paths` and
+    reports both modes' stats, speed-up, memory saving and error rate of
+    int8 outputs against fp32 outputs. With `targets`, each mode's error
+    rate and the delta of int8 against fp32 are included as well.
+    """
+    report: Dict = {"modes": {}}
+    outputs: Dict[str, List[str]] = {}
+    for mode in QUANTIZATION_MODES:
+        results: Dict = benchmark_inference(
+            model_factory, paths, mode, batch_size, num_threads,
+            target_sample_rate, generate_kwargs
+        )
+        outputs[mode] = results.pop("texts")
+        if targets is not None:
+            results["error_rate"] = error_rate(targets, outputs[mode], unit)["error_rate"]
+        report["modes"][mode] = results
+
+    fp32: Dict = report["modes"]["none"]
+    int8: Dict = report["modes"]["int8_dynamic"]
+    report["speedup"] = fp32["wall_sec"] / int8["wall_sec"] \
+        if int8["wall_sec"] > 0 else float("nan")
+    report["peak_rss_saving_mb"] = fp32["peak_rss_mb"] - int8["peak_rss_mb"]
+    report["unit"] = unit
+    if targets is not None:
+        report["error_rate_delta"] = int8["error_rate"] - fp32["error_rate"]
+    report["error_rate_vs_fp32"] = error_rate(
+        outputs["none"], outputs["int8_dynamic"], unit
+    )["error_rate"]
+    return report
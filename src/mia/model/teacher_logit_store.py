@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+# file: teacher_logit_store.py
+# date: 2026-10-18
+
+
+import os
+import json
+import hashlib
+import torch
+import numpy as np
+from tqdm import tqdm
+from torch import nn
+from torch import Tensor
+from torch.utils.data import DataLoader
+from typing import Dict, List, Optional, Tuple, Any
+
+from ..data.array_store import ArrayStore
+from ..utils import jsonl_iter
+from ..utils import jsonl_repair_tail
+from ..utils import JsonlWriter
+
+
+def teacher_logit_key(path: str, label_ids: List[int]) -> str:
+    """
+    Teacher outputs only depend on the audio and the (teacher forcing)
+    label token ids, so both are part of the key.
+    """
+    return hashlib.sha1(
+        ("%s\t%s" % (
+            os.path.abspath(path), ",".join(str(x) for x in label_ids)
+        )).encode("utf-8")
+    ).hexdigest()
+
+
+def file_fingerprint(path: str, chunk_size: int=2 ** 20) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def checkpoint_fingerprint(checkpoint_dir: str) -> str:
+    """
+    Hash of contents of weight and config files of a local checkpoint, so 
+    it doesn't change when the checkpoint is copied, and changes when it's 
+    overwritten in place even with same size and mtime.
+    """
+    sha1 = hashlib.sha1()
+    for name in sorted(os.listdir(checkpoint_dir)):
+        if name.endswith((".safetensors", ".bin", ".json")):
+            sha1.update(
+                ("%s\t%s\n" % (
+                    name, file_fingerprint(os.path.join(checkpoint_dir, name))
+                )).encode("utf-8")
+            )
+    return sha1.hexdigest()
+
+
+def teacher_fingerprint(model: Any) -> str:
+    """
+    `<name>@<version>`, version is hub commit hash of teacher checkpoint, 
+    or `checkpoint_fingerprint` for local checkpoints which have no commit 
+    hash. The latter reads all weight files, so compute it once and share 
+    it between stores.
+    """
+    config: Any = model.config
+    name: str = getattr(config, "_name_or_path", "")
+    version: Optional[str] = getattr(config, "_commit_hash", None)
+    if version is None and os.path.isdir(name):
+        version = checkpoint_fingerprint(name)
+    return "%s@%s" % (name, version)
+
+
+class TeacherLogitStore:
+    """
+    Memory-mapped store of teacher's top-k logits of each label position,
+    values are kept in fp16 and vocabulary indices in int32, both with
+    shape `(num_label_tokens, top_k)` per sample.
+
+    Layout of `store_dir`:
+        * `values/`, `indices/`: `ArrayStore` of values and indices.
+        * `teacher.json`: `top_k` and teacher's fingerprint, the store
+          refuses to be re-opened for another teacher or `top_k`.
+    """
+    def __init__(self,
+        store_dir: str, top_k: int=32, teacher: str="",
+        max_shard_bytes: int=2 ** 30
+    ):
+        self.store_dir: str = store_dir
+        self.top_k: int = top_k
+        self.teacher: str = teacher
+        self.meta_path: str = os.path.join(store_dir, "teacher.json")
+
+        os.makedirs(store_dir, exist_ok=True)
+        meta: Dict = {"top_k": top_k, "teacher": teacher}
+        if os.path.exists(self.meta_path):
+            stored_meta: Dict = json.loads(open(self.meta_path, "r").read())
+            if stored_meta != meta:
+                raise Exception(
+                    "Teacher logit store '%s' was built with %s, not %s"
+                    % (store_dir, stored_meta, meta)
+                )
+        else:
+            open(self.meta_path, "w").write(json.dumps(meta))
+
+        self.values: ArrayStore = ArrayStore(
+            os.path.join(store_dir, "values"), "float16", max_shard_bytes
+        )
+        self.indices: ArrayStore = ArrayStore(
+            os.path.join(store_dir, "indices"), "int32", max_shard_bytes
+        )
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.indices
+
+    def get(self, path: str, label_ids: List[int]) -> Optional[Tuple[Tensor, Tensor]]:
+        """
+        Returns:
+            Top-k values and indices with shape `(len(label_ids), top_k)`.
+        """
+        key: str = teacher_logit_key(path, label_ids)
+        indices: Optional[Tensor] = self.indices.get_array(key)
+        if indices is None:
+            return None
+        return (self.values.get_array(key), indices)
+
+    def put(self, path: str, label_ids: List[int], logits: Tensor) -> None:
+        """
+        Args:
+            logits: Teacher logits of valid label positions with shape
+                `(len(label_ids), vocab_size)`.
+        """
+        key: str = teacher_logit_key(path, label_ids)
+        topk = logits.float().topk(self.top_k, dim=-1)
+        # Values first, so a record is only visible once both are written
+        self.values.put_array(key, path, topk.values.half())
+        self.indices.put_array(key, path, topk.indices.int())
+
+    def flush(self) -> None:
+        self.values.flush()
+        self.indices.flush()
+
+    def close(self) -> None:
+        self.values.close()
+        self.indices.close()
+
+
+def batch_teacher_topk(
+    store: TeacherLogitStore, paths: List[str], labels: Tensor
+) -> Optional[Tuple[Tensor, Tensor]]:
+    """
+    Collects stored top-k of a collated batch, `labels` is padded with
+    -100. Returns `None` when any sample is not in `store`.
+
+    Returns:
+        Values and indices with shape `(batch_size, max_label_len, top_k)`,
+        padded positions have value 0 and index 0.
+    """
+    values: Tensor = torch.zeros(
+        labels.shape[0], labels.shape[1], store.top_k, dtype=torch.float16
+    )
+    indices: Tensor = torch.zeros(
+        labels.shape[0], labels.shape[1], store.top_k, dtype=torch.int32
+    )
+    for i, path in enumerate(paths):
+        label_ids: List[int] = labels[i][labels[i] >= 0].tolist()
+        cached: Optional[Tuple[Tensor, Tensor]] = store.get(path, label_ids)
+        if cached is None:
+            return None
+        values[i, :len(label_ids)] = cached[0]
+        indices[i, :len(label_ids)] = cached[1]
+    return (values, indices)
+
+
+def sparse_kl_divergence(
+    teacher_topk_values: Tensor, teacher_topk_indices: Tensor,
+    predicted_log_dist: Tensor, labels: Tensor, temperature: float=2.0,
+    renormalize_student: bool=False
+) -> Tensor:
+    """
+    KL divergence between teacher distribution re-normalized over its top-k
+    tokens and the student distribution, averaged over label positions
+    like `kl_divergence` in `run_distillation.py`. Student mass outside 
+    top-k is penalized, and with `top_k == vocab_size` it's same as the 
+    dense KL divergence.
+
+    Args:
+        teacher_topk_values: Teacher logits with shape `(B, L, top_k)`.
+        teacher_topk_indices: Vocabulary indices with shape `(B, L, top_k)`.
+        predicted_log_dist: Student log-softmax (with `temperature`) with
+            shape `(B, L, vocab_size)`.
+        renormalize_student: Re-normalizing student over same top-k tokens 
+            too, see `topk_kl_divergence`.
+    """
+    teacher_log_dist: Tensor = nn.functional.log_softmax(
+        teacher_topk_values.to(predicted_log_dist.device).float() / temperature,
+        dim=-1
+    )
+    student_log_dist: Tensor = predicted_log_dist.gather(
+        -1, teacher_topk_indices.to(predicted_log_dist.device).long()
+    )
+    if renormalize_student:
+        student_log_dist = student_log_dist - student_log_dist.logsumexp(dim=-1, keepdim=True)
+    divergence: Tensor = (
+        teacher_log_dist.exp() * (teacher_log_dist - student_log_dist)
+    ).sum(dim=-1)
+    padding_mask: Tensor = labels >= 0
+    return (divergence * padding_mask).sum() / padding_mask.sum()
+
+
+def topk_kl_divergence(
+    teacher_topk_values: Tensor, teacher_topk_indices: Tensor,
+    predicted_log_dist: Tensor, labels: Tensor, temperature: float=2.0
+) -> Tensor:
+    """
+    `sparse_kl_divergence` with both distributions re-normalized over 
+    teacher's top-k tokens, it's 0 when student agrees with teacher on 
+    them. Only meant as an evaluation metric on cached teacher outputs, 
+    since it ignores student mass outside top-k it's not a training loss.
+    """
+    return sparse_kl_divergence(
+        teacher_topk_values, teacher_topk_indices, predicted_log_dist, labels, 
+        temperature, renormalize_student=True
+    )
+
+
+class TeacherEvalCache:
+    """
+    Frozen teacher's evaluation outputs of one dev set, i.e. top-k logits 
+    used by KL divergence and `generate` transcripts, so evaluations after 
+    the first one only need to run the student.
+
+    Outputs are kept under `cache_dir/<key>`, where key is a hash of 
+    teacher fingerprint, dev manifest content and `top_k`.
+    """
+    def __init__(self, 
+        cache_dir: str, teacher: str, manifest_path: str, top_k: int=32
+    ):
+        self.key: str = hashlib.sha1(
+            ("%s\t%s\t%i" % (
+                teacher, file_fingerprint(manifest_path), top_k
+            )).encode("utf-8")
+        ).hexdigest()
+        self.cache_dir: str = os.path.join(cache_dir, self.key)
+        self.logits: TeacherLogitStore = TeacherLogitStore(
+            os.path.join(self.cache_dir, "logits"), top_k, teacher
+        )
+        self.texts_path: str = os.path.join(self.cache_dir, "texts.jsonl")
+        self.texts: Dict[str, str] = {}
+        if os.path.exists(self.texts_path):
+            jsonl_repair_tail(self.texts_path)
+            self.texts = {x["key"]: x["text"] for x in jsonl_iter(self.texts_path)}
+        self._texts_writer: Optional[JsonlWriter] = None
+
+    def get(
+        self, paths: List[str], labels: Tensor
+    ) -> Optional[Tuple[Tensor, Tensor, List[str]]]:
+        """
+        Returns:
+            Batch top-k values and indices like `batch_teacher_topk`, and 
+            transcripts. `None` if any sample is not cached.
+        """
+        keys: List[str] = [
+            teacher_logit_key(path, labels[i][labels[i] >= 0].tolist())
+            for i, path in enumerate(paths)
+        ]
+        if any(x not in self.texts for x in keys):
+            return None
+        topk: Optional[Tuple[Tensor, Tensor]] = \
+            batch_teacher_topk(self.logits, paths, labels)
+        if topk is None:
+            return None
+        return (topk[0], topk[1], [self.texts[x] for x in keys])
+
+    def put(
+        self, paths: List[str], labels: Tensor, logits: Tensor, texts: List[str]
+    ) -> None:
+        """
+        Args:
+            logits: Teacher logits of the batch with shape 
+                `(batch_size, max_label_len, vocab_size)`.
+        """
+        if self._texts_writer is None:
+            self._texts_writer = JsonlWriter(self.texts_path, "a")
+        for i, path in enumerate(paths):
+            valid: Tensor = labels[i] >= 0
+            label_ids: List[int] = labels[i][valid].tolist()
+            self.logits.put(path, label_ids, logits[i][valid])
+            key: str = teacher_logit_key(path, label_ids)
+            if key not in self.texts:
+                self.texts[key] = texts[i]
+                self._texts_writer.write({"key": key, "text": texts[i]})
+        self.logits.flush()
+        self._texts_writer.flush()
+
+
+class KeepPathsCollator:
+    def __init__(self, collator: Any, path_col: str="path"):
+        self.collator: Any = collator
+        self.path_col: str = path_col
+
+    def __call__(self, samples: List[Dict]) -> Tuple[List[str], Dict[str, Tensor]]:
+        return ([x[self.path_col] for x in samples], self.collator(samples))
+
+
+def teacher_logit_store_build(
+    store: TeacherLogitStore,
+    samples: Any,
+    collator: Any,
+    teacher_model: Any,
+    device: str="cpu",
+    path_col: str="path",
+    batch_size: int=16,
+    num_workers: int=4
+) -> TeacherLogitStore:
+    """
+    Runs teacher forward pass once over `samples` and keeps top-k logits of
+    each label position. Batches whose samples are all in `store` are
+    skipped by the teacher, so an interrupted building can be resumed.
+
+    Args:
+        collator: Should be same as training's one but without SpecAugment,
+            so stored label ids match the training batches.
+    """
+    dataloader: DataLoader = DataLoader(
+        samples, batch_size=batch_size, num_workers=num_workers,
+        collate_fn=KeepPathsCollator(collator, path_col)
+    )
+    teacher_model.eval()
+    for paths, batch in tqdm(dataloader):
+        labels: Tensor = batch["labels"]
+        if batch_teacher_topk(store, paths, labels) is not None:
+            continue
+        with torch.no_grad():
+            logits: Tensor = teacher_model(
+                input_features=batch["input_features"].to(device),
+                labels=labels.to(device)
+            )["logits"].cpu()
+        for i, path in enumerate(paths):
+            valid: Tensor = labels[i] >= 0
+            store.put(path, labels[i][valid].tolist(), logits[i][valid])
+    store.flush()
+    return store
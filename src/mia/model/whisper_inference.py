@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# file: whisper_inference.py
+# date: 2026-10-18
+
+
+import torch
+import numpy as np
+from tqdm import tqdm
+from torch import Tensor
+from torch.utils.data import Dataset, DataLoader
+from typing import Dict, List, Optional, Tuple, Set, Any
+
+from ..data.audio.functions import audio_file2waveform
+from ..data.audio.functions import audio_batch2model_inputs
+from ..data.audio.functions.io import audio_probe
+from ..data.audio.functions.io import AUDIO_META_CACHE_PATH
+from ..data.audio.sampler import SortedBatchSampler
+
+
+WHISPER_WINDOW_SEC: float = 30.0
+
+
+def audio_windows(
+    num_samples: int, sample_rate: int=16000,
+    window_sec: float=WHISPER_WINDOW_SEC, overlap_sec: float=5.0
+) -> List[Tuple[int, int]]:
+    """
+    Splits audio into windows of `window_sec` where consecutive windows
+    overlap by `overlap_sec`, the last window is aligned to audio's end.
+
+    Returns:
+        `(start, end)` sample positions of each window.
+    """
+    window: int = int(window_sec * sample_rate)
+    stride: int = window - int(overlap_sec * sample_rate)
+    if stride <= 0:
+        raise Exception("overlap_sec should be smaller than window_sec")
+    if num_samples <= window:
+        return [(0, num_samples)]
+    starts: List[int] = list(range(0, num_samples - window, stride))
+    starts.append(num_samples - window)
+    return [(x, x + window) for x in starts]
+
+
+def stitch_token_ids(
+    left: List[int], right: List[int], min_matches: int=2
+) -> List[int]:
+    """
+    Merges token ids of two overlapping windows. The overlap is the
+    suffix/prefix alignment of `left` and `right` with most matching
+    tokens (longer one wins ties), and the sequences are cut in the middle
+    of it, since tokens near window edges are the least reliable. Simply
+    concatenates when no alignment has `min_matches` matching tokens.
+    """
+    left_ids: np.ndarray = np.array(left, dtype=np.int64)
+    right_ids: np.ndarray = np.array(right, dtype=np.int64)
+    best_score: float = 0.0
+    best_len: int = 0
+    for i in range(1, min(len(left), len(right)) + 1):
+        matches: int = int((left_ids[len(left) - i:] == right_ids[:i]).sum())
+        score: float = matches / i + i / 10000.0
+        if matches >= min_matches and score > best_score:
+            best_score = score
+            best_len = i
+    if best_len == 0:
+        return left + right
+    cut: int = best_len // 2
+    return left[:len(left) - best_len + cut] + right[cut:]
+
+
+class _AudioWindowDataset(Dataset):
+    """
+    Each item is all windows of one audio file, featurized in workers.
+    """
+    def __init__(self,
+        paths: List[str], fea_extractor: Any, target_sample_rate: int=16000,
+        window_sec: float=WHISPER_WINDOW_SEC, overlap_sec: float=5.0
+    ):
+        self.paths: List[str] = paths
+        self.fea_extractor: Any = fea_extractor
+        self.target_sample_rate: int = target_sample_rate
+        self.window_sec: float = window_sec
+        self.overlap_sec: float = overlap_sec
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, idx: int) -> Tuple[int, Tensor]:
+        waveform: Tensor = audio_file2waveform(
+            self.paths[idx], self.target_sample_rate
+        )
+        waveform = waveform.reshape(-1, waveform.shape[-1]).mean(dim=0)
+        windows: List[Tuple[int, int]] = audio_windows(
+            waveform.shape[-1], self.target_sample_rate,
+            self.window_sec, self.overlap_sec
+        )
+        inputs: Tensor = None
+        inputs, _ = audio_batch2model_inputs(
+            [waveform[start:end] for start, end in windows],
+            self.fea_extractor, self.target_sample_rate
+        )
+        return (idx, inputs)
+
+
+class _AudioFileDataset(Dataset):
+    def __init__(self, paths: List[str], target_sample_rate: int=16000):
+        self.paths: List[str] = paths
+        self.target_sample_rate: int = target_sample_rate
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, idx: int) -> Tuple[int, Tensor]:
+        waveform: Tensor = audio_file2waveform(
+            self.paths[idx], self.target_sample_rate
+        )
+        return (idx, waveform.reshape(-1))
+
+
+class _BatchFeaturizer:
+    def __init__(self, fea_extractor: Any, target_sample_rate: int=16000):
+        self.fea_extractor: Any = fea_extractor
+        self.target_sample_rate: int = target_sample_rate
+
+    def __call__(self, samples: List[Tuple[int, Tensor]]) -> Tuple[List[int], Tensor]:
+        inputs: Tensor = None
+        inputs, _ = audio_batch2model_inputs(
+            [x[1] for x in samples], self.fea_extractor, self.target_sample_rate
+        )
+        return ([x[0] for x in samples], inputs)
+
+
+class WhisperInferenceEngine:
+    """
+    Batched Whisper transcription. Audio decoding, resampling and log-mel
+    featurization run in DataLoader workers and are prefetched while the
+    model is generating, samples are batched in duration order so one
+    batch finishes decoding together, and outputs are returned in the
+    original order.
+    """
+    def __init__(self,
+        model: Any,
+        processor: Any,
+        device: str="cpu",
+        batch_size: int=8,
+        num_workers: int=2,
+        prefetch_factor: int=2,
+        target_sample_rate: int=16000,
+        generate_kwargs: Optional[Dict]=None,
+        meta_cache_path: Optional[str]=AUDIO_META_CACHE_PATH
+    ):
+        """
+        Args:
+            model: `WhisperForConditionalGeneration` already on `device`.
+            processor: `WhisperProcessor`, or anything has `feature_extractor`
+                and `tokenizer`.
+            generate_kwargs: Extra arguments of `model.generate`.
+            meta_cache_path: Audio metadata cache used to get durations
+                for sorting.
+        """
+        self.model: Any = model
+        self.processor: Any = processor
+        self.device: torch.device = torch.device(device)
+        self.batch_size: int = batch_size
+        self.num_workers: int = num_workers
+        self.prefetch_factor: int = prefetch_factor
+        self.target_sample_rate: int = target_sample_rate
+        self.generate_kwargs: Dict = {} if generate_kwargs is None else generate_kwargs
+        self.meta_cache_path: Optional[str] = meta_cache_path
+
+    def get_dataloader(
+        self, paths: List[str], durations: Optional[List[float]]=None
+    ) -> DataLoader:
+        if durations is None:
+            durations = [
+                audio_probe(x, cache_path=self.meta_cache_path)["duration_sec"]
+                for x in paths
+            ]
+        long_num: int = sum(1 for x in durations if x > WHISPER_WINDOW_SEC)
+        if long_num > 0:
+            print(
+                "Warning: %i audios are longer than %is and will be truncated, "
+                "use `transcribe_long_form` for them" % (long_num, WHISPER_WINDOW_SEC)
+            )
+        return DataLoader(
+            _AudioFileDataset(paths, self.target_sample_rate),
+            batch_sampler=SortedBatchSampler(durations, self.batch_size),
+            collate_fn=_BatchFeaturizer(
+                self.processor.feature_extractor, self.target_sample_rate
+            ),
+            num_workers=self.num_workers,
+            prefetch_factor=self.prefetch_factor if self.num_workers > 0 else None,
+            pin_memory=(self.device.type == "cuda")
+        )
+
+    def generate(self, inputs: Tensor) -> Tensor:
+        inputs = inputs.to(
+            self.device, getattr(self.model, "dtype", torch.float32),
+            non_blocking=True
+        )
+        with torch.inference_mode():
+            return self.model.generate(inputs, **self.generate_kwargs).to("cpu")
+
+    def transcribe_batch(self, paths: List[str]) -> Tuple[List[str], List[float]]:
+        """
+        Featurizes and transcribes one batch in current process.
+
+        Returns:
+            Transcripts and audio durations in seconds.
+        """
+        inputs: Tensor = None
+        durations: List[float] = []
+        inputs, durations = audio_batch2model_inputs(
+            paths, self.processor.feature_extractor, self.target_sample_rate
+        )
+        texts: List[str] = self.processor.tokenizer.batch_decode(
+            self.generate(inputs), skip_special_tokens=True
+        )
+        return (texts, durations)
+
+    def transcribe(
+        self,
+        paths: List[str],
+        durations: Optional[List[float]]=None,
+        progress: bool=True
+    ) -> List[str]:
+        """
+        Args:
+            paths: Audio file paths.
+            durations: Durations of `paths` in seconds, probed from audio
+                files if it's `None`.
+
+        Returns:
+            Transcripts with same order as `paths`.
+        """
+        outputs: List[Optional[str]] = [None] * len(paths)
+        dataloader: DataLoader = self.get_dataloader(paths, durations)
+        for ids, inputs in tqdm(dataloader, disable=(not progress)):
+            texts: List[str] = self.processor.tokenizer.batch_decode(
+                self.generate(inputs), skip_special_tokens=True
+            )
+            for idx, text in zip(ids, texts):
+                outputs[idx] = text
+        return outputs
+
+    def transcribe_long_form(
+        self,
+        paths: List[str],
+        window_sec: float=WHISPER_WINDOW_SEC,
+        overlap_sec: float=5.0,
+        progress: bool=True
+    ) -> List[str]:
+        """
+        Transcribes audios of any length. Each audio is split into
+        overlapping windows with `audio_windows`, windows of many audios
+        are batched into same `generate` call, and each audio's window
+        outputs are merged with `stitch_token_ids` once all of them are
+        decoded.
+
+        Returns:
+            Transcripts with same order as `paths`.
+        """
+        special_ids: Set[int] = set(
+            getattr(self.processor.tokenizer, "all_special_ids", [])
+        )
+        dataloader: DataLoader = DataLoader(
+            _AudioWindowDataset(
+                paths, self.processor.feature_extractor,
+                self.target_sample_rate, window_sec, overlap_sec
+            ),
+            batch_size=None,
+            num_workers=self.num_workers,
+            prefetch_factor=self.prefetch_factor if self.num_workers > 0 else None
+        )
+
+        outputs: List[Optional[str]] = [None] * len(paths)
+        # Decoded token ids of each window of audios in progress
+        window_ids: Dict[int, List[Optional[List[int]]]] = {}
+        pending: List[Tuple[int, int, Tensor]] = []
+
+        def run_pending() -> None:
+            generated: Tensor = self.generate(torch.stack([x[2] for x in pending]))
+            for (idx, window_idx, _), ids in zip(pending, generated.tolist()):
+                window_ids[idx][window_idx] = [x for x in ids if x not in special_ids]
+                if all(x is not None for x in window_ids[idx]):
+                    merged: List[int] = window_ids[idx][0]
+                    for x in window_ids.pop(idx)[1:]:
+                        merged = stitch_token_ids(merged, x)
+                    outputs[idx] = self.processor.tokenizer.batch_decode(
+                        torch.tensor([merged], dtype=torch.long),
+                        skip_special_tokens=True
+                    )[0]
+            pending.clear()
+
+        for idx, inputs in tqdm(dataloader, disable=(not progress)):
+            window_ids[idx] = [None] * inputs.shape[0]
+            for i in range(inputs.shape[0]):
+                pending.append((idx, i, inputs[i]))
+                if len(pending) >= self.batch_size:
+                    run_pending()
+        if len(pending) > 0:
+            run_pending()
+        return outputs
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# file: text_norm.py
+# date: 2026-10-18
+#
+# Process-wide text normalization service. Constructing `OpenCC` loads its
+# dictionaries from disk, so converters are created once per (process,
+# config) and conversion results of repeated transcripts are memoized.
+
+
+import os
+from functools import lru_cache
+from opencc import OpenCC
+from typing import Dict, List, Tuple, Iterable
+
+
+CONVERT_CACHE_SIZE: int = 2 ** 18
+_CONVERTERS: Dict[Tuple[int, str], OpenCC] = {}
+
+
+def get_converter(config: str="tw2s.json") -> OpenCC:
+    """
+    Converters are keyed by pid as well, so forked dataset workers will 
+    build their own one instead of sharing parent's native handle.
+    """
+    key: Tuple[int, str] = (os.getpid(), config)
+    if key not in _CONVERTERS:
+        _CONVERTERS[key] = OpenCC(config)
+    return _CONVERTERS[key]
+
+
+@lru_cache(maxsize=CONVERT_CACHE_SIZE)
+def convert(text: str, config: str="tw2s.json") -> str:
+    return get_converter(config).convert(text)
+
+
+def convert_many(texts: Iterable[str], config: str="tw2s.json") -> List[str]:
+    return [convert(x, config) for x in texts]
@@ -4,73 +4,580 @@
 
 
 import os
+import io
+import sys
 import json
 import re
+import gzip
+import array
+import heapq
+import shutil
+import threading
+import subprocess
 import librosa
+import torch
+import numpy as np
 import soundfile as sf
 from tqdm import tqdm
 from numpy import ndarray
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Tuple, Optional, Iterable, Iterator, Union, IO, Callable, Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 from .struct import SubtitleChunk, SubtitleChunks
 from .struct import AudioMetadata
 
 
+AUDIO_FORMAT_SUBTYPES: Dict[str, str] = {
+    "flac": "PCM_16", "wav": "PCM_16", "ogg": "VORBIS", "mp3": "MPEG_LAYER_III"
+}
+
+
+def audio_ffprobe(audio_path: str) -> Tuple[int, int]:
+    """
+    Returns:
+        Sample rate and channels of first audio stream probed by `ffprobe`.
+    """
+    proc: subprocess.CompletedProcess = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "a:0",
+            "-show_entries", "stream=sample_rate,channels", "-of", "json",
+            audio_path
+        ],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    streams: List[Dict] = json.loads(proc.stdout or b"{}").get("streams", []) \
+        if proc.returncode == 0 else []
+    if len(streams) == 0:
+        raise Exception("Failed to probe audio stream of '%s': %s" % (
+            audio_path, proc.stderr.decode("utf-8", "replace").strip()
+        ))
+    return (int(streams[0]["sample_rate"]), int(streams[0]["channels"]))
+
+
+def audio_segments_iter(
+    audio_path: str, spans: List[Tuple[float, float]],
+    block_frames: int=2 ** 18,
+    out_sample_rate: Optional[int]=None, out_channels: Optional[int]=None
+) -> Iterator[Tuple[int, ndarray, int]]:
+    """
+    Yields audio segments of `spans` (in seconds) in start time order,
+    without loading the whole audio. Formats readable by libsndfile (wav,
+    flac, ogg, mp3, ...) are read by seeking to each segment, others are
+    decoded once by an `ffmpeg` pipe into float32 and cut on the fly.
+
+    Args:
+        out_sample_rate: Sample rate `ffmpeg` decodes into, source one 
+            (probed by `ffprobe`) is kept when it's `None`. Segments read 
+            without `ffmpeg` always keep source sample rate.
+        out_channels: Same as `out_sample_rate` for channels.
+
+    Returns:
+        Iterator of span index, segment with shape `(frames, channels)`
+        and its sample rate.
+    """
+    order: List[int] = sorted(range(len(spans)), key=lambda i: spans[i][0])
+    file: Optional[sf.SoundFile] = None
+    try:
+        file = sf.SoundFile(audio_path)
+    except RuntimeError:
+        file = None
+
+    if file is not None:
+        with file:
+            sample_rate: int = file.samplerate
+            for i in order:
+                start: int = min(int(round(spans[i][0] * sample_rate)), file.frames)
+                end: int = min(int(round(spans[i][1] * sample_rate)), file.frames)
+                file.seek(start)
+                yield (
+                    i, file.read(max(end - start, 0), dtype="float32", always_2d=True),
+                    sample_rate
+                )
+        return
+
+    if shutil.which("ffmpeg") is None or (
+        (out_sample_rate is None or out_channels is None) 
+        and shutil.which("ffprobe") is None
+    ):
+        print("Warning: no ffmpeg to stream '%s', loading it at once" % audio_path)
+        audio, sample_rate = librosa.load(audio_path, sr=None, mono=False)
+        audio = audio.reshape(-1, audio.shape[-1]).T
+        for i in order:
+            yield (
+                i, 
+                audio[int(round(spans[i][0] * sample_rate)):int(round(spans[i][1] * sample_rate))],
+                sample_rate
+            )
+        return
+
+    sample_rate = out_sample_rate
+    channels: Optional[int] = out_channels
+    if sample_rate is None or channels is None:
+        src_sample_rate, src_channels = audio_ffprobe(audio_path)
+        sample_rate = sample_rate if sample_rate is not None else src_sample_rate
+        channels = channels if channels is not None else src_channels
+    # Always passed, so the stream layout never depends on ffmpeg defaults
+    proc: subprocess.Popen = subprocess.Popen(
+        [
+            "ffmpeg", "-v", "error", "-i", audio_path,
+            "-f", "f32le", "-ac", str(channels), "-ar", str(sample_rate), "-"
+        ],
+        stdout=subprocess.PIPE
+    )
+    frame_bytes: int = 4 * channels
+    buffer: ndarray = np.zeros((0, channels), dtype=np.float32)
+    buffer_start: int = 0
+    eof: bool = False
+    try:
+        for n, i in enumerate(order):
+            start = int(round(spans[i][0] * sample_rate))
+            end = int(round(spans[i][1] * sample_rate))
+            while not eof and buffer_start + len(buffer) < end:
+                block: bytes = proc.stdout.read(block_frames * frame_bytes)
+                eof = len(block) < block_frames * frame_bytes
+                buffer = np.concatenate([
+                    buffer, 
+                    np.frombuffer(
+                        block[:len(block) // frame_bytes * frame_bytes], dtype=np.float32
+                    ).reshape(-1, channels)
+                ])
+            yield (
+                i, 
+                buffer[max(start - buffer_start, 0):max(end - buffer_start, 0)].copy(), 
+                sample_rate
+            )
+            # Frames before next segment's start are never needed again
+            if n + 1 < len(order):
+                drop: int = int(round(spans[order[n + 1]][0] * sample_rate)) - buffer_start
+                if drop > 0:
+                    buffer = buffer[drop:]
+                    buffer_start += drop
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def audio_segment_encode(
+    file: Union[str, IO], fmt: str, segment: ndarray, sample_rate: int,
+    out_sample_rate: Optional[int]=None, out_channels: Optional[int]=1,
+    subtype: Optional[str]=None
+) -> None:
+    """
+    Encodes audio into a path or a binary file-like object in format `fmt`
+    like "flac".
+
+    Args:
+        segment: Audio with shape `(frames, channels)`.
+        out_sample_rate: Keeps `sample_rate` when it's `None`.
+        out_channels: 1 for mono (down-mixing by averaging), 2 for stereo,
+            keeps source channels when it's `None`.
+        subtype: libsndfile subtype like "PCM_24", defaults to the one in
+            `AUDIO_FORMAT_SUBTYPES` of `fmt`.
+    """
+    if out_channels is not None and segment.shape[1] != out_channels:
+        segment = segment.mean(axis=1, keepdims=True) if out_channels == 1 \
+            else np.tile(segment.mean(axis=1, keepdims=True), (1, out_channels))
+    if out_sample_rate is not None and out_sample_rate != sample_rate \
+            and len(segment) > 0:
+        from .data.audio.functions.resampler import waveform_resample
+
+        segment = waveform_resample(
+            torch.from_numpy(np.ascontiguousarray(segment.T)), sample_rate,
+            out_sample_rate, mono=False
+        ).numpy().T
+        sample_rate = out_sample_rate
+    fmt = fmt.lower()
+    sf.write(
+        file, segment, sample_rate, 
+        subtype=subtype if subtype is not None else AUDIO_FORMAT_SUBTYPES.get(fmt, None), 
+        format=fmt.upper()
+    )
+
+
+def audio_segment_write(
+    path: str, segment: ndarray, sample_rate: int,
+    out_sample_rate: Optional[int]=None, out_channels: Optional[int]=1,
+    subtype: Optional[str]=None
+) -> str:
+    """
+    `audio_segment_encode` into `path`, format is decided by its extension.
+    """
+    # Written under a temporary name, so an interrupted run never leaves a
+    # truncated chunk which would be skipped as existing next time
+    audio_segment_encode(
+        path + ".tmp", path.split(".")[-1], segment, sample_rate,
+        out_sample_rate, out_channels, subtype
+    )
+    os.replace(path + ".tmp", path)
+    return path
+
+
 def chunk_audio_with_subtitle_chunks(
-    output_dir: str, audio_path: str, subtitle_chunks: SubtitleChunks
+    output_dir: str, 
+    audio_path: str, 
+    subtitle_chunks: SubtitleChunks,
+    out_format: Optional[str]=None,
+    out_sample_rate: Optional[int]=None,
+    out_channels: Optional[int]=1,
+    num_writers: int=4,
+    max_pending: Optional[int]=None
 ) -> List[AudioMetadata]:
+    """
+    Cuts `audio_path` into one file per subtitle chunk. Segments are read
+    with `audio_segments_iter`, and encoded and written by a pool of
+    `num_writers` threads, at most `max_pending` (default `2 * num_writers`)
+    segments are held in memory.
+
+    Args:
+        out_format: Output file extension like "flac", keeps source one 
+            when it's `None`.
+        out_sample_rate: Keeps source sample rate when it's `None`.
+        out_channels: Keeps source channels when it's `None`, default mono.
+    """
     print("Chunking '%s'" % audio_path)
     out: List[AudioMetadata] = []
 
     audio_name: str = audio_path.split("/")[-1].split(".")[0]
-    audio_fmt: str = audio_path.split("/")[-1].split(".")[1]
-    
-    audio: Optional[ndarray] = None
-    sample_rate: int = -1
-    audio, sample_rate = librosa.load(audio_path, sr=None)
-    
-    for i, subtitle_chunk in enumerate(tqdm(subtitle_chunks)):
+    audio_fmt: str = out_format if out_format is not None \
+        else audio_path.split("/")[-1].split(".")[1]
+
+    todo: List[int] = []
+    for i, subtitle_chunk in enumerate(subtitle_chunks):
         audio_metadata: AudioMetadata = AudioMetadata()
-        
-        file_path: str = os.path.join(
+        audio_metadata.transcript = subtitle_chunk.subtitle
+        audio_metadata.path = os.path.join(
             output_dir, 
             "%s_part%i.%s" % (audio_name, i, audio_fmt)
         )
-        if os.path.exists(file_path):
-            print("Audio chunk '%s' already exists." % file_path)
-        else: 
-            start_sample_idx: int = int(
-                round(subtitle_chunk.start_in_second * sample_rate, 0)
+        out.append(audio_metadata)
+        if os.path.exists(audio_metadata.path):
+            print("Audio chunk '%s' already exists." % audio_metadata.path)
+        else:
+            todo.append(i)
+
+    max_pending = max_pending if max_pending is not None else 2 * num_writers
+    pending: threading.BoundedSemaphore = threading.BoundedSemaphore(max_pending)
+    futures: List[Future] = []
+
+    def write(path: str, segment: ndarray, sample_rate: int) -> str:
+        try:
+            return audio_segment_write(
+                path, segment, sample_rate, out_sample_rate, out_channels
             )
-            end_sample_idx: int = int(
-                round(subtitle_chunk.end_in_second * sample_rate, 0)
+        finally:
+            pending.release()
+
+    with ThreadPoolExecutor(max_workers=num_writers) as pool:
+        for j, segment, sample_rate in tqdm(
+            audio_segments_iter(
+                audio_path, 
+                [
+                    (subtitle_chunks[i].start_in_second, subtitle_chunks[i].end_in_second)
+                    for i in todo
+                ],
+                out_sample_rate=out_sample_rate, out_channels=out_channels
+            ),
+            total=len(todo)
+        ):
+            pending.acquire()
+            futures.append(
+                pool.submit(write, out[todo[j]].path, segment, sample_rate)
             )
-            segment: ndarray = audio[start_sample_idx:end_sample_idx]
+    for future in futures:
+        future.result()
 
-            sf.write(file_path, segment, sample_rate)
-            #print("Finished saving chunk audio '%s'" % file_path)
+    return out
 
-        audio_metadata.transcript = subtitle_chunk.subtitle
-        audio_metadata.path = file_path
-        out.append(audio_metadata)
 
-    return out
+def json_loads(line: Union[str, bytes], fast_json: bool=True) -> Dict:
+    if fast_json and orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
 
+def json_dumps(obj: Dict, fast_json: bool=True) -> str:
+    """
+    Args:
+        fast_json: Using `orjson` when it's installed, objects it can't 
+            serialize (e.g. non-str keys) fall back to `json`. Note `orjson` 
+            writes NaN/Inf as `null`.
+    """
+    if fast_json and orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
 
-def json_objs2jsonl_file(path: str, json_objs: List[Dict]) -> str:
-    file = open(path, "w")
-    for record in json_objs:
-        file.write(json.dumps(record, ensure_ascii=False) + "\n")
-    file.close()
+
+def text_file_open(path: str, mode: str="r") -> IO:
+    """
+    Opens text file in `mode` ("r", "w" or "a"), `.gz` and `.zst` files 
+    are transparently (de)compressed.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise Exception("Reading/writing '%s' needs `zstandard` installed" % path)
+        if mode == "r":
+            return io.TextIOWrapper(
+                zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), 
+                encoding="utf-8"
+            )
+        return io.TextIOWrapper(
+            zstandard.ZstdCompressor().stream_writer(open(path, mode + "b")), 
+            encoding="utf-8"
+        )
+    return open(path, mode, encoding="utf-8")
+
+
+def jsonl_iter(
+    path: str, batch_size: Optional[int]=None, fast_json: bool=True
+) -> Iterator[Union[Dict, List[Dict]]]:
+    """
+    Streams records of a (maybe compressed) JSONL file, yields lists of 
+    `batch_size` records when `batch_size` is given.
+    """
+    batch: List[Dict] = []
+    with text_file_open(path, "r") as file:
+        for line in file:
+            if line.strip() == "":
+                continue
+            record: Dict = json_loads(line, fast_json)
+            if batch_size is None:
+                yield record
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+class JsonlWriter:
+    def __init__(self, 
+        path: str, mode: str="w", fast_json: bool=False, flush_every: int=0
+    ):
+        """
+        Args:
+            mode: "w" or "a".
+            fast_json: Serializing with `orjson`, see `json_dumps`. Off by 
+                default so output is same as `json`'s.
+            flush_every: Flushing after every `flush_every` records, 0 means 
+                only flushing on closing.
+        """
+        self.path: str = path
+        self.fast_json: bool = fast_json
+        self.flush_every: int = flush_every
+        self.count: int = 0
+        self.file: IO = text_file_open(path, mode)
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, record: Dict) -> None:
+        self.file.write(json_dumps(record, self.fast_json) + "\n")
+        self.count += 1
+        if self.flush_every > 0 and self.count % self.flush_every == 0:
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def jsonl_index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def jsonl_build_index(path: str) -> str:
+    """
+    Builds sidecar index of an uncompressed JSONL file, which contains 
+    byte offset of each non-empty line as little-endian uint64.
+    """
+    offsets: array.array = array.array("Q")
+    offset: int = 0
+    with open(path, "rb") as file:
+        for line in file:
+            if line.strip() != b"":
+                offsets.append(offset)
+            offset += len(line)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    index_path: str = jsonl_index_path(path)
+    with open(index_path, "wb") as index_file:
+        offsets.tofile(index_file)
+    return index_path
+
+
+class JsonlIndexedReader:
+    """
+    O(1) random access to N-th record of JSONL file through the sidecar 
+    index built by `jsonl_build_index`, which will be (re-)built when it's 
+    missing or older than the JSONL file.
+    """
+    def __init__(self, path: str, fast_json: bool=True):
+        if path.endswith(".gz") or path.endswith(".zst"):
+            raise Exception("Random access is not supported by compressed '%s'" % path)
+        self.path: str = path
+        self.fast_json: bool = fast_json
+        self.index_path: str = jsonl_index_path(path)
+        if not os.path.exists(self.index_path) \
+                or os.path.getmtime(self.index_path) < os.path.getmtime(path):
+            jsonl_build_index(path)
+        self.size: int = os.path.getsize(self.index_path) // 8
+        self._file: Optional[IO] = None
+        self._index_file: Optional[IO] = None
+        self._pid: int = -1
+
+    def __getstate__(self) -> Dict:
+        state: Dict = self.__dict__.copy()
+        state["_file"] = None
+        state["_index_file"] = None
+        state["_pid"] = -1
+        return state
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _open(self) -> None:
+        if self._file is None or self._pid != os.getpid():
+            self._file = open(self.path, "rb")
+            self._index_file = open(self.index_path, "rb")
+            self._pid = os.getpid()
+
+    def __getitem__(self, idx: int) -> Dict:
+        if idx < 0:
+            idx += self.size
+        if idx < 0 or idx >= self.size:
+            raise IndexError("Line %i out of range of '%s'" % (idx, self.path))
+        self._open()
+        self._index_file.seek(idx * 8)
+        offset: int = int.from_bytes(self._index_file.read(8), "little")
+        self._file.seek(offset)
+        return json_loads(self._file.readline(), self.fast_json)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._index_file.close()
+        self._file = None
+        self._index_file = None
+
+
+def json_objs2jsonl_file(path: str, json_objs: Iterable[Dict]) -> str:
+    with JsonlWriter(path, "w", fast_json=False) as writer:
+        writer.write_many(json_objs)
     return path
 
 
 def jsonl_file2json_objs(path: str) -> List[Dict]:
-    return [
-        json.loads(x) for x in open(path, "r").read().split("\n") 
-        if x not in {""}
-    ]
+    return list(jsonl_iter(path, fast_json=False))
+
+
+def jsonl_repair_tail(path: str, chunk_size: int=2 ** 16) -> int:
+    """
+    Truncates the last line of an uncompressed JSONL file when it's not 
+    terminated by a newline, which is what an interrupted append-only 
+    writer leaves behind, so the file can be appended again.
+
+    Returns:
+        Number of removed bytes.
+    """
+    with open(path, "rb+") as file:
+        size: int = file.seek(0, os.SEEK_END)
+        end: int = size
+        while end > 0:
+            start: int = max(end - chunk_size, 0)
+            file.seek(start)
+            chunk: bytes = file.read(end - start)
+            if end == size and chunk.endswith(b"\n"):
+                return 0
+            pos: int = chunk.rfind(b"\n")
+            if pos >= 0:
+                end = start + pos + 1
+                break
+            end = start
+        file.truncate(end)
+    return size - end
+
+
+def jsonl_merge_sorted(
+    paths: List[str], out_path: str, key: Callable[[Dict], Any], 
+    fast_json: bool=True
+) -> str:
+    """
+    Streaming k-way merge of JSONL files which are already sorted by `key`.
+    """
+    with JsonlWriter(out_path, "w", fast_json=fast_json) as writer:
+        writer.write_many(
+            heapq.merge(
+                *[jsonl_iter(x, fast_json=fast_json) for x in paths], key=key
+            )
+        )
+    return out_path
+
+
+def jsonl_byte_ranges(path: str, num_ranges: int) -> List[Tuple[int, int]]:
+    """
+    Splits an uncompressed JSONL file into at most `num_ranges` byte ranges
+    of similar size, each range starts at a line boundary.
+    """
+    size: int = os.path.getsize(path)
+    bounds: List[int] = [0]
+    with open(path, "rb") as file:
+        for i in range(1, num_ranges):
+            pos: int = size * i // num_ranges
+            if pos <= bounds[-1]:
+                continue
+            file.seek(pos - 1)
+            file.readline()
+            if file.tell() > bounds[-1] and file.tell() < size:
+                bounds.append(file.tell())
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def jsonl_iter_range(
+    path: str, start: int, end: int, fast_json: bool=True
+) -> Iterator[Dict]:
+    """
+    Streams records of lines starting within `[start, end)` bytes of an
+    uncompressed JSONL file, `start` should be a line boundary.
+    """
+    with open(path, "rb") as file:
+        file.seek(start)
+        offset: int = start
+        while offset < end:
+            line: bytes = file.readline()
+            if line == b"":
+                break
+            offset += len(line)
+            if line.strip() != b"":
+                yield json_loads(line, fast_json)
 
 
 def split_text_by_chinese_punctuation(sentence):
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# file: test_feature.py
+# date: 2026-10-18
+
+
+import torch
+from torch import Tensor
+from typing import Dict, List
+from transformers import WhisperFeatureExtractor
+
+from mia.data.audio import functions as F
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_JSONL_DATA: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)
+AUDIO_PATH_COL: str = "path"
+TARGET_SAMPLE_RATE: int = 16000
+FEA_EXTRACTOR: WhisperFeatureExtractor = WhisperFeatureExtractor()
+
+
+def test_audio_batch2model_inputs() -> None:
+    paths: List[str] = [x[AUDIO_PATH_COL] for x in DEMO_JSONL_DATA]
+    inputs: Tensor = None
+    durations: List[float] = []
+    inputs, durations = F.audio_batch2model_inputs(
+        paths, FEA_EXTRACTOR, TARGET_SAMPLE_RATE
+    )
+    assert(inputs.shape == (len(paths), 80, 3000))
+    for i, path in enumerate(paths):
+        expected: Tensor = None
+        expected_duration: float = -1
+        expected, expected_duration = F.audio_file2model_inputs(
+            path, FEA_EXTRACTOR, TARGET_SAMPLE_RATE
+        )
+        assert(torch.allclose(inputs[i], expected[0], atol=1e-4))
+        assert(durations[i] == expected_duration)
+
+
+def test_waveforms2log_mel_pad_and_crop() -> None:
+    waveforms: List[Tensor] = [
+        torch.randn(16000), torch.randn(FEA_EXTRACTOR.n_samples + 16000)
+    ]
+    outputs: Tensor = F.waveforms2log_mel(waveforms, FEA_EXTRACTOR)
+    for i, waveform in enumerate(waveforms):
+        expected: Tensor = FEA_EXTRACTOR(
+            waveform.numpy(), sampling_rate=TARGET_SAMPLE_RATE, 
+            return_tensors="pt"
+        ).input_features[0]
+        assert(torch.allclose(outputs[i], expected, atol=1e-4))
+
+
+def test_features_pad_stack() -> None:
+    features: List[Tensor] = [torch.randn(1, 80, 3000) for _ in range(3)]
+    expected: Tensor = FEA_EXTRACTOR.pad(
+        [{"input_features": x.tolist()[0]} for x in features], 
+        return_tensors="pt"
+    )["input_features"]
+    outputs: Tensor = F.features_pad_stack(features)
+    assert(outputs.shape == (3, 80, 3000))
+    assert(torch.equal(outputs, expected))
+
+    outputs = F.features_pad_stack([torch.ones(80, 10), torch.ones(80, 20)])
+    assert(outputs.shape == (2, 80, 20))
+    assert(outputs[0, :, 10:].sum() == 0)
+    assert(outputs[1].sum() == 80 * 20)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# file: test_io.py
+# date: 2026-10-18
+
+
+import os
+import numpy as np
+import soundfile as sf
+from typing import Dict, List
+
+from mia.data.audio.functions import io
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_JSONL_DATA: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)
+AUDIO_PATH_COL: str = "path"
+
+
+def test_audio_probe_header() -> None:
+    for sample in DEMO_JSONL_DATA:
+        header_meta: Dict = io.audio_probe(sample[AUDIO_PATH_COL], cache_path=None)
+        decode_meta: Dict = io.audio_probe(
+            sample[AUDIO_PATH_COL], cache_path=None, decode=True
+        )
+        assert(header_meta["probe"] == "header")
+        assert(decode_meta["probe"] == "decode")
+        assert(header_meta["sample_rate"] == decode_meta["sample_rate"])
+        assert(header_meta["num_channels"] == decode_meta["num_channels"])
+        assert(abs(header_meta["duration_sec"] - decode_meta["duration_sec"]) < 0.05)
+
+
+def test_audio_probe_header_exact_for_wav(tmp_path) -> None:
+    path: str = str(tmp_path / "a.wav")
+    sf.write(path, np.zeros(12345, dtype=np.float32), 16000)
+    meta: Dict = io.audio_probe(path, cache_path=None)
+    assert(meta["num_frames"] == 12345)
+    assert(meta["sample_rate"] == 16000)
+    assert(meta["codec"] == "WAV/PCM_16")
+
+
+def test_audio_probe_cache(tmp_path) -> None:
+    path: str = str(tmp_path / "a.wav")
+    cache_path: str = str(tmp_path / "meta.sqlite")
+    sf.write(path, np.zeros(16000, dtype=np.float32), 16000)
+
+    meta: Dict = io.audio_probe(path, cache_path=cache_path)
+    assert(meta["duration_sec"] == 1.0)
+    stat: os.stat_result = os.stat(path)
+    cached: Dict = io.audio_meta_cache_get(cache_path).get(
+        path, stat.st_size, stat.st_mtime_ns
+    )
+    assert(cached == meta)
+
+    # Cache entry must be invalidated once file changed
+    sf.write(path, np.zeros(32000, dtype=np.float32), 16000)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert(io.audio_probe(path, cache_path=cache_path)["duration_sec"] == 2.0)
+    assert(
+        io.audio_get_meta(path, cache_path=cache_path)["duration_sec"] == 2.0
+    )
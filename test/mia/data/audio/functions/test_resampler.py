@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# file: test_resampler.py
+# date: 2026-10-18
+
+
+import torch
+import torchaudio
+from torch import Tensor
+
+from mia.data.audio.functions import resampler
+
+
+def test_waveform_resample() -> None:
+    waveform: Tensor = torch.randn(2, 48000)
+    output: Tensor = resampler.waveform_resample(waveform, 48000, 16000)
+    expected: Tensor = torchaudio.functional.resample(
+        waveform.mean(dim=0, keepdim=True), orig_freq=48000, new_freq=16000
+    )
+    assert(output.shape == (1, 16000))
+    assert(torch.allclose(output, expected, atol=1e-5))
+    assert(
+        resampler.get_resampler(48000, 16000, torch.float32) 
+        is resampler.get_resampler(48000, 16000, torch.float32)
+    )
+
+
+def test_waveform_resample_no_op() -> None:
+    waveform: Tensor = torch.randn(1, 16000)
+    assert(resampler.waveform_resample(waveform, 16000, 16000) is waveform)
+    stereo: Tensor = torch.randn(2, 16000)
+    assert(torch.equal(
+        resampler.waveform_resample(stereo, 16000, 16000, mono=False), stereo
+    ))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# file: test_argumentation.py
+# date: 2026-10-18
+
+
+import torch
+from torch import Tensor
+
+from mia.data.audio import argumentation
+
+
+def test_batch_spec_argument() -> None:
+    specs: Tensor = torch.ones(8, 80, 3000)
+    outputs: Tensor = argumentation.batch_spec_argument(
+        specs, 
+        freq_masking_prob=1.0, freq_max_masking_ratio=0.1, 
+        time_masking_prob=1.0, time_max_masking_ratio=0.1,
+        generator=torch.Generator().manual_seed(0)
+    )
+    assert(outputs.shape == specs.shape)
+    assert(torch.equal(specs, torch.ones(8, 80, 3000)))
+    for spec in outputs:
+        masked_freqs: int = int((spec == 0).all(dim=1).sum())
+        masked_frames: int = int((spec == 0).all(dim=0).sum())
+        assert(masked_freqs < 8)
+        assert(masked_frames < 300)
+    # Each sample has its own masks
+    assert(not all(torch.equal(outputs[0], x) for x in outputs[1:]))
+
+
+def test_batch_spec_argument_seed_and_prob() -> None:
+    specs: Tensor = torch.randn(4, 80, 100)
+    outputs_0: Tensor = argumentation.batch_spec_argument(
+        specs, generator=torch.Generator().manual_seed(7)
+    )
+    outputs_1: Tensor = argumentation.batch_spec_argument(
+        specs, generator=torch.Generator().manual_seed(7)
+    )
+    assert(torch.equal(outputs_0, outputs_1))
+
+    outputs_2: Tensor = argumentation.batch_spec_argument(
+        specs, freq_masking_prob=0.0, time_masking_prob=0.0
+    )
+    assert(torch.equal(outputs_2, specs))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# file: test_converter.py
+# date: 2026-10-18
+
+
+import os
+import soundfile as sf
+from typing import Dict, List
+
+from mia.data.audio.converter import AudioFormatConverter
+from mia.data.audio.converter import ffmpeg_convert_args
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_RECORDS: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)[:4]
+
+
+def test_ffmpeg_convert_args() -> None:
+    args: List[str] = ffmpeg_convert_args("ffmpeg", "a b;rm -rf.mp3", "o.wav")
+    assert(args[args.index("-i") + 1] == "a b;rm -rf.mp3")
+    assert(args[-1] == "o.wav")
+
+
+def test_audio_format_converter(tmp_path) -> None:
+    records: List[Dict] = DEMO_RECORDS + [{"path": "./not_exist.mp3", "text": "x"}]
+    out_dir: str = str(tmp_path / "out")
+    metadata_path: str = str(tmp_path / "metadata.jsonl")
+    failure_path: str = str(tmp_path / "failures.jsonl")
+    converter: AudioFormatConverter = AudioFormatConverter(
+        out_dir, "flac", sample_rate=8000, backend="in_process", num_proc=2,
+        max_pending=3
+    )
+    stats: Dict = converter.run(
+        records, "path", metadata_path, failure_path, keep_cols=["text"]
+    )
+    assert(stats["converted"] == len(DEMO_RECORDS) and stats["failed"] == 1)
+
+    outputs: List[Dict] = jsonl_file2json_objs(metadata_path)
+    assert(sorted(x["text"] for x in outputs) == sorted(x["text"] for x in DEMO_RECORDS))
+    for output in outputs:
+        assert(set(output) == {"path", "text"})
+        info = sf.info(output["path"])
+        assert(info.samplerate == 8000 and info.channels == 1)
+    failures: List[Dict] = jsonl_file2json_objs(failure_path)
+    assert(failures[0]["path"] == "./not_exist.mp3" and failures[0]["error"] != "")
+
+    stats = converter.run(records, "path", metadata_path, failure_path)
+    assert(stats["skipped"] == len(DEMO_RECORDS))
+
+    # Failing ffmpeg leaves neither output nor temporary files
+    failing: AudioFormatConverter = AudioFormatConverter(
+        str(tmp_path / "ffmpeg_out"), "wav", ffmpeg="false", num_proc=1
+    )
+    stats = failing.run(DEMO_RECORDS, "path", metadata_path, failure_path)
+    assert(stats["failed"] == len(DEMO_RECORDS))
+    assert(os.listdir(str(tmp_path / "ffmpeg_out")) == [])
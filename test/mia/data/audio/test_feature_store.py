@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# file: test_feature_store.py
+# date: 2026-10-18
+
+
+import pickle
+import torch
+from torch import Tensor
+from typing import Dict, List
+from transformers import WhisperFeatureExtractor
+
+from mia.data.audio import functions as F
+from mia.data.audio.feature_store import LogMelFeatureStore
+from mia.data.audio.feature_store import feature_store_build
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_JSONL_DATA: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)
+AUDIO_PATH_COL: str = "path"
+TARGET_SAMPLE_RATE: int = 16000
+FEA_EXTRACTOR: WhisperFeatureExtractor = WhisperFeatureExtractor()
+
+
+def test_feature_store_build_and_get(tmp_path) -> None:
+    samples: List[Dict] = DEMO_JSONL_DATA[:3]
+    store: LogMelFeatureStore = LogMelFeatureStore(
+        str(tmp_path), max_shard_bytes=1
+    )
+    feature_store_build(
+        store, samples, FEA_EXTRACTOR, 
+        path_col=AUDIO_PATH_COL, num_workers=0
+    )
+    store.close()
+    assert(len(store) == 3)
+    # Every record is bigger than `max_shard_bytes` so has its own shard
+    assert(len(set(x["shard"] for x in store.index.values())) == 3)
+
+    reopened: LogMelFeatureStore = pickle.loads(
+        pickle.dumps(LogMelFeatureStore(str(tmp_path)))
+    )
+    for sample in samples:
+        expected: Tensor = None
+        expected_duration: float = -1
+        expected, expected_duration = F.audio_file2model_inputs(
+            sample[AUDIO_PATH_COL], FEA_EXTRACTOR, TARGET_SAMPLE_RATE
+        )
+        features: Tensor = None
+        duration: float = -1
+        features, duration = reopened.get(sample[AUDIO_PATH_COL], FEA_EXTRACTOR)
+        assert(features.shape == expected.shape)
+        assert(torch.equal(features, expected))
+        assert(duration == expected_duration)
+
+    assert(reopened.get(DEMO_JSONL_DATA[4][AUDIO_PATH_COL], FEA_EXTRACTOR) is None)
+    assert(reopened.get(
+        samples[0][AUDIO_PATH_COL], WhisperFeatureExtractor(feature_size=128)
+    ) is None)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# file: test_fetcher.py
+# date: 2026-10-18
+
+
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from mia.data.audio.fetcher import fetch_cmd_args
+from mia.data.audio.fetcher import backoff_sec
+from mia.data.audio.fetcher import FetchScheduler
+from mia.utils import jsonl_file2json_objs
+
+
+# Stand-in of `youtube-dl`, writes `<ID>.mp3` and `<ID>.vtt` into working
+# directory, IDs starting with "flaky" fail on first attempt and IDs
+# starting with "bad" always fail
+FAKE_FETCHER: str = """
+import os
+import sys
+
+item_id: str = sys.argv[1]
+counter: str = "%s.attempts" % item_id
+attempts: int = int(open(counter).read()) + 1 if os.path.exists(counter) else 1
+open(counter, "w").write(str(attempts))
+if item_id.startswith("bad") or (item_id.startswith("flaky") and attempts == 1):
+    sys.stderr.write("HTTP Error 429")
+    sys.exit(1)
+for ext in ["mp3", "vtt"]:
+    open("%s.%s" % (item_id, ext), "w").write(sys.argv[2])
+"""
+
+
+def test_fetch_cmd_args() -> None:
+    assert(fetch_cmd_args(
+        ["${BIN}", "--output", "${ID}.%(ext)s", "${URL}"], 
+        {"BIN": "youtube-dl", "ID": "a b", "URL": "https://x?v=a b"}
+    ) == ["youtube-dl", "--output", "a b.%(ext)s", "https://x?v=a b"])
+    assert(0.5 <= backoff_sec(1, 1.0, 60.0) <= 1.0)
+    assert(4.0 <= backoff_sec(4, 1.0, 60.0) <= 8.0)
+    assert(backoff_sec(20, 1.0, 60.0) <= 60.0)
+
+
+def test_fetch_scheduler(tmp_path) -> None:
+    script_path: str = str(tmp_path / "fake_fetcher.py")
+    open(script_path, "w").write(FAKE_FETCHER)
+    work_dir: str = str(tmp_path / "raw")
+    os.makedirs(work_dir)
+    state_path: str = os.path.join(work_dir, "fetch_state.jsonl")
+    items: List[Dict] = [
+        {
+            "id": x, "URL": "https://youtube/%s" % x,
+            "outputs": [os.path.join(work_dir, "%s.%s" % (x, ext)) for ext in ["mp3", "vtt"]]
+        } for x in ["a", "flaky1", "b", "bad1", "c"]
+    ]
+    scheduler: FetchScheduler = FetchScheduler(
+        [sys.executable, script_path, "${id}", "${URL}"], state_path, 
+        work_dir=work_dir, max_concurrency=2, max_retries=2, 
+        backoff_base_sec=0.01, seed=1
+    )
+    results: Dict[str, Dict] = {x["id"]: y for x, y in scheduler.run(items)}
+    assert(sorted(results.keys()) == sorted(x["id"] for x in items))
+    assert(results["a"]["status"] == "done" and results["a"]["attempts"] == 1)
+    assert(results["flaky1"]["status"] == "done" and results["flaky1"]["attempts"] == 2)
+    assert(results["bad1"]["status"] == "failed" and results["bad1"]["attempts"] == 3)
+    assert("HTTP Error 429" in results["bad1"]["error"])
+    assert(open(os.path.join(work_dir, "c.mp3")).read() == "https://youtube/c")
+    assert(len(jsonl_file2json_objs(state_path)) == len(items))
+
+    # Rerun skips finished IDs and only retries failed ones
+    outputs: List[Tuple[Dict, Dict]] = list(scheduler.run(items))
+    assert(
+        sorted(x["id"] for x, y in outputs if y["status"] == "skipped") == \
+            ["a", "b", "c", "flaky1"]
+    )
+    assert(open(os.path.join(work_dir, "a.attempts")).read() == "1")
+    assert(open(os.path.join(work_dir, "bad1.attempts")).read() == "6")
+    assert(len(jsonl_file2json_objs(state_path)) == len(items) + 1)
+
+    # Outputs fetched without a state file are recorded as done and skipped
+    os.remove(state_path)
+    outputs = list(scheduler.run(items))
+    assert(
+        sorted(x["id"] for x, y in outputs if y["status"] == "skipped") == \
+            ["a", "b", "c", "flaky1"]
+    )
+    assert(open(os.path.join(work_dir, "a.attempts")).read() == "1")
+    states: List[Dict] = jsonl_file2json_objs(state_path)
+    assert(sorted(x["id"] for x in states if x["status"] == "done") == \
+        ["a", "b", "c", "flaky1"])
+    assert(all(x["attempts"] == 0 for x in states if x["status"] == "done"))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# file: test_hf_audio_dataset.py
+# date: 2026-10-18
+
+
+import os
+import random as rd
+import torch
+import numpy as np
+import augly.audio as audaugs
+from typing import Dict, List, Tuple
+from torch import Tensor
+from torch.utils.data import DataLoader
+from datasets import Dataset
+from transformers import WhisperFeatureExtractor
+
+from mia.data.audio import argumentation
+from mia.data.audio import hf_audio_dataset
+from mia.data.audio.hf_audio_dataset import HfAudioDataset
+from mia.data.audio.hf_audio_dataset import dataset_load_audio
+from mia.data.audio.hf_audio_dataset import OnTheFlyAudioDataset
+from mia.data.audio.shards import pack_shards
+from mia.data.audio.shards import ShardedAudioDataset
+from mia.utils import jsonl_file2json_objs
+from mia.utils import json_objs2jsonl_file
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+FEA_EXTRACTOR: WhisperFeatureExtractor = WhisperFeatureExtractor()
+
+
+def add_noise(waveform: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, int]:
+    return waveform + 0.01 * np.random.standard_normal(waveform.shape), sample_rate
+
+
+class FakeTokenizerOutputs:
+    def __init__(self, input_ids: List[int]):
+        self.input_ids: List[int] = input_ids
+
+
+class FakeTokenizer:
+    def __call__(self, text: str) -> FakeTokenizerOutputs:
+        return FakeTokenizerOutputs([ord(x) % 1000 for x in text])
+
+
+class FakeProcessor:
+    """
+    `WhisperProcessor` with a character tokenizer, so no hub files needed.
+    """
+    def __init__(self):
+        self.feature_extractor: WhisperFeatureExtractor = FEA_EXTRACTOR
+        self.tokenizer: FakeTokenizer = FakeTokenizer()
+
+    def __call__(self, audio: np.ndarray, sampling_rate: int, text: str) -> Dict:
+        output = self.feature_extractor(audio, sampling_rate=sampling_rate)
+        output["labels"] = self.tokenizer(text).input_ids
+        return output
+
+
+def get_audio_dataset(size: int=4) -> Dataset:
+    samples: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)[:size]
+    for x in samples:
+        x["labels"] = [1, 2, 3]
+    return dataset_load_audio(Dataset.from_list(samples))
+
+
+def collate(samples: List[Dict]) -> List[Tensor]:
+    return [x["input_features"] for x in samples]
+
+
+def test_on_the_fly_audio_dataset(monkeypatch) -> None:
+    monkeypatch.setattr(
+        argumentation, "AUGLY_TRANSFORMS", 
+        audaugs.Compose([
+            audaugs.AddBackgroundNoise(p=1.0), 
+            audaugs.OneOf([audaugs.AddBackgroundNoise(snr_level_db=5.0)], p=0.5)
+        ])
+    )
+    audio_dataset: Dataset = get_audio_dataset()
+
+    dataset: OnTheFlyAudioDataset = OnTheFlyAudioDataset(
+        audio_dataset, FEA_EXTRACTOR, waveform_argument=False
+    )
+    sample: Dict = dataset[0]
+    target: np.ndarray = FEA_EXTRACTOR(
+        audio_dataset[0]["audio"]["array"], sampling_rate=16000
+    ).input_features[0]
+    assert("audio" not in sample)
+    assert(sample["labels"] == [1, 2, 3])
+    assert(sample["input_features"].shape == (80, 3000))
+    assert(np.abs(sample["input_features"].numpy() - target).max() < 1e-3)
+
+    dataset = OnTheFlyAudioDataset(
+        audio_dataset, FEA_EXTRACTOR, waveform_argument=True, seed=7
+    )
+    rd.seed(0)
+    np.random.seed(0)
+    epoch0: Tensor = dataset[0]["input_features"]
+    assert(torch.equal(epoch0, dataset[0]["input_features"]))
+    # Global RNGs are not reseeded
+    assert(rd.random() == rd.Random(0).random())
+    assert(np.random.random() == np.random.RandomState(0).random())
+    dataset.set_epoch(1)
+    epoch1: Tensor = dataset[0]["input_features"]
+    assert(not torch.equal(epoch0, epoch1))
+
+    # Same augmentations in workers, and epoch updates reach persistent workers
+    dataloader: DataLoader = DataLoader(
+        dataset, batch_size=2, num_workers=2,
+        persistent_workers=True, collate_fn=collate
+    )
+    dataset.set_epoch(0)
+    assert(torch.equal(next(iter(dataloader))[0], epoch0))
+    dataset.set_epoch(1)
+    assert(torch.equal(next(iter(dataloader))[0], epoch1))
+
+
+def get_hf_audio_dataset(tmp_path, incremental: bool) -> HfAudioDataset:
+    path: str = str(tmp_path / "data.jsonl")
+    json_objs2jsonl_file(path, jsonl_file2json_objs(DEMO_JSONL_PATH)[:3])
+    return HfAudioDataset(
+        path, path, None, FakeProcessor(), lang="en", num_proc=1, 
+        waveform_argument_splits=["train"], incremental=incremental
+    )
+
+
+def test_hf_audio_dataset_incremental(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(argumentation, "AUGLY_TRANSFORMS", add_noise)
+    tokenizer_calls: List[int] = []
+    run_hf_tokenizer = hf_audio_dataset.dataset_run_hf_tokenizer
+    def counted_run_hf_tokenizer(*args, **kwargs) -> Dataset:
+        tokenizer_calls.append(1)
+        return run_hf_tokenizer(*args, **kwargs)
+    monkeypatch.setattr(
+        hf_audio_dataset, "dataset_run_hf_tokenizer", counted_run_hf_tokenizer
+    )
+
+    incremental: HfAudioDataset = get_hf_audio_dataset(tmp_path, True)
+    epoch0: Dataset = incremental.get_final_datasets()
+    static_files: List[str] = [
+        x["filename"] for split in incremental.cached_datasets 
+        for x in incremental.cached_datasets[split].cache_files
+    ]
+    epoch0_files: List[str] = list(incremental.epoch_cache_files)
+    assert(len(epoch0_files) > 0)
+    assert(all(os.path.exists(x) for x in epoch0_files))
+    assert(len(tokenizer_calls) == 2)
+
+    # Second epoch re-uses augmentation independent datasets and only 
+    # removes cache files of first epoch
+    epoch1: Dataset = incremental.get_final_datasets()
+    assert(len(tokenizer_calls) == 2)
+    assert(not any(os.path.exists(x) for x in epoch0_files))
+    assert(all(os.path.exists(x) for x in static_files))
+    assert(all(os.path.exists(x) for x in incremental.epoch_cache_files))
+    # Augmented split is re-drawn
+    epoch0_features: Dict[Tuple, np.ndarray] = {
+        tuple(x["labels"]): np.asarray(x["input_features"]) for x in epoch0["train"]
+    }
+    assert(not all(
+        np.array_equal(np.asarray(x["input_features"]), epoch0_features[tuple(x["labels"])])
+        for x in epoch1["train"]
+    ))
+
+    # Same columns and samples as a full rebuild
+    full: Dataset = get_hf_audio_dataset(tmp_path, False).get_final_datasets()
+    for split in full:
+        assert(set(epoch1[split].column_names) == set(full[split].column_names))
+        assert(sorted(epoch1[split]["labels"]) == sorted(full[split]["labels"]))
+
+
+def test_hf_audio_dataset_shards(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(argumentation, "AUGLY_TRANSFORMS", add_noise)
+    records: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)[:3]
+    index_path: str = pack_shards(
+        records, str(tmp_path / "shards"), "path", max_shard_samples=2,
+        audio_format="flac", sample_rate=16000, channels=1, num_writers=1
+    )
+    dataset: HfAudioDataset = HfAudioDataset(
+        index_path, index_path, None, FakeProcessor(), lang="en", num_proc=1, 
+        waveform_argument_splits=["train"]
+    )
+
+    # Audios are decoded from shards on access but not stored in Arrow
+    static: Dataset = dataset.get_static_datasets()["train"]
+    assert("audio" not in static.column_names)
+    sharded: ShardedAudioDataset = ShardedAudioDataset(index_path, 16000)
+    for i in range(len(records)):
+        assert(static[i]["audio"]["sampling_rate"] == 16000)
+        assert(np.allclose(static[i]["audio"]["array"], sharded[i]["audio"]["array"]))
+    # Batches are read in offsets order but returned in their own order
+    batch: Dict = static[::-1]
+    assert([x["path"] for x in batch["audio"]] == [x["path"] for x in static][::-1])
+    assert(np.allclose(batch["audio"][0]["array"], sharded[2]["audio"]["array"]))
+    sharded.close()
+
+    final: Dataset = dataset.get_final_datasets()
+    for split in final:
+        assert(sorted(final[split]["labels"]) == sorted(
+            FakeTokenizer()(x["text"]).input_ids for x in records
+        ))
+        assert(all(
+            np.asarray(x).shape == (1, 80, 3000) for x in final[split]["input_features"]
+        ))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# file: test_sampler.py
+# date: 2026-10-18
+
+
+import numpy as np
+from typing import List
+
+from mia.data.audio.sampler import BucketBatchSampler
+from mia.data.audio.sampler import SortedBatchSampler
+
+
+def test_bucket_batch_sampler() -> None:
+    rng: np.random.Generator = np.random.default_rng(0)
+    durations: List[float] = rng.uniform(1, 30, 1000).tolist()
+    token_nums: List[int] = rng.integers(1, 200, 1000).tolist()
+
+    sampler: BucketBatchSampler = BucketBatchSampler(
+        durations, token_nums, batch_size=16, max_tokens=1024,
+        bucket_size_multiplier=10, seed=1
+    )
+    batches: List[List[int]] = list(sampler)
+    assert(len(batches) == len(sampler))
+    assert(sorted(sum(batches, [])) == list(range(1000)))
+    for batch in batches:
+        assert(len(batch) <= 16)
+        assert(len(batch) == 1 or len(batch) * max(token_nums[i] for i in batch) <= 1024)
+
+    # Batches are much more homogeneous than random batches
+    spread: float = np.mean([
+        max(token_nums[i] for i in x) - min(token_nums[i] for i in x)
+        for x in batches
+    ])
+    assert(spread < 20)
+
+    assert(list(sampler) == batches)
+    sampler.set_epoch(1)
+    assert(list(sampler) != batches)
+    sampler.set_epoch(0)
+    assert(list(sampler) == batches)
+
+    sampler = BucketBatchSampler(
+        durations, batch_size=16, bucket_size_multiplier=10, drop_last=True
+    )
+    assert(all(len(x) == 16 for x in sampler))
+
+
+def test_sorted_batch_sampler() -> None:
+    durations: List[float] = [3.0, 1.0, 5.0, 2.0, 4.0]
+    sampler: SortedBatchSampler = SortedBatchSampler(durations, batch_size=2)
+    assert(list(sampler) == [[2, 4], [0, 3], [1]])
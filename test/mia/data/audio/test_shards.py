@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# file: test_shards.py
+# date: 2026-10-18
+
+
+import io
+import os
+import json
+import tarfile
+import numpy as np
+import soundfile as sf
+from typing import Dict, List
+
+from mia.data.audio.shards import pack_shards
+from mia.data.audio.shards import ShardCache
+from mia.data.audio.shards import ShardedAudioDataset
+from mia.data.audio.shards import ShardedAudioIterableDataset
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_RECORDS: List[Dict] = jsonl_file2json_objs(DEMO_JSONL_PATH)[:5]
+
+
+def test_pack_shards(tmp_path) -> None:
+    out_dir: str = str(tmp_path / "shards")
+    index_path: str = pack_shards(
+        DEMO_RECORDS, out_dir, "path", keep_cols=["text"], max_shard_samples=2,
+        audio_format="flac", sample_rate=16000, channels=1, num_writers=2,
+        max_pending_shards=1
+    )
+    index: List[Dict] = jsonl_file2json_objs(index_path)
+    assert(len(index) == len(DEMO_RECORDS))
+    assert([x["shard"] for x in index] == \
+        ["shard-000000.tar"] * 2 + ["shard-000001.tar"] * 2 + ["shard-000002.tar"])
+
+    # Members are in WebDataset layout, and offsets point to their data
+    with tarfile.open(os.path.join(out_dir, "shard-000001.tar")) as tar:
+        assert(tar.getnames() == [
+            "000000000002.flac", "000000000002.json",
+            "000000000003.flac", "000000000003.json"
+        ])
+    for entry, record in zip(index, DEMO_RECORDS):
+        with open(os.path.join(out_dir, entry["shard"]), "rb") as file:
+            file.seek(entry["offset_data"])
+            audio, sample_rate = sf.read(io.BytesIO(file.read(entry["size"])))
+            file.seek(entry["json_offset_data"])
+            metadata: Dict = json.loads(file.read(entry["json_size"]))
+        assert(sample_rate == 16000 and len(audio) > 0)
+        assert(metadata == {"path": entry["audio_member"], "text": record["text"]})
+
+    # Existing shards are kept when re-running
+    mtime: float = os.path.getmtime(os.path.join(out_dir, "shard-000000.tar"))
+    pack_shards(
+        DEMO_RECORDS, out_dir, "path", keep_cols=["text"], max_shard_samples=2
+    )
+    assert(os.path.getmtime(os.path.join(out_dir, "shard-000000.tar")) == mtime)
+    assert(jsonl_file2json_objs(index_path) == index)
+
+
+def test_pack_shards_raw_bytes(tmp_path) -> None:
+    index_path: str = pack_shards(
+        DEMO_RECORDS[:2], str(tmp_path), "path", audio_format=None, num_writers=1
+    )
+    entry: Dict = jsonl_file2json_objs(index_path)[1]
+    with open(str(tmp_path / entry["shard"]), "rb") as file:
+        file.seek(entry["offset_data"])
+        assert(file.read(entry["size"]) == open(DEMO_RECORDS[1]["path"], "rb").read())
+    assert(entry["audio_member"].endswith(".mp3"))
+
+
+def test_pack_shards_failures(tmp_path) -> None:
+    broken_path: str = str(tmp_path / "broken.mp3")
+    open(broken_path, "wb").write(b"not an audio")
+    records: List[Dict] = [
+        DEMO_RECORDS[0], 
+        {**DEMO_RECORDS[1], "path": broken_path},
+        {**DEMO_RECORDS[2], "path": str(tmp_path / "missing.mp3")},
+        DEMO_RECORDS[3]
+    ]
+    out_dir: str = str(tmp_path / "shards")
+    index_path: str = pack_shards(
+        records, out_dir, "path", keep_cols=["text"], max_shard_samples=2,
+        audio_format="flac", sample_rate=16000, num_writers=1
+    )
+    # Unreadable audios are skipped but the others are still packed
+    index: List[Dict] = jsonl_file2json_objs(index_path)
+    assert([x["text"] for x in index] == [records[0]["text"], records[3]["text"]])
+    failures: List[Dict] = jsonl_file2json_objs(os.path.join(out_dir, "failures.jsonl"))
+    assert([x["path"] for x in failures] == [records[1]["path"], records[2]["path"]])
+    assert(all(len(x["error"]) > 0 for x in failures))
+    
+    # Failures of resumed shards are recorded again
+    pack_shards(
+        records, out_dir, "path", keep_cols=["text"], max_shard_samples=2,
+        failure_path=str(tmp_path / "failures.jsonl")
+    )
+    assert(jsonl_file2json_objs(str(tmp_path / "failures.jsonl")) == failures)
+
+
+def test_sharded_audio_dataset(tmp_path) -> None:
+    index_path: str = pack_shards(
+        DEMO_RECORDS, str(tmp_path / "shards"), "path", keep_cols=["text"],
+        max_shard_samples=2, audio_format="flac", sample_rate=16000, 
+        channels=1, num_writers=1
+    )
+    cache: ShardCache = ShardCache(str(tmp_path / "cache"))
+    dataset: ShardedAudioDataset = ShardedAudioDataset(index_path, 16000, cache=cache)
+    assert(len(dataset) == len(DEMO_RECORDS))
+    # Random access in reversed order returns same audio as packed one
+    for i in reversed(range(len(dataset))):
+        sample: Dict = dataset[i]
+        audio, sample_rate = sf.read(
+            io.BytesIO(dataset.read_bytes(dataset.index[i])), dtype="float32"
+        )
+        assert(sample["text"] == DEMO_RECORDS[i]["text"])
+        assert(sample["path"] == "%012i.flac" % i)
+        assert(sample["audio"]["sampling_rate"] == 16000)
+        assert(np.allclose(sample["audio"]["array"], audio))
+    assert(len(os.listdir(str(tmp_path / "cache"))) == 3)
+    dataset.close()
+
+
+def test_sharded_audio_iterable_dataset(tmp_path) -> None:
+    shard_dir: str = str(tmp_path / "shards")
+    pack_shards(
+        DEMO_RECORDS, shard_dir, "path", keep_cols=["text"], max_shard_samples=1,
+        audio_format="flac", sample_rate=16000, channels=1, num_writers=1
+    )
+    dataset: ShardedAudioIterableDataset = ShardedAudioIterableDataset(
+        shard_dir, 8000, shuffle=True, shuffle_buffer_size=2, seed=1
+    )
+    orders: List[List[str]] = []
+    for epoch in range(3):
+        dataset.set_epoch(epoch)
+        samples: List[Dict] = list(dataset)
+        assert(sorted(x["text"] for x in samples) == \
+            sorted(x["text"] for x in DEMO_RECORDS))
+        assert(all(x["audio"]["sampling_rate"] == 8000 for x in samples))
+        orders.append([x["path"] for x in samples])
+    assert(len(set(tuple(x) for x in orders)) > 1)
+    # Same epoch gives same order
+    dataset.set_epoch(0)
+    assert([x["path"] for x in dataset] == orders[0])
+
+
+def test_shard_cache_eviction(tmp_path) -> None:
+    src_dir: str = str(tmp_path / "src")
+    os.makedirs(src_dir)
+    for i in range(3):
+        open(os.path.join(src_dir, "shard-%06i.tar" % i), "wb").write(b"x" * 100)
+    cache: ShardCache = ShardCache(str(tmp_path / "cache"), max_bytes=250)
+    paths: List[str] = [
+        cache.get(os.path.join(src_dir, "shard-%06i.tar" % i)) for i in range(3)
+    ]
+    assert(open(paths[2], "rb").read() == b"x" * 100)
+    # Oldest shard is evicted to keep cache under `max_bytes`
+    assert(sorted(os.listdir(str(tmp_path / "cache"))) == \
+        sorted(os.path.basename(x) for x in paths[1:]))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# file: test_array_store.py
+# date: 2026-10-18
+
+
+import os
+import pickle
+import torch
+from torch import Tensor
+from typing import Dict, List
+
+from mia.data.array_store import ArrayStore
+from mia.utils import jsonl_file2json_objs
+
+
+def test_array_store(tmp_path) -> None:
+    store: ArrayStore = ArrayStore(str(tmp_path), "int32", max_shard_bytes=16)
+    arrays: List[Tensor] = [torch.arange(i * 6).reshape(i, 6) for i in range(1, 4)]
+    for i, array in enumerate(arrays):
+        store.put_array("k%i" % i, "%i.wav" % i, array, label_len=i + 1)
+    store.put_array("k0", "0.wav", torch.zeros(2, 2))
+    store.close()
+    assert(len(store) == 3)
+    assert(len(set(x["shard"] for x in store.index.values())) == 3)
+
+    # dtype is kept in store, so it's ignored when re-opening
+    reopened: ArrayStore = pickle.loads(pickle.dumps(ArrayStore(str(tmp_path), "float32")))
+    for i, array in enumerate(arrays):
+        assert(reopened.get_array("k%i" % i).dtype == torch.int32)
+        assert(torch.equal(reopened.get_array("k%i" % i).long(), array))
+        assert(reopened.get_record("k%i" % i)["label_len"] == i + 1)
+    assert(reopened.get_array("missing") is None)
+    assert("k1" in reopened and "missing" not in reopened)
+
+
+def test_array_store_resume(tmp_path) -> None:
+    store: ArrayStore = ArrayStore(str(tmp_path), "float32")
+    arrays: List[Tensor] = [torch.randn(i + 1, 4) for i in range(4)]
+    for i, array in enumerate(arrays):
+        store.put_array("k%i" % i, "%i.wav" % i, array)
+    store.close()
+
+    # Interrupted building: partial last index line, and an index record 
+    # of `k2` whose array was only partially written
+    index_path: str = str(tmp_path / "index.jsonl")
+    index_bytes: bytes = open(index_path, "rb").read()
+    open(index_path, "wb").write(index_bytes[:-10])
+    shard_path: str = store.shard_path(0)
+    record: Dict = store.get_record("k2")
+    os.truncate(shard_path, record["offset"] + 6)
+
+    reopened: ArrayStore = ArrayStore(str(tmp_path), "float32")
+    assert(sorted(reopened.index.keys()) == ["k0", "k1"])
+    assert(len(jsonl_file2json_objs(index_path)) == 2)
+    for i, array in enumerate(arrays):
+        reopened.put_array("k%i" % i, "%i.wav" % i, array)
+    reopened.close()
+
+    resumed: ArrayStore = ArrayStore(str(tmp_path), "float32")
+    assert(len(resumed) == len(arrays))
+    for i, array in enumerate(arrays):
+        assert(torch.equal(resumed.get_array("k%i" % i), array))
+    assert(os.path.getsize(shard_path) == sum(x.numel() * 4 for x in arrays))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# file: _whisper_stand_ins.py
+# date: 2026-10-18
+#
+# Stand-ins of Whisper models and processors shared by model tests, they
+# are module level so spawned processes can unpickle model factories. It's a
+# plain module rather than `conftest.py`, which is not meant to be imported.
+
+
+import torch
+from torch import Tensor
+from typing import List, Tuple
+from transformers import WhisperConfig, WhisperForConditionalGeneration
+from transformers import WhisperFeatureExtractor
+
+
+class EnergyModel:
+    """
+    Stand-in of Whisper model which "transcribes" input features into
+    their mean energy, so outputs can be matched with inputs.
+    """
+    dtype: torch.dtype = torch.float32
+
+    def generate(self, inputs: Tensor, **kwargs) -> Tensor:
+        return (inputs.mean(dim=(1, 2)) * 1e4).round().long().reshape(-1, 1)
+
+
+class IdsTokenizer:
+    """
+    Decodes each sequence into its space separated token ids.
+    """
+    def batch_decode(self, ids: Tensor, skip_special_tokens: bool=True) -> List[str]:
+        return [" ".join(str(i) for i in x) for x in ids.tolist()]
+
+
+class FakeProcessor:
+    feature_extractor: WhisperFeatureExtractor = WhisperFeatureExtractor()
+    tokenizer: IdsTokenizer = IdsTokenizer()
+
+
+def energy_model_factory() -> Tuple[EnergyModel, FakeProcessor]:
+    return (EnergyModel(), FakeProcessor())
+
+
+def tiny_whisper(vocab_size: int=100) -> WhisperForConditionalGeneration:
+    torch.manual_seed(0)
+    model: WhisperForConditionalGeneration = WhisperForConditionalGeneration(
+        WhisperConfig(
+            vocab_size=vocab_size, d_model=16,
+            encoder_layers=1, decoder_layers=1,
+            encoder_attention_heads=2, decoder_attention_heads=2,
+            encoder_ffn_dim=32, decoder_ffn_dim=32,
+            max_source_positions=1500, max_target_positions=32,
+            decoder_start_token_id=1, pad_token_id=0, eos_token_id=2,
+            begin_suppress_tokens=None, suppress_tokens=None
+        )
+    ).eval()
+    model.generation_config.max_length = 8
+    return model
+
+
+def tiny_whisper_factory() -> Tuple[WhisperForConditionalGeneration, FakeProcessor]:
+    return (tiny_whisper(), FakeProcessor())
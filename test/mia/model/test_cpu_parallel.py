@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# file: test_cpu_parallel.py
+# date: 2026-10-18
+
+
+import pytest
+import torch
+from typing import List, Tuple
+from torch import Tensor
+
+from _whisper_stand_ins import EnergyModel
+from _whisper_stand_ins import FakeProcessor
+from _whisper_stand_ins import energy_model_factory
+from mia.model.cpu_parallel import CpuParallelWhisperRunner
+from mia.model.whisper_inference import WhisperInferenceEngine
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_PATHS: List[str] = [x["path"] for x in jsonl_file2json_objs(DEMO_JSONL_PATH)][:6]
+
+
+def broken_model_factory() -> Tuple[EnergyModel, FakeProcessor]:
+    raise Exception("Can not load model")
+
+
+def test_cpu_parallel_whisper_runner() -> None:
+    engine: WhisperInferenceEngine = WhisperInferenceEngine(
+        EnergyModel(), FakeProcessor(), num_workers=0
+    )
+    targets: List[str] = [engine.transcribe_batch([x])[0][0] for x in DEMO_PATHS]
+
+    runner: CpuParallelWhisperRunner = CpuParallelWhisperRunner(
+        energy_model_factory, num_procs=2, threads_per_proc=1
+    )
+    outputs: List[str] = runner.transcribe(
+        DEMO_PATHS, batch_size=2, durations=[1, 6, 2, 5, 3, 4]
+    )
+    assert(len(outputs) == len(targets))
+    for output, target in zip(outputs, targets):
+        assert(abs(int(output) - int(target)) <= 1)
+    assert(runner.report["samples"] == len(DEMO_PATHS))
+    assert(runner.report["audio_sec"] > 0)
+    assert(runner.report["rtf"] > 0)
+
+    runner = CpuParallelWhisperRunner(broken_model_factory, num_procs=1)
+    with pytest.raises(Exception, match="Can not load model"):
+        runner.transcribe(DEMO_PATHS)
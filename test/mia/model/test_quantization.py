@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# file: test_quantization.py
+# date: 2026-10-18
+
+
+import torch
+from torch import nn
+from torch import Tensor
+from typing import Dict, List
+
+from _whisper_stand_ins import tiny_whisper_factory
+from mia.model.quantization import quantize_whisper_dynamic
+from mia.model.quantization import compare_quantization
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_PATHS: List[str] = [x["path"] for x in jsonl_file2json_objs(DEMO_JSONL_PATH)][:2]
+
+
+def test_quantize_whisper_dynamic() -> None:
+    model, _ = tiny_whisper_factory()
+    features: Tensor = torch.randn(1, 80, 3000)
+    with torch.no_grad():
+        fp32_ids: Tensor = model.generate(features)
+    model = quantize_whisper_dynamic(model)
+    assert(not any(type(x) is nn.Linear for x in model.modules()))
+    with torch.no_grad():
+        int8_ids: Tensor = model.generate(features)
+    assert(int8_ids.shape[0] == fp32_ids.shape[0])
+
+
+def test_compare_quantization() -> None:
+    report: Dict = compare_quantization(
+        tiny_whisper_factory, DEMO_PATHS, ["0 1 2", "3 4 5"], unit="word",
+        batch_size=2
+    )
+    for mode in ["none", "int8_dynamic"]:
+        assert(report["modes"][mode]["samples"] == len(DEMO_PATHS))
+        assert(report["modes"][mode]["rtf"] > 0)
+        assert(report["modes"][mode]["peak_rss_mb"] > 0)
+    assert(report["speedup"] > 0)
+    assert(abs(
+        report["error_rate_delta"] - report["modes"]["int8_dynamic"]["error_rate"]
+        + report["modes"]["none"]["error_rate"]
+    ) < 1e-9)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# file: test_teacher_logit_store.py
+# date: 2026-10-18
+
+
+import os
+import shutil
+import pytest
+import torch
+from torch import nn
+from torch import Tensor
+from typing import Dict, List
+from transformers import WhisperForConditionalGeneration
+
+from _whisper_stand_ins import tiny_whisper
+from mia.model.teacher_logit_store import TeacherLogitStore
+from mia.model.teacher_logit_store import batch_teacher_topk
+from mia.model.teacher_logit_store import sparse_kl_divergence
+from mia.model.teacher_logit_store import topk_kl_divergence
+from mia.model.teacher_logit_store import teacher_logit_store_build
+from mia.model.teacher_logit_store import TeacherEvalCache
+from mia.model.teacher_logit_store import teacher_fingerprint
+
+
+VOCAB_SIZE: int = 100
+
+
+class FakeCollator:
+    def __call__(self, samples: List[Dict]) -> Dict[str, Tensor]:
+        max_len: int = max(len(x["labels"]) for x in samples)
+        labels: Tensor = torch.full((len(samples), max_len), -100)
+        for i, x in enumerate(samples):
+            labels[i, :len(x["labels"])] = torch.tensor(x["labels"])
+        return {
+            "input_features": torch.stack([x["input_features"] for x in samples]),
+            "labels": labels
+        }
+
+
+def test_teacher_logit_store(tmp_path) -> None:
+    store: TeacherLogitStore = TeacherLogitStore(str(tmp_path), top_k=4, teacher="t")
+    logits: Tensor = torch.randn(3, VOCAB_SIZE)
+    store.put("a.wav", [5, 6, 7], logits)
+    store.flush()
+    values, indices = store.get("a.wav", [5, 6, 7])
+    assert(values.dtype == torch.float16 and indices.dtype == torch.int32)
+    assert(torch.equal(indices.long(), logits.topk(4, dim=-1).indices))
+    assert(store.get("a.wav", [5, 6]) is None)
+    store.close()
+
+    with pytest.raises(Exception):
+        TeacherLogitStore(str(tmp_path), top_k=8, teacher="t")
+    reopened: TeacherLogitStore = TeacherLogitStore(str(tmp_path), top_k=4, teacher="t")
+    assert(len(reopened) == 1)
+
+    labels: Tensor = torch.tensor([[5, 6, 7], [5, 6, -100]])
+    assert(batch_teacher_topk(reopened, ["a.wav", "a.wav"], labels) is None)
+    batch_values, _ = batch_teacher_topk(reopened, ["a.wav"], labels[:1])
+    assert(batch_values.shape == (1, 3, 4))
+
+
+def test_sparse_kl_divergence() -> None:
+    teacher_logits: Tensor = torch.randn(2, 5, VOCAB_SIZE)
+    student_log_dist: Tensor = nn.functional.log_softmax(
+        torch.randn(2, 5, VOCAB_SIZE) / 2.0, dim=-1
+    )
+    labels: Tensor = torch.tensor([[1, 2, 3, 4, 5], [1, 2, 3, -100, -100]])
+
+    # With full vocabulary it's exactly the dense KL divergence
+    teacher_dist: Tensor = nn.functional.softmax(teacher_logits / 2.0, dim=-1)
+    mask: Tensor = (labels >= 0).unsqueeze(-1)
+    dense: Tensor = (
+        nn.KLDivLoss(reduction="none")(student_log_dist, teacher_dist) * mask
+    ).sum() / mask.sum()
+    topk = teacher_logits.topk(VOCAB_SIZE, dim=-1)
+    sparse: Tensor = sparse_kl_divergence(
+        topk.values, topk.indices, student_log_dist, labels, temperature=2.0
+    )
+    assert(torch.allclose(dense, sparse, atol=1e-5))
+
+    topk = teacher_logits.topk(8, dim=-1)
+    assert(sparse_kl_divergence(
+        topk.values, topk.indices, student_log_dist, labels, temperature=2.0
+    ) > 0)
+    # Training loss still penalizes student mass outside top-k, even when 
+    # student agrees with teacher within top-k
+    teacher_log_dist: Tensor = nn.functional.log_softmax(teacher_logits / 2.0, dim=-1)
+    assert(sparse_kl_divergence(
+        topk.values, topk.indices, teacher_log_dist, labels, temperature=2.0
+    ) > 0.1)
+    assert(topk_kl_divergence(
+        topk.values, topk.indices, teacher_log_dist, labels, temperature=2.0
+    ) < 1e-5)
+    assert(torch.allclose(
+        topk_kl_divergence(
+            *teacher_logits.topk(VOCAB_SIZE, dim=-1), student_log_dist, labels, 
+            temperature=2.0
+        ), 
+        dense, atol=1e-5
+    ))
+
+
+def test_teacher_logit_store_build(tmp_path) -> None:
+    samples: List[Dict] = [
+        {"path": "%i.wav" % i, "input_features": torch.randn(80, 3000),
+         "labels": list(range(1, 3 + i))}
+        for i in range(5)
+    ]
+    model: WhisperForConditionalGeneration = tiny_whisper(VOCAB_SIZE)
+    store: TeacherLogitStore = TeacherLogitStore(str(tmp_path), top_k=8)
+    teacher_logit_store_build(
+        store, samples, FakeCollator(), model, batch_size=2, num_workers=0
+    )
+    assert(len(store) == 5)
+
+    batch: Dict[str, Tensor] = FakeCollator()(samples[3:])
+    with torch.no_grad():
+        logits: Tensor = model(**batch)["logits"]
+    values, indices = store.get("4.wav", samples[4]["labels"])
+    assert(torch.equal(indices.long(), logits[1].topk(8, dim=-1).indices))
+    assert(torch.allclose(
+        values.float(), logits[1].topk(8, dim=-1).values, atol=1e-2
+    ))
+
+
+def test_teacher_eval_cache(tmp_path) -> None:
+    manifest: str = str(tmp_path / "dev.jsonl")
+    open(manifest, "w").write('{"path": "a.wav"}\n')
+    cache: TeacherEvalCache = TeacherEvalCache(
+        str(tmp_path / "cache"), "t", manifest, top_k=4
+    )
+    paths: List[str] = ["a.wav", "b.wav"]
+    labels: Tensor = torch.tensor([[3, 4, 5], [3, 4, -100]])
+    assert(cache.get(paths, labels) is None)
+    cache.put(paths, labels, torch.randn(2, 3, VOCAB_SIZE), ["x", "y"])
+    values, indices, texts = cache.get(paths, labels)
+    assert(values.shape == (2, 3, 4) and texts == ["x", "y"])
+
+    # Re-opened cache has outputs, but not for another dev manifest
+    reopened: TeacherEvalCache = TeacherEvalCache(
+        str(tmp_path / "cache"), "t", manifest, top_k=4
+    )
+    assert(reopened.get(paths, labels)[2] == ["x", "y"])
+    open(manifest, "a").write('{"path": "b.wav"}\n')
+    changed: TeacherEvalCache = TeacherEvalCache(
+        str(tmp_path / "cache"), "t", manifest, top_k=4
+    )
+    assert(changed.key != cache.key)
+    assert(changed.get(paths, labels) is None)
+
+
+def test_teacher_fingerprint(tmp_path) -> None:
+    model: WhisperForConditionalGeneration = tiny_whisper(VOCAB_SIZE)
+    model.save_pretrained(str(tmp_path / "a"))
+    shutil.copytree(str(tmp_path / "a"), str(tmp_path / "b"))
+    loaded_a: WhisperForConditionalGeneration = \
+        WhisperForConditionalGeneration.from_pretrained(str(tmp_path / "a"))
+    loaded_b: WhisperForConditionalGeneration = \
+        WhisperForConditionalGeneration.from_pretrained(str(tmp_path / "b"))
+    version: str = teacher_fingerprint(loaded_a).split("@")[1]
+    assert(version not in {"", "None"})
+    # A copied checkpoint has same version
+    assert(teacher_fingerprint(loaded_b).split("@")[1] == version)
+
+    # Overwriting weights in place with same size and mtime changes version
+    path: str = str(tmp_path / "b" / "model.safetensors")
+    stat: os.stat_result = os.stat(path)
+    data: bytearray = bytearray(open(path, "rb").read())
+    data[-1] ^= 0xFF
+    open(path, "wb").write(bytes(data))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert(teacher_fingerprint(loaded_b).split("@")[1] != version)
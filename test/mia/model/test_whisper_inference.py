@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# file: test_whisper_inference.py
+# date: 2026-10-18
+
+
+import math
+import torch
+import soundfile as sf
+from typing import Dict, List
+from torch import Tensor
+from transformers import WhisperFeatureExtractor
+
+from _whisper_stand_ins import EnergyModel
+from _whisper_stand_ins import FakeProcessor
+from mia.data.audio.functions import audio_file2model_inputs
+from mia.model.whisper_inference import WhisperInferenceEngine
+from mia.model.whisper_inference import audio_windows
+from mia.model.whisper_inference import stitch_token_ids
+from mia.utils import jsonl_file2json_objs
+
+
+DEMO_JSONL_PATH: str = "./demo_data/demo_jsonl_dataset.jsonl"
+DEMO_PATHS: List[str] = [x["path"] for x in jsonl_file2json_objs(DEMO_JSONL_PATH)][:5]
+
+
+def test_whisper_inference_engine() -> None:
+    processor: FakeProcessor = FakeProcessor()
+    model: EnergyModel = EnergyModel()
+    targets: List[str] = [
+        processor.tokenizer.batch_decode(
+            model.generate(audio_file2model_inputs(x, processor.feature_extractor)[0])
+        )[0]
+        for x in DEMO_PATHS
+    ]
+
+    engine: WhisperInferenceEngine = WhisperInferenceEngine(
+        model, processor, batch_size=2, num_workers=2, meta_cache_path=None
+    )
+    outputs: List[str] = engine.transcribe(DEMO_PATHS, progress=False)
+    assert(len(set(targets)) > 1)
+    for output, target in zip(outputs, targets):
+        assert(abs(int(output) - int(target)) <= 1)
+
+    engine.num_workers = 0
+    assert(
+        engine.transcribe(DEMO_PATHS, durations=[1, 5, 2, 4, 3], progress=False)
+        == outputs
+    )
+
+
+class SpectrumModel:
+    """
+    Stand-in of Whisper model emitting a token per second of input, which
+    is the loudest mel bin of that second, silent seconds emit nothing.
+    Outputs are right padded with 0.
+    """
+    dtype: torch.dtype = torch.float32
+
+    def generate(self, inputs: Tensor, **kwargs) -> Tensor:
+        outputs: List[List[int]] = []
+        for x in inputs:
+            seconds: Tensor = x.reshape(x.shape[0], -1, 100).mean(dim=-1)
+            outputs.append([
+                int(seconds[:, i].argmax()) + 10 for i in range(seconds.shape[1])
+                if seconds[:, i].max() - seconds[:, i].min() > 0.5
+            ])
+        max_len: int = max(len(x) for x in outputs)
+        return torch.tensor([x + [0] * (max_len - len(x)) for x in outputs])
+
+
+class SpectrumTokenizer:
+    all_special_ids: List[int] = [0]
+
+    def batch_decode(self, ids: Tensor, skip_special_tokens: bool=True) -> List[str]:
+        return [
+            " ".join(str(i) for i in x if i not in self.all_special_ids)
+            for x in ids.tolist()
+        ]
+
+
+class SpectrumProcessor:
+    feature_extractor: WhisperFeatureExtractor = WhisperFeatureExtractor()
+    tokenizer: SpectrumTokenizer = SpectrumTokenizer()
+
+
+def test_audio_windows() -> None:
+    assert(audio_windows(16000 * 10) == [(0, 16000 * 10)])
+    assert(audio_windows(16000 * 70) == [
+        (0, 16000 * 30), (16000 * 25, 16000 * 55), (16000 * 40, 16000 * 70)
+    ])
+
+
+def test_stitch_token_ids() -> None:
+    assert(stitch_token_ids([1, 2, 3, 4, 5], [4, 5, 6, 7]) == [1, 2, 3, 4, 5, 6, 7])
+    # Disagreement at window edges is resolved by cutting in the middle
+    assert(stitch_token_ids([1, 2, 3, 4, 9], [8, 3, 4, 5, 6]) == [1, 2, 3, 4, 5, 6])
+    assert(stitch_token_ids([1, 2], [3, 4]) == [1, 2, 3, 4])
+
+
+def test_transcribe_long_form(tmp_path) -> None:
+    sample_rate: int = 16000
+    # Each second is a tone of different frequency
+    freqs: List[float] = [200.0 * 1.045 ** i for i in range(70)]
+    waveform: Tensor = torch.cat([
+        torch.sin(2 * math.pi * f * torch.arange(sample_rate) / sample_rate)
+        for f in freqs
+    ])
+    path: str = str(tmp_path / "long.wav")
+    sf.write(path, waveform.numpy(), sample_rate)
+
+    engine: WhisperInferenceEngine = WhisperInferenceEngine(
+        SpectrumModel(), SpectrumProcessor(), batch_size=2, num_workers=0
+    )
+    # Reference is each second transcribed alone
+    expected: List[str] = engine.transcribe_batch(
+        [waveform[i * sample_rate:(i + 1) * sample_rate] for i in range(70)]
+    )[0]
+    outputs: List[str] = engine.transcribe_long_form([DEMO_PATHS[0], path])
+    assert(outputs[0] == engine.transcribe_batch([DEMO_PATHS[0]])[0][0])
+    assert(outputs[1] == " ".join(expected))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# file: test_evaluation.py
+# date: 2026-10-18
+
+
+import random
+from typing import Dict, List
+
+from mia import utils
+from mia.evaluation import StreamingAsrEvaluator
+from mia.evaluation import duration_bucket
+from mia.metrics import error_rate
+
+
+def test_duration_bucket() -> None:
+    assert(duration_bucket(3.0, [5, 10]) == "[0, 5)")
+    assert(duration_bucket(5.0, [5, 10]) == "[5, 10)")
+    assert(duration_bucket(12.5, [5, 10]) == "[10, inf)")
+    assert(duration_bucket(None, [5, 10]) == "unknown")
+
+
+def test_streaming_asr_evaluator(tmp_path) -> None:
+    rd: random.Random = random.Random(0)
+    records: List[Dict] = []
+    for i in range(200):
+        target: str = "".join(rd.choice("甲乙丙丁") for _ in range(rd.randint(1, 10)))
+        records.append({
+            "path": "%i.wav" % i, "duration": rd.uniform(0, 20),
+            "target": target, "output": target[:rd.randint(0, len(target))] + "戊"
+        })
+    results_path: str = str(tmp_path / "results.jsonl")
+    manifest_path: str = str(tmp_path / "manifest.jsonl")
+    utils.json_objs2jsonl_file(results_path, records)
+    utils.json_objs2jsonl_file(
+        manifest_path, [{"path": x["path"], "source": i % 3} for i, x in enumerate(records)]
+    )
+
+    evaluator: StreamingAsrEvaluator = StreamingAsrEvaluator(
+        "target", "output", group_by=["duration_bucket", "source"],
+        duration_buckets=[10], manifest_path=manifest_path, batch_size=16
+    )
+    report: Dict = evaluator.run(results_path)
+    expected: Dict = error_rate(
+        [x["target"] for x in records], [x["output"] for x in records]
+    )
+    assert(report["overall"]["samples"] == len(records))
+    assert(abs(report["overall"]["error_rate"] - expected["error_rate"]) < 1e-9)
+    assert(report["overall"]["deletions"] == expected["deletions"])
+    assert(sorted(report["groups"]["source"]) == ["0", "1", "2"])
+
+    short: List[Dict] = [x for x in records if x["duration"] < 10]
+    assert(report["groups"]["duration_bucket"]["[0, 10)"]["error_rate"] == error_rate(
+        [x["target"] for x in short], [x["output"] for x in short]
+    )["error_rate"])
+
+    assert(evaluator.run(results_path, num_proc=3) == report)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# file: test_metrics.py
+# date: 2026-10-18
+
+
+import random
+from typing import Dict, List
+
+from mia.metrics import error_rate
+from mia.metrics import edit_ops
+from mia.metrics import cer
+from mia.metrics import wer
+
+
+def levenshtein(target: List, output: List) -> int:
+    prev: List[int] = list(range(len(output) + 1))
+    for i in range(1, len(target) + 1):
+        curr: List[int] = [i] + [0] * len(output)
+        for j in range(1, len(output) + 1):
+            curr[j] = min(
+                prev[j] + 1, curr[j - 1] + 1,
+                prev[j - 1] + int(target[i - 1] != output[j - 1])
+            )
+        prev = curr
+    return prev[-1]
+
+
+def test_edit_ops() -> None:
+    rd: random.Random = random.Random(7)
+    targets: List[str] = [
+        "".join(rd.choice("abcd") for _ in range(rd.randint(0, 12)))
+        for _ in range(300)
+    ]
+    outputs: List[str] = [
+        "".join(rd.choice("abcd") for _ in range(rd.randint(0, 12)))
+        for _ in range(300)
+    ]
+    target_lens, ops = edit_ops(targets, outputs, "char", batch_size=32)
+    for i in range(len(targets)):
+        assert(target_lens[i] == len(targets[i]))
+        assert(ops[i].sum() == levenshtein(targets[i], outputs[i]))
+        # S + D units of target are aligned, S + I units of output
+        assert(ops[i, 0] + ops[i, 1] <= len(targets[i]))
+        assert(len(targets[i]) - ops[i, 1] + ops[i, 2] == len(outputs[i]))
+
+    _, parallel_ops = edit_ops(targets, outputs, "char", batch_size=32, num_proc=2)
+    assert((parallel_ops == ops).all())
+
+
+def test_error_rate() -> None:
+    results: Dict = error_rate(["abc", "abc", "abc", "", ""], ["abd", "ab", "abcx", "", "x"])
+    assert([
+        (x["substitutions"], x["deletions"], x["insertions"])
+        for x in results["samples"]
+    ] == [(1, 0, 0), (0, 1, 0), (0, 0, 1), (0, 0, 0), (0, 0, 1)])
+    assert(results["samples"][3]["error_rate"] == 0)
+    assert(results["samples"][4]["error_rate"] == float("inf"))
+    assert(results["target_units"] == 9)
+    assert(abs(results["error_rate"] - 4 / 9) < 1e-9)
+
+    assert(cer(["你好世界"], ["你好"]) == 0.5)
+    assert(wer(["the cat sat", "a dog"], ["the bat sat", "a dog ran"]) == 0.4)
+    assert(error_rate([], [])["error_rate"] == 0)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# file: test_text_norm.py
+# date: 2026-10-18
+
+
+import os
+from opencc import OpenCC
+from typing import List
+
+from mia import text_norm
+
+
+TEXTS: List[str] = ["所以他們今天到底有沒有約", "還沒傳完嗎？", "所以他們今天到底有沒有約"]
+
+
+def test_convert() -> None:
+    for text in TEXTS:
+        assert(text_norm.convert(text) == OpenCC("tw2s.json").convert(text))
+    assert(text_norm.get_converter() is text_norm.get_converter("tw2s.json"))
+    assert(text_norm.convert.cache_info().hits > 0)
+
+
+def test_convert_many() -> None:
+    assert(
+        text_norm.convert_many(TEXTS) 
+        == [OpenCC("tw2s.json").convert(x) for x in TEXTS]
+    )
+
+
+def test_get_converter_after_fork() -> None:
+    parent_converter: OpenCC = text_norm.get_converter()
+    read_fd, write_fd = os.pipe()
+    pid: int = os.fork()
+    if pid == 0:
+        ok: bool = text_norm.get_converter() is not parent_converter \
+            and text_norm.convert_many(["還沒傳完嗎？"]) == ["还没传完吗？"]
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert(os.read(read_fd, 1) == b"1")
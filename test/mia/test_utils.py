@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# file: test_utils.py
+# date: 2026-10-18
+
+
+import os
+import sys
+import pytest
+import numpy as np
+import soundfile as sf
+from typing import Dict, List
+
+from mia import utils
+from mia.struct import SubtitleChunk, AudioMetadata
+
+
+RECORDS: List[Dict] = [
+    {"path": "./a_%i.mp3" % i, "text": "還沒傳完嗎？%i" % i} for i in range(10)
+]
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz", ".zst"])
+def test_jsonl_iter_and_writer(tmp_path, suffix: str) -> None:
+    if suffix == ".zst":
+        pytest.importorskip("zstandard")
+    path: str = str(tmp_path / ("data.jsonl" + suffix))
+    with utils.JsonlWriter(path, flush_every=3) as writer:
+        writer.write_many(RECORDS)
+    assert(list(utils.jsonl_iter(path)) == RECORDS)
+    assert(utils.jsonl_file2json_objs(path) == RECORDS)
+
+    batches: List[List[Dict]] = list(utils.jsonl_iter(path, batch_size=4))
+    assert([len(x) for x in batches] == [4, 4, 2])
+    assert(sum(batches, []) == RECORDS)
+
+
+def test_json_dumps_fallback() -> None:
+    # Objects `orjson` rejects fall back to `json`
+    assert(utils.json_loads(utils.json_dumps(RECORDS[0], True)) == RECORDS[0])
+    assert(utils.json_dumps({1: "a"}, True) == '{"1": "a"}')
+
+
+def test_json_objs2jsonl_file_from_generator(tmp_path) -> None:
+    path: str = str(tmp_path / "data.jsonl")
+    utils.json_objs2jsonl_file(path, (x for x in RECORDS))
+    assert(utils.jsonl_file2json_objs(path) == RECORDS)
+
+
+def test_jsonl_indexed_reader(tmp_path) -> None:
+    path: str = str(tmp_path / "data.jsonl")
+    utils.json_objs2jsonl_file(path, RECORDS)
+    # Blank lines are not counted as records
+    open(path, "a").write("\n" + utils.json_dumps({"path": "last"}) + "\n")
+
+    reader: utils.JsonlIndexedReader = utils.JsonlIndexedReader(path)
+    assert(os.path.exists(utils.jsonl_index_path(path)))
+    assert(len(reader) == len(RECORDS) + 1)
+    assert(reader[3] == RECORDS[3])
+    assert(reader[0] == RECORDS[0])
+    assert(reader[-1] == {"path": "last"})
+    with pytest.raises(IndexError):
+        reader[len(RECORDS) + 1]
+    reader.close()
+
+
+def test_jsonl_repair_tail(tmp_path) -> None:
+    path: str = str(tmp_path / "out.jsonl")
+    utils.json_objs2jsonl_file(path, [{"id": 0}, {"id": 1}])
+    assert(utils.jsonl_repair_tail(path) == 0)
+
+    open(path, "a").write('{"id": 2, "te')
+    assert(utils.jsonl_repair_tail(path, chunk_size=4) == len('{"id": 2, "te'))
+    with utils.JsonlWriter(path, "a") as writer:
+        writer.write({"id": 3})
+    assert([x["id"] for x in utils.jsonl_iter(path)] == [0, 1, 3])
+
+
+def test_jsonl_merge_sorted(tmp_path) -> None:
+    paths: List[str] = [str(tmp_path / ("shard-%i.jsonl" % i)) for i in range(3)]
+    for i, path in enumerate(paths):
+        utils.json_objs2jsonl_file(path, [{"id": x} for x in range(i, 20, 3)])
+    out_path: str = utils.jsonl_merge_sorted(
+        paths, str(tmp_path / "merged.jsonl"), key=lambda x: x["id"]
+    )
+    assert([x["id"] for x in utils.jsonl_iter(out_path)] == list(range(20)))
+
+
+def test_jsonl_byte_ranges(tmp_path) -> None:
+    path: str = str(tmp_path / "data.jsonl")
+    utils.json_objs2jsonl_file(path, RECORDS)
+    for num_ranges in [1, 3, 7, 100]:
+        ranges = utils.jsonl_byte_ranges(path, num_ranges)
+        assert(len(ranges) <= num_ranges)
+        assert(ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(path))
+        records: List[Dict] = []
+        for start, end in ranges:
+            records.extend(utils.jsonl_iter_range(path, start, end))
+        assert(records == RECORDS)
+
+
+def test_chunk_audio_with_subtitle_chunks(tmp_path) -> None:
+    sample_rate: int = 22050
+    t: np.ndarray = np.arange(sample_rate * 12) / sample_rate
+    audio: np.ndarray = np.stack(
+        [np.sin(2 * np.pi * 440 * t), np.sin(2 * np.pi * 220 * t)], axis=1
+    ).astype(np.float32) * 0.5
+    audio_path: str = str(tmp_path / "episode.wav")
+    sf.write(audio_path, audio, sample_rate)
+
+    spans: List[List[float]] = [[5.0, 7.5], [0.5, 2.0], [6.0, 11.0]]
+    chunks: List[SubtitleChunk] = []
+    for i, (start, end) in enumerate(spans):
+        chunk: SubtitleChunk = SubtitleChunk()
+        chunk.start_in_second, chunk.end_in_second = start, end
+        chunk.subtitle = "text %i" % i
+        chunks.append(chunk)
+
+    out_dir: str = str(tmp_path / "chunks")
+    os.makedirs(out_dir)
+    results: List[AudioMetadata] = utils.chunk_audio_with_subtitle_chunks(
+        out_dir, audio_path, chunks, out_format="flac", out_sample_rate=16000,
+        num_writers=2, max_pending=1
+    )
+    assert([x.transcript for x in results] == ["text 0", "text 1", "text 2"])
+    for result, (start, end) in zip(results, spans):
+        assert(result.path.endswith(".flac"))
+        info = sf.info(result.path)
+        assert(info.samplerate == 16000 and info.channels == 1)
+        assert(abs(info.frames - (end - start) * 16000) <= 1)
+
+    # Mono down-mixing of same segment, without resampling
+    segment: np.ndarray = sf.read(
+        utils.chunk_audio_with_subtitle_chunks(
+            str(tmp_path), audio_path, chunks[1:2], out_format="wav"
+        )[0].path, dtype="float32"
+    )[0]
+    expected: np.ndarray = audio[int(0.5 * sample_rate):int(2.0 * sample_rate)].mean(axis=1)
+    assert(np.abs(segment - expected).max() < 1e-3)
+
+
+# Stand-ins of `ffprobe` and `ffmpeg` for a 8kHz stereo source of 2 seconds,
+# decoded frames are their own index
+FAKE_FFPROBE: str = """#!%s
+print('{"streams": [{"sample_rate": 8000, "channels": 2}]}')
+"""
+FAKE_FFMPEG: str = """#!%s
+import sys
+import numpy as np
+
+args = sys.argv[1:]
+sample_rate = int(args[args.index("-ar") + 1])
+channels = int(args[args.index("-ac") + 1])
+frames = np.arange(2 * sample_rate, dtype=np.float32)
+sys.stdout.buffer.write(np.repeat(frames, channels).tobytes())
+"""
+
+
+def test_audio_segments_iter_ffmpeg(tmp_path, monkeypatch) -> None:
+    bin_dir: str = str(tmp_path / "bin")
+    os.makedirs(bin_dir)
+    for name, script in [("ffprobe", FAKE_FFPROBE), ("ffmpeg", FAKE_FFMPEG)]:
+        open(os.path.join(bin_dir, name), "w").write(script % sys.executable)
+        os.chmod(os.path.join(bin_dir, name), 0o755)
+    monkeypatch.setenv("PATH", bin_dir + os.pathsep + os.environ["PATH"])
+    # Not readable by libsndfile
+    audio_path: str = str(tmp_path / "episode.webm")
+    open(audio_path, "wb").write(b"webm")
+
+    # Source sample rate and channels are kept by default
+    outputs: List = list(utils.audio_segments_iter(
+        audio_path, [(1.0, 1.5), (0.5, 1.0)], block_frames=1000
+    ))
+    assert([x[0] for x in outputs] == [1, 0])
+    assert(all(x[2] == 8000 for x in outputs))
+    assert(outputs[0][1].shape == (4000, 2))
+    assert(outputs[1][1][0].tolist() == [8000.0, 8000.0])
+
+    outputs = list(utils.audio_segments_iter(
+        audio_path, [(0.5, 1.0)], out_sample_rate=16000, out_channels=1
+    ))
+    assert(outputs[0][2] == 16000 and outputs[0][1].shape == (8000, 1))